@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+# Copyright (c) nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Compare the time taken to count code and comment lines with the comment
+syntax lexer and with the naive first byte classifier.
+
+Usage: benchmark_source_lines.py [FILE ...]
+
+Each FILE is repeated 20 times and counted with the C and C++ syntaxes. The
+default FILE is the if_ath.c test file. The lexer should stay within 2x of
+the naive classifier.
+"""
+
+import os
+import sys
+import timeit
+
+from compiledcode.sourcecode import metrics
+
+DEFAULT_FILE = os.path.normpath(os.path.join(
+    os.path.dirname(__file__), '..', '..', 'tests', 'data', 'sourcecode', 'input', 'if_ath.c'))
+
+COPIES = 20
+
+SYNTAXES = ('c', 'cpp')
+
+
+def best_time(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def benchmark(location):
+    with open(location, 'rb') as inp:
+        data = inp.read() * COPIES
+
+    naive = best_time(lambda: metrics.count_lines(data))
+    print(f'{location}: naive: {naive:.3f}s')
+    for syntax in SYNTAXES:
+        lexer = best_time(lambda: metrics.count_source_lines(data, syntax))
+        print(f'  {syntax}: lexer: {lexer:.3f}s ratio: {lexer / naive:.2f}x')
+
+
+def main(args):
+    for location in args or [DEFAULT_FILE]:
+        benchmark(location)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
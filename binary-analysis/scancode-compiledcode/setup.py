@@ -43,7 +43,9 @@ setup(
         'plugincode',
         'typecode',
         'attrs',
-        'pyelftools',
+        # dwarf.dwarfng.DwarfELFFile overrides private ELFFile methods: the
+        # dwarfng tests pass with pyelftools 0.29, 0.30 and 0.31
+        'pyelftools >= 0.29, < 0.32',
     ],
 
     extra_requires={
@@ -69,6 +71,16 @@ setup(
             'scancode-makedepend = compiledcode.makedepend:MakeDependScanner',
             'scancode-javaclass = compiledcode.javaclass:JavaClassScanner',
             'scancode-codecommentlines = compiledcode.sourcecode:CodeCommentLinesScanner',
+            'scancode-source-symbols = compiledcode.sourcecode:SourceSymbolsScanner',
+        ],
+        'scancode_post_scan': [
+            'scancode-dwarf-debug-links = compiledcode.dwarf:DwarfDebugLinks',
+            'scancode-javaclass-index = compiledcode.javaclass:JavaClassIndexer',
+            'scancode-gwt-java-sources = compiledcode.gwt:GWTJavaSources',
+            'scancode-build-graph = compiledcode.buildgraph:BuildGraphBuilder',
+            'scancode-lkm-modules = compiledcode.lkmclue:LKMModules',
+            'scancode-cpp-includes-graph = compiledcode.cppincludes:CPPIncludesResolver',
+            'scancode-codecommentlines-totals = compiledcode.sourcecode:CodeCommentLinesTotals',
         ],
     }
 )
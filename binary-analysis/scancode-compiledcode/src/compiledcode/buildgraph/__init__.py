@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-plugins for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+import json
+import posixpath
+from array import array
+from collections import defaultdict
+from collections import deque
+
+from commoncode.cliutils import PluggableCommandLineOption
+from commoncode.cliutils import POST_SCAN_GROUP
+from formattedcode import FileOptionType
+from plugincode.post_scan import PostScanPlugin
+from plugincode.post_scan import post_scan_impl
+
+from compiledcode.utils import PathSuffixIndex
+
+
+@post_scan_impl
+class BuildGraphBuilder(PostScanPlugin):
+    """
+    Reconstruct the build graph of binaries, objects, sources and headers from
+    the "--makedepend" and "--dwarf" scan results and write it to a sidecar
+    JSON file.
+    """
+
+    options = [
+        PluggableCommandLineOption(('--build-graph',),
+                                   type=FileOptionType(mode='w', encoding='utf-8', lazy=True),
+                                   metavar='FILE',
+                                   default=None,
+                                   help='Write to FILE a compact columnar JSON build graph '
+                                   'of binaries, objects, sources and headers '
+                                   'reconstructed from the "--makedepend" and '
+                                   '"--dwarf" scan results.',
+                                   help_group=POST_SCAN_GROUP,
+                                   sort_order=100),
+    ]
+
+    def is_enabled(self, build_graph, **kwargs):
+        return build_graph
+
+    def process_codebase(self, codebase, build_graph, **kwargs):
+        graph = build_graph_from_codebase(codebase)
+        try:
+            graph.dump(build_graph)
+        finally:
+            build_graph.close()
+
+
+# node kinds
+BINARY = 0
+OBJECT = 1
+SOURCE = 2
+HEADER = 3
+
+KIND_NAMES = ('binary', 'object', 'source', 'header')
+
+HEADER_EXTENSIONS = (
+    '.h', '.hh', '.hpp', '.hxx', '.h++', '.inc', '.inl', '.ipp', '.tcc',
+)
+
+
+def get_kind(path):
+    """
+    Return the SOURCE or HEADER node kind of a source file ``path``.
+    """
+    if path.lower().endswith(HEADER_EXTENSIONS):
+        return HEADER
+    return SOURCE
+
+
+class BuildGraph(object):
+    """
+    A directed build graph of binary -> object -> source -> header edges.
+
+    Each node path is interned once and identified by an integer. The node
+    kinds and the edges are stored in integer arrays. Each edge is also kept
+    packed in a single integer in a set to add it only once.
+    """
+
+    def __init__(self):
+        # {path: node id}
+        self.ids = {}
+        # node id -> path
+        self.paths = []
+        # node id -> node kind
+        self.kinds = array('B')
+        # edge index -> source and target node ids
+        self.edges_from = array('L')
+        self.edges_to = array('L')
+        # {from id << 32 | to id}
+        self._edges = set()
+        # lazily built {node id: [target node ids]}
+        self._successors = None
+
+    def add_node(self, path, kind):
+        """
+        Return the node id of a ``path`` node of ``kind``, adding it if needed.
+        A path seen with several kinds keeps the kind closest to a binary, such
+        as source rather than header.
+        """
+        node_id = self.ids.get(path)
+        if node_id is None:
+            node_id = self.ids[path] = len(self.paths)
+            self.paths.append(path)
+            self.kinds.append(kind)
+        elif kind < self.kinds[node_id]:
+            self.kinds[node_id] = kind
+        return node_id
+
+    def add_edge(self, from_id, to_id):
+        """
+        Add an edge between the ``from_id`` and ``to_id`` node ids, once.
+        """
+        if from_id == to_id:
+            return
+        edge = from_id << 32 | to_id
+        if edge in self._edges:
+            return
+        self._edges.add(edge)
+        self.edges_from.append(from_id)
+        self.edges_to.append(to_id)
+        self._successors = None
+
+    def get_successors(self):
+        if self._successors is None:
+            successors = defaultdict(list)
+            for from_id, to_id in zip(self.edges_from, self.edges_to):
+                successors[from_id].append(to_id)
+            self._successors = successors
+        return self._successors
+
+    def get_provenance(self, path):
+        """
+        Return a mapping of {kind name: sorted list of paths} for all the
+        objects, sources and headers that a ``path`` node transitively depends
+        on.
+        """
+        node_id = self.ids.get(path)
+        if node_id is None:
+            return {}
+
+        successors = self.get_successors()
+        seen = {node_id}
+        queue = deque([node_id])
+        while queue:
+            for to_id in successors.get(queue.popleft(), ()):
+                if to_id not in seen:
+                    seen.add(to_id)
+                    queue.append(to_id)
+        seen.discard(node_id)
+
+        provenance = defaultdict(list)
+        for dep_id in seen:
+            provenance[KIND_NAMES[self.kinds[dep_id]]].append(self.paths[dep_id])
+        return {kind: sorted(paths) for kind, paths in provenance.items()}
+
+    def get_binaries(self):
+        return [path for path, kind in zip(self.paths, self.kinds) if kind == BINARY]
+
+    def to_columns(self):
+        """
+        Return a mapping of this graph in a compact columnar form suitable for
+        JSON serialization: a list of node paths and a list of node kinds
+        indexed by node id and two lists of edge source and target node ids.
+        """
+        return dict(
+            kinds=list(KIND_NAMES),
+            nodes=dict(
+                path=list(self.paths),
+                kind=self.kinds.tolist(),
+            ),
+            edges=dict(
+                source=self.edges_from.tolist(),
+                target=self.edges_to.tolist(),
+            ),
+        )
+
+    @classmethod
+    def from_columns(cls, columns):
+        """
+        Return a new graph built from ``columns`` created with to_columns().
+        """
+        graph = cls()
+        nodes = columns['nodes']
+        for path, kind in zip(nodes['path'], nodes['kind']):
+            graph.add_node(path, kind)
+        edges = columns['edges']
+        for from_id, to_id in zip(edges['source'], edges['target']):
+            graph.add_edge(from_id, to_id)
+        return graph
+
+    def dump(self, output_file):
+        """
+        Write this graph as compact columnar JSON to an ``output_file``
+        file-like object.
+        """
+        json.dump(self.to_columns(), output_file, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, input_file):
+        return cls.from_columns(json.load(input_file))
+
+
+def build_graph_from_codebase(codebase):
+    """
+    Return a BuildGraph joining the makedepend and dwarf_source_path scan
+    results of a ``codebase``.
+
+    The .d files provide the object -> source -> header edges. The DWARF
+    source paths of a binary are joined with the object sources using the
+    longest common path suffix, providing the binary -> object edges. A DWARF
+    source path without an object is linked directly to its binary.
+    """
+    graph = BuildGraph()
+    # object node ids indexed by source path
+    objects_by_source = PathSuffixIndex()
+    binaries = []
+
+    for resource in codebase.walk():
+        if not resource.is_file:
+            continue
+
+        makedepend = getattr(resource, 'makedepend', None)
+        if makedepend:
+            base_dir = posixpath.dirname(resource.path)
+            add_make_dependencies(graph, makedepend, base_dir, objects_by_source)
+
+        dwarf_source_paths = getattr(resource, 'dwarf_source_path', None)
+        if dwarf_source_paths:
+            binaries.append((resource.path, dwarf_source_paths))
+
+    for binary_path, source_paths in binaries:
+        binary_id = graph.add_node(binary_path, BINARY)
+        for source_path in source_paths:
+            if not isinstance(source_path, str):
+                # a [kind, path] DWARF entry as in ['primary', '/src/foo.c']
+                source_path = source_path[-1]
+            source_path = posixpath.normpath(source_path)
+            object_ids = objects_by_source.find_longest(source_path)
+            if object_ids:
+                for object_id in object_ids:
+                    graph.add_edge(binary_id, object_id)
+            else:
+                source_id = graph.add_node(source_path, get_kind(source_path))
+                graph.add_edge(binary_id, source_id)
+
+    return graph
+
+
+def add_make_dependencies(graph, makedepend, base_dir, objects_by_source):
+    """
+    Add to a ``graph`` the object -> source -> header edges of a
+    ``makedepend`` mapping of {target: [prerequisites]} where relative paths
+    are relative to ``base_dir``. Add the objects to the ``objects_by_source``
+    PathSuffixIndex by main source path.
+    """
+    for target, prerequisites in makedepend.items():
+        object_id = graph.add_node(resolve(base_dir, target), OBJECT)
+        paths = [resolve(base_dir, p) for p in prerequisites]
+        sources = [p for p in paths if get_kind(p) == SOURCE]
+        headers = [p for p in paths if get_kind(p) == HEADER]
+
+        if not sources:
+            for header in headers:
+                graph.add_edge(object_id, graph.add_node(header, HEADER))
+            continue
+
+        for source in sources:
+            source_id = graph.add_node(source, SOURCE)
+            graph.add_edge(object_id, source_id)
+            objects_by_source.add(source, object_id)
+            for header in headers:
+                graph.add_edge(source_id, graph.add_node(header, HEADER))
+
+
+def resolve(base_dir, path):
+    """
+    Return a normalized ``path`` resolved relative to ``base_dir`` if relative.
+    """
+    if not posixpath.isabs(path):
+        path = posixpath.join(base_dir, path)
+    return posixpath.normpath(path)
@@ -8,22 +8,30 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+import mmap
+import posixpath
 import re
+from functools import partial
 
 import attr
 
+from commoncode import fileutils
+from commoncode.cliutils import POST_SCAN_GROUP
 from commoncode.cliutils import SCAN_GROUP
 from commoncode.cliutils import PluggableCommandLineOption
+from plugincode.post_scan import PostScanPlugin
+from plugincode.post_scan import post_scan_impl
 from plugincode.scan import ScanPlugin
 from plugincode.scan import scan_impl
-from textcode import analysis
 from typecode import contenttype
 
+from compiledcode.utils import PathSuffixIndex
+
 
 @scan_impl
 class CPPIncludesScanner(ScanPlugin):
     """
-    Collect the #includes statements in a C/C++ file.
+    Collect the #includes statements in a C/C++, Objective-C or assembly file.
     """
     resource_attributes = dict(
         cpp_includes=attr.ib(default=attr.Factory(list), repr=False),
@@ -32,7 +40,17 @@ class CPPIncludesScanner(ScanPlugin):
     options = [
         PluggableCommandLineOption(('--cpp-includes',),
                                    is_flag=True, default=False,
-                                   help='Collect the #includes statements in a C/C++ file.',
+                                   help='Collect the #includes statements in a C/C++, Objective-C '
+                                   'or assembly file and the C++20 module imports.',
+                                   help_group=SCAN_GROUP,
+                                   sort_order=100),
+
+        PluggableCommandLineOption(('--cpp-includes-preamble-only',),
+                                   is_flag=True, default=False,
+                                   required_options=['cpp_includes'],
+                                   help='Only collect the #includes statements of the '
+                                   'preprocessor preamble at the top of a C/C++ '
+                                   'file and stop at the first line of code.',
                                    help_group=SCAN_GROUP,
                                    sort_order=100),
     ]
@@ -40,27 +58,413 @@ class CPPIncludesScanner(ScanPlugin):
     def is_enabled(self, cpp_includes, **kwargs):
         return cpp_includes
 
-    def get_scanner(self, **kwargs):
-        return cpp_includes
+    def get_scanner(self, cpp_includes_preamble_only=False, **kwargs):
+        return partial(cpp_includes, preamble_only=cpp_includes_preamble_only)
+
+
+# Match an include or import directive starting at a "#" and capture the
+# included name with its opening delimiter as in "<stdio.h" or '"foo.h'
+CPP_INCLUDE_RE = re.compile(
+    rb'#[\t ]*'
+    rb'(?:include|import)'
+    rb'[\t ]+'
+    rb'''(["'<][a-zA-Z0-9_\-/\. ]*)'''
+    rb'''(?:["'>"])'''
+)
+
+
+# Match an include or import directive in a text line: this is the pattern
+# returned by cpp_includes_re() for the callers that match decoded lines
+_CPP_INCLUDES_TEXT_RE = re.compile(
+    r'(?:[\t ]*#[\t ]*'
+    r'(?:include|import)'
+    r'[\t ]+)'
+    r'''(["'<][a-zA-Z0-9_\-/\. ]*)'''
+    r'''(?:["'>"])'''
+)
 
 
 def cpp_includes_re():
-    return re.compile(
-        '(?:[\t ]*#[\t ]*'
-        '(?:include|import)'
-        '[\t ]+)'
-        '''(["'<][a-zA-Z0-9_\-/\. ]*)'''
-        '''(?:["'>"])'''
+    return _CPP_INCLUDES_TEXT_RE
+
+
+# {file extension: language} of the files with includes. The headers and
+# include files shared by C, C++, Objective-C and assembly are matched with
+# the statements of all these languages
+LANGUAGE_BY_EXTENSION = {
+    '.c': 'c',
+    '.h': 'any',
+    '.i': 'c',
+    '.inc': 'any',
+    '.cc': 'cpp',
+    '.cp': 'cpp',
+    '.cpp': 'cpp',
+    '.cxx': 'cpp',
+    '.c++': 'cpp',
+    '.hh': 'cpp',
+    '.hpp': 'cpp',
+    '.hxx': 'cpp',
+    '.h++': 'cpp',
+    '.ii': 'cpp',
+    '.inl': 'cpp',
+    '.ixx': 'cpp',
+    '.cppm': 'cpp',
+    '.m': 'objc',
+    '.mm': 'objc',
+    # .S preprocessed assembly is matched lowercase
+    '.s': 'asm',
+    '.asm': 'asm',
+}
+
+# {language: regex} of the statements other than the "#" directives that
+# include a file or import a module, capturing the included name with its
+# opening delimiter if any:
+# - C++20 "import <vector>;", 'import "foo.h";' and "export import foo.bar;"
+# - Objective-C "@import Foundation;"
+# - GNU as '.include "macros.s"' and NASM '%include "macros.inc"'
+STATEMENT_REGEXES = {
+    'cpp': rb'''(?:export[\t ]+)?import[\t ]+(<[^>\n]*|"[^"\n]*|[\w.:]+)[^;\n]*;''',
+    'objc': rb'''@import[\t ]+([\w.]+)[\t ]*;''',
+    'asm': rb'''[.%]include[\t ]+(["'][^"'\n]*)["']''',
+}
+STATEMENT_REGEXES['any'] = b'|'.join(
+    b'(?:' + regex + b')' for regex in STATEMENT_REGEXES.values()
+)
+
+# The C++20 module declarations that can be part of a preamble
+_CPP_MODULE_DECLARATION = rb'(?:export[\t ]+)?module\b[^;\n]*;'
+
+# {language: compiled regex} matching a statement at a position
+_STATEMENTS = {
+    'cpp': re.compile(STATEMENT_REGEXES['cpp'] + b'|' + _CPP_MODULE_DECLARATION),
+    'objc': re.compile(STATEMENT_REGEXES['objc']),
+    'asm': re.compile(STATEMENT_REGEXES['asm']),
+    'any': re.compile(STATEMENT_REGEXES['any'] + b'|' + _CPP_MODULE_DECLARATION),
+}
+
+# {language: compiled regex} matching both the "#" directives and the
+# statements at the start of a line in a single pass
+_DIRECTIVES_AND_STATEMENTS = {
+    language: re.compile(
+        CPP_INCLUDE_RE.pattern + rb'|^[\t ]*(?:' + regex + rb')',
+        re.MULTILINE,
     )
+    for language, regex in STATEMENT_REGEXES.items()
+}
+
+
+def get_language(location):
+    """
+    Return the language of the file at ``location`` based on its extension or
+    None if this is not a file with includes.
+    """
+    return LANGUAGE_BY_EXTENSION.get(fileutils.file_extension(location).lower())
+
 
+_SPACES = re.compile(rb'[ \t\r\n\f\v]*').match
 
-def cpp_includes(location, **kwargs):
-    """Collect the #includes statements in a C/C++ file."""
+
+def get_preamble_end(data, language='c'):
+    """
+    Return the offset in ``data`` bytes where the preprocessor preamble ends:
+    the start of the first thing that is neither a blank, a comment, a
+    preprocessor directive nor an import statement of this ``language``.
+    """
+    statement = _STATEMENTS.get(language)
+    length = len(data)
+    pos = 0
+    while pos < length:
+        pos = _SPACES(data, pos).end()
+        start = data[pos:pos + 2]
+        if start == b'/*':
+            end = data.find(b'*/', pos + 2)
+            if end == -1:
+                return length
+            pos = end + 2
+        elif start == b'//':
+            end = data.find(b'\n', pos)
+            if end == -1:
+                return length
+            pos = end + 1
+        elif start[:1] == b'#':
+            # skip a directive and its backslash continuation lines
+            end = data.find(b'\n', pos)
+            while end != -1 and data[pos:end].rstrip(b'\r').endswith(b'\\'):
+                pos = end + 1
+                end = data.find(b'\n', pos)
+            if end == -1:
+                return length
+            pos = end + 1
+        elif statement and statement.match(data, pos):
+            end = data.find(b'\n', pos)
+            if end == -1:
+                return length
+            pos = end + 1
+        else:
+            return pos
+    return length
+
+
+def find_includes(data, end=None, language='c'):
+    """
+    Yield the included names found in ``data`` bytes of a ``language`` up to
+    the ``end`` offset if provided.
+
+    For C, only jump from one "#" to the next with a fast bytes search and
+    match a directive at each "#". For the other languages, match the "#"
+    directives and the language statements with a single combined regex.
+    """
+    if end is None:
+        end = len(data)
+
+    combined = _DIRECTIVES_AND_STATEMENTS.get(language)
+    if combined:
+        for match in combined.finditer(data, 0, end):
+            yield match.group(match.lastindex).decode('utf-8', 'replace')
+        return
+    match = CPP_INCLUDE_RE.match
+    pos = data.find(b'#', 0, end)
+    while pos != -1:
+        directive = match(data, pos, end)
+        if directive:
+            yield directive.group(1).decode('ascii')
+            pos = directive.end()
+        else:
+            pos += 1
+        pos = data.find(b'#', pos, end)
+
+
+def cpp_includes(location, preamble_only=False, **kwargs):
+    """
+    Collect the #includes statements in a C/C++, Objective-C or assembly
+    file and the C++20 module, Objective-C module and assembler imports and
+    includes. If ``preamble_only`` is True, stop at the end of the
+    preprocessor preamble.
+    """
+    language = get_language(location)
+    if not language:
+        return
     T = contenttype.get_type(location)
-    if not T.is_c_source:
+    if not T.is_text:
         return
     results = []
-    for line in analysis.unicode_text_lines(location):
-        for inc in cpp_includes_re().findall(line):
-            results.append(inc)
+    with open(location, 'rb') as inp:
+        try:
+            data = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            return dict(cpp_includes=results)
+        with data:
+            end = get_preamble_end(data, language) if preamble_only else None
+            results.extend(find_includes(data, end, language))
     return dict(cpp_includes=results)
+
+
+@post_scan_impl
+class CPPIncludesResolver(PostScanPlugin):
+    """
+    Resolve the #includes statements of the C/C++ files to the header files of
+    the codebase and collect their transitive includes.
+    """
+    resource_attributes = dict(
+        cpp_includes_resolved=attr.ib(default=attr.Factory(list), repr=False),
+        cpp_includes_transitive=attr.ib(default=attr.Factory(list), repr=False),
+    )
+
+    options = [
+        PluggableCommandLineOption(('--cpp-includes-graph',),
+                                   is_flag=True, default=False,
+                                   required_options=['cpp_includes'],
+                                   help='Resolve the #includes statements to the '
+                                   'scanned header files and collect their '
+                                   'transitive includes.',
+                                   help_group=POST_SCAN_GROUP,
+                                   sort_order=100),
+
+        PluggableCommandLineOption(('--cpp-include-root',),
+                                   multiple=True,
+                                   metavar='DIR',
+                                   required_options=['cpp_includes_graph'],
+                                   help='Resolve the #includes statements first '
+                                   'relative to this DIR include directory path as '
+                                   'found in the scan results such as '
+                                   '"linux/include". Can be repeated.',
+                                   help_group=POST_SCAN_GROUP,
+                                   sort_order=100),
+    ]
+
+    def is_enabled(self, cpp_includes_graph, **kwargs):
+        return cpp_includes_graph
+
+    def process_codebase(self, codebase, cpp_include_root=(), **kwargs):
+        resolve_includes(codebase, include_roots=cpp_include_root)
+
+
+def get_include_name(include):
+    """
+    Return a normalized included file name given an ``include`` collected
+    with its opening delimiter as in "<linux/module.h" or '"foo.h'.
+    """
+    return posixpath.normpath(include.lstrip('<"\'').strip())
+
+
+def build_suffix_index(paths):
+    """
+    Return a PathSuffixIndex of ``paths``.
+    """
+    index = PathSuffixIndex()
+    for path in paths:
+        index.add(path, path)
+    return index
+
+
+def resolve_include(include, path, files, index, include_roots=()):
+    """
+    Return the path of the file that an ``include`` of the file at ``path``
+    resolves to or None. ``files`` is a set of all the file paths and
+    ``index`` is a path suffix index of these files.
+
+    A quoted include is first resolved relative to the including file
+    directory, then any include is resolved relative to each of the
+    ``include_roots`` and finally using the longest matching path suffix,
+    preferring the candidate closest to the including file.
+    """
+    if not include.startswith(('<', '"', "'")):
+        # an imported C++20 or Objective-C module is not a file
+        return
+
+    name = get_include_name(include)
+    if not name or name == '.':
+        return
+
+    if include.startswith(('"', "'")):
+        candidate = posixpath.normpath(posixpath.join(posixpath.dirname(path), name))
+        if candidate in files:
+            return candidate
+
+    for root in include_roots:
+        candidate = posixpath.normpath(posixpath.join(root, name))
+        if candidate in files:
+            return candidate
+
+    if name.startswith('../'):
+        return
+
+    candidates = index.get(name)
+    if not candidates:
+        return
+    if len(candidates) == 1:
+        return candidates[0]
+
+    directory = posixpath.dirname(path)
+    return min(
+        candidates,
+        key=lambda c: (-len(posixpath.commonpath([directory, c])), c),
+    )
+
+
+def get_transitive_includes(edges):
+    """
+    Return a mapping of {path: set of transitively included paths} given a
+    mapping of ``edges`` {path: [directly included paths]}.
+
+    Include cycles are collapsed in strongly connected components computed
+    with an iterative Tarjan algorithm. Each component closure is computed
+    once from the already computed closures of the components it includes.
+    """
+    index_of = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    closures = {}
+    counter = 0
+
+    for start in edges:
+        if start in index_of:
+            continue
+        work = [(start, iter(edges.get(start, ())))]
+        index_of[start] = lowlink[start] = counter
+        counter += 1
+        stack.append(start)
+        on_stack.add(start)
+
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index_of:
+                    index_of[successor] = lowlink[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(edges.get(successor, ()))))
+                    break
+                elif successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == index_of[node]:
+                    # pop a whole component: its successors components are
+                    # all already computed
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+
+                    members = set(component)
+                    closure = set()
+                    for member in component:
+                        for successor in edges.get(member, ()):
+                            closure.add(successor)
+                            if successor not in members:
+                                closure.update(closures[successor])
+                    for member in component:
+                        closures[member] = closure
+
+    return {
+        path: closure - {path}
+        for path, closure in closures.items()
+    }
+
+
+def resolve_includes(codebase, include_roots=()):
+    """
+    Resolve the cpp_includes of the ``codebase`` files to the codebase files
+    using an index of the files paths suffixes and the ``include_roots`` and
+    update each file with its resolved and transitive includes.
+    """
+    files = set()
+    includers = []
+    for resource in codebase.walk():
+        if not resource.is_file:
+            continue
+        files.add(resource.path)
+        if resource.cpp_includes:
+            includers.append(resource)
+
+    if not includers:
+        return
+
+    index = build_suffix_index(files)
+    include_roots = [posixpath.normpath(r.strip('/')) for r in include_roots]
+
+    edges = {}
+    for resource in includers:
+        resolved = []
+        for include in resource.cpp_includes:
+            header = resolve_include(include, resource.path, files, index, include_roots)
+            if header and header != resource.path and header not in resolved:
+                resolved.append(header)
+        edges[resource.path] = resolved
+
+    closures = get_transitive_includes(edges)
+    for resource in includers:
+        resource.cpp_includes_resolved = edges[resource.path]
+        resource.cpp_includes_transitive = sorted(closures[resource.path])
+        codebase.save_resource(resource)
@@ -9,7 +9,9 @@
 #
 
 import os
-
+import posixpath
+import zlib
+from collections import defaultdict
 from functools import partial
 from itertools import chain
 
@@ -17,15 +19,28 @@ import attr
 
 from commoncode import fileutils
 from commoncode.cliutils import PluggableCommandLineOption
+from commoncode.cliutils import POST_SCAN_GROUP
 from commoncode.cliutils import SCAN_GROUP
+from plugincode.post_scan import PostScanPlugin
+from plugincode.post_scan import post_scan_impl
 from plugincode.scan import ScanPlugin
 from plugincode.scan import scan_impl
+from scancode import ScancodeCliUsageError
 from typecode import contenttype
 
 from compiledcode.dwarf import dwarf
 from compiledcode.dwarf import dwarf2
 from compiledcode.dwarf import dwarfng
 
+# libmagic mime types of ELF files as collected with "--info"
+ELF_MIME_TYPES = frozenset([
+    'application/x-executable',
+    'application/x-pie-executable',
+    'application/x-sharedlib',
+    'application/x-object',
+    'application/x-coredump',
+])
+
 
 @scan_impl
 class DwarfScanner(ScanPlugin):
@@ -44,37 +59,225 @@ class DwarfScanner(ScanPlugin):
                                    help_group=SCAN_GROUP,
                                    sort_order=100
                                    ),
+        PluggableCommandLineOption(('--dwarf-processes',),
+                                   type=int, default=1, show_default=True,
+                                   metavar='INT',
+                                   required_options=['dwarf'],
+                                   help='Decode the compilation units of each ELF '
+                                   'DWARF using INT parallel processes. Only ELFs '
+                                   'with a large .debug_info section are decoded '
+                                   'in parallel. Requires '
+                                   '"--processes 0" or "--processes -1" when INT is '
+                                   'more than 1 as scan worker processes cannot start '
+                                   'child processes.',
+                                   help_group=SCAN_GROUP,
+                                   sort_order=101
+                                   ),
     ]
 
     def is_enabled(self, dwarf, **kwargs):
         return dwarf
 
-    def get_scanner(self, **kwargs):
-        return get_dwarfs
+    def setup(self, dwarf_processes=1, processes=1, **kwargs):
+        """
+        Reject parallel DWARF processes in a multi-process scan where they
+        would be silently ignored.
+        """
+        if dwarf_processes > 1 and processes > 0:
+            raise ScancodeCliUsageError(
+                'The "--dwarf-processes" option can only be used with '
+                '"--processes 0" or "--processes -1".'
+            )
 
+    def get_scanner(self, dwarf_processes=1, **kwargs):
+        return partial(get_dwarfs, processes=dwarf_processes)
 
-def get_dwarfs(location, **kwargs):
+
+def get_dwarfs(location, processes=1, **kwargs):
     """
     Return a mapping with original_source_files and included_source_files or None.
     """
     return dict(
         #         dwarf_source_path=list(dwarf_source_path(location))
-        dwarf_source_path=list(dwarf_source_path_ng(location))
+        dwarf_source_path=list(dwarf_source_path_ng(location, processes=processes))
     )
 
 
-def dwarf_source_path_ng(location, **kwargs):
+def dwarf_source_path_ng(location, processes=1, **kwargs):
     """
     Collect unique paths to compiled source code found in Elf binaries DWARF
     sections for D2D.
     """
-    return dwarfng.get_dwarf_cu_and_die_paths(location)
+    return dwarfng.get_dwarf_cu_and_die_paths(location, processes=processes)
+
+
+@post_scan_impl
+class DwarfDebugLinks(PostScanPlugin):
+    """
+    Collect the DWARF source paths of stripped ELF binaries from their separate
+    debug files found in the codebase. A debug file is located using the build
+    id or the ".gnu_debuglink" section of a stripped ELF.
+    """
+    resource_attributes = dict(
+        dwarf_debug_file=attr.ib(default=None, repr=False)
+    )
+
+    options = [
+        PluggableCommandLineOption(('--dwarf-debug-links',),
+                                   is_flag=True, default=False,
+                                   required_options=['dwarf'],
+                                   help='Collect the DWARF source paths of stripped '
+                                   'ELF binaries from their separate debug file '
+                                   'found in the codebase using their build id or '
+                                   '".gnu_debuglink".',
+                                   help_group=POST_SCAN_GROUP,
+                                   sort_order=100
+                                   ),
+    ]
+
+    def is_enabled(self, dwarf_debug_links, **kwargs):
+        return dwarf_debug_links
+
+    def process_codebase(self, codebase, **kwargs):
+        resolve_debug_links(codebase)
+
+
+def resolve_debug_links(codebase):
+    """
+    Update the ``codebase`` stripped ELF resources without DWARF source paths
+    with the DWARF source paths of their separate debug file resource.
+    """
+    debug_files_by_name = defaultdict(list)
+    debug_files_by_build_id = {}
+    elfs_without_dwarf = []
+
+    for resource in codebase.walk():
+        if not resource.is_file:
+            continue
+
+        if resource.dwarf_source_path:
+            debug_files_by_name[resource.name].append(resource)
+            # debug files are stored by build id as in
+            # /usr/lib/debug/.build-id/ab/cdef1234.debug
+            _, build_id_dir, build_id_path = resource.path.rpartition('/.build-id/')
+            if build_id_dir:
+                debug_files_by_build_id[build_id_path] = resource
+
+        elif may_be_elf(resource):
+            elfs_without_dwarf.append(resource)
+
+    for resource in elfs_without_dwarf:
+        debug_file = find_debug_file(
+            resource=resource,
+            debug_files_by_name=debug_files_by_name,
+            debug_files_by_build_id=debug_files_by_build_id,
+        )
+        if not debug_file:
+            continue
+        resource.dwarf_source_path = list(debug_file.dwarf_source_path)
+        resource.dwarf_debug_file = debug_file.path
+        codebase.save_resource(resource)
+
+
+def find_debug_file(resource, debug_files_by_name, debug_files_by_build_id):
+    """
+    Return the separate debug file resource of a stripped ELF ``resource`` or
+    None, given mappings of candidate debug file resources by file name and by
+    build id path.
+    """
+    try:
+        debug_link, crc, build_id = dwarfng.get_debug_links(resource.location)
+    except Exception:
+        return
+
+    if build_id:
+        build_id_path = f'{build_id[:2]}/{build_id[2:]}.debug'
+        debug_file = debug_files_by_build_id.get(build_id_path)
+        if debug_file:
+            return debug_file
+
+    if not debug_link:
+        return
+
+    candidates = debug_files_by_name.get(debug_link)
+    if not candidates:
+        return
+
+    parent_dir = posixpath.dirname(resource.path)
+
+    def closeness(candidate):
+        """
+        Return a sort key for a ``candidate`` debug file: first in the same
+        directory, then in a ".debug" sub-directory, then in a directory tree
+        such as /usr/lib/debug that mirrors the binary directory tree.
+        """
+        candidate_dir = posixpath.dirname(candidate.path)
+        if candidate_dir == parent_dir:
+            return 0, 0, candidate.path
+        if candidate_dir == f'{parent_dir}/.debug':
+            return 1, 0, candidate.path
+        common_segments = 0
+        for segment, candidate_segment in zip(
+            reversed(parent_dir.split('/')),
+            reversed(candidate_dir.split('/')),
+        ):
+            if segment != candidate_segment:
+                break
+            common_segments += 1
+        return 2, -common_segments, candidate.path
+
+    for candidate in sorted(candidates, key=closeness):
+        if crc is None or (candidate.location and get_crc32(candidate.location) == crc):
+            return candidate
+
+
+def may_be_elf(resource):
+    """
+    Return True if a file ``resource`` may be an ELF using its already
+    collected "--info" attributes if any. Return False if the resource has no
+    location.
+    """
+    location = resource.location
+    if not location or not os.path.isfile(location):
+        return False
+    if getattr(resource, 'is_binary', None) is False:
+        return False
+    mime_type = getattr(resource, 'mime_type', None)
+    if mime_type and mime_type not in ELF_MIME_TYPES:
+        return False
+    return is_elf(location)
+
+
+def is_elf(location):
+    """
+    Return True if the file at ``location`` starts with the ELF magic.
+    """
+    try:
+        with open(location, 'rb') as inp:
+            return inp.read(4) == b'\x7fELF'
+    except OSError:
+        return False
+
+
+def get_crc32(location):
+    """
+    Return the CRC32 of the file at ``location`` as used in a ".gnu_debuglink".
+    """
+    crc = 0
+    with open(location, 'rb') as inp:
+        for chunk in iter(partial(inp.read, dwarfng.CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
 
 
 def dwarf_source_path(location):
     """
     Collect unique paths to compiled source code found in Elf binaries DWARF
     sections for D2D.
+
+    The compilation unit paths and the nm-style symbol paths are collected in
+    a single in-process DWARF decode, replacing the former dwarfdump and nm
+    subprocess calls of `get_dwarf1` and `get_dwarf2`.
     """
     if not os.path.exists(location):
         return
@@ -84,7 +287,9 @@ def dwarf_source_path(location):
     seen_paths = set()
     path_file_names = set()
     bare_file_names = set()
-    for dpath in chain(get_dwarf1(location), get_dwarf2(location)):
+    paths, entries = dwarfng.get_dwarf_sources(location)
+    symbol_paths = (e.path for e in entries if e.path)
+    for dpath in chain(paths, symbol_paths):
         if dpath in seen_paths:
             continue
         fn = fileutils.file_name(dpath)
@@ -104,7 +309,7 @@ def dwarf_source_path(location):
 
 def get_dwarf1(location):
     """
-    Using Dwarfdump
+    Using Dwarfdump. Legacy: superseded by `dwarfng.get_dwarf_sources`.
     """
     d = dwarf.Dwarf(location)
     if d:
@@ -120,7 +325,7 @@ def get_dwarf1(location):
 
 def get_dwarf2(location):
     """
-    Using NM
+    Using NM. Legacy: superseded by `dwarfng.get_dwarf_sources`.
     """
     for _, _, path_to_source, _ in dwarf2.get_dwarfs(location):
         if path_to_source:
@@ -15,6 +15,8 @@ DWARF debug data.
 
 import posixpath
 import re
+import subprocess
+import tempfile
 
 from commoncode import command
 from plugincode.location_provider import get_location
@@ -27,28 +29,39 @@ SCANCODE_DWARFDUMP_LIB = 'scancode.dwarfdump.lib'
 ################################################################
 # DWARFDUMP PARSING
 ################################################################
+
+# The dwarfdump output can be huge: these are compiled only once and the
+# factory functions are kept for backward compatibility.
+_EMPTY_LINE_RE = re.compile(r'^\s*$')
+_DCOMP_UNIT_START_RE = re.compile(r'^COMPILE_UNIT<header overall offset =.*$')
+_DCMPDIR_RE = re.compile(r'^DW_AT_comp_dir\s*(.*)$')
+_DCMPDIR_FILE_RE = re.compile(r'^DW_AT_name\s*(.*)$')
+_DLOCAL_SYMBOLS_RE = re.compile(r'^LOCAL_SYMBOLS:$')
+_DWARF_FILES_RE = re.compile(r'^DW_AT_(?:decl|call)_file\s*\d*\s*(.*)$')
+
+
 def EMPTY_LINE_RE():
-    return re.compile('^\s*$')
+    return _EMPTY_LINE_RE
 
 
 def DCOMP_UNIT_START_RE():
-    return re.compile(r'^COMPILE_UNIT<header overall offset =.*$')
+    return _DCOMP_UNIT_START_RE
 
 
 def DCMPDIR_RE():
-    return re.compile(r'^DW_AT_comp_dir\s*(.*)$')
+    return _DCMPDIR_RE
 
 
 def DCMPDIR_FILE_RE():
-    return re.compile(r'^DW_AT_name\s*(.*)$')
+    return _DCMPDIR_FILE_RE
 
 
 def DLOCAL_SYMBOLS_RE():
-    return re.compile(r'^LOCAL_SYMBOLS:$')
+    return _DLOCAL_SYMBOLS_RE
 
 
 def DWARF_FILES_RE():
-    return re.compile(r'^DW_AT_(?:decl|call)_file\s*\d*\s*(.*)$')
+    return _DWARF_FILES_RE
 
 
 class Dwarf(object):
@@ -77,6 +90,7 @@ class Dwarf(object):
         # except in a few cases, such as LKM.
         self.included_source_files = []
 
+        # unique paths, in order of appearance
         self._files = []
 
         self.parse_errors = []
@@ -89,39 +103,54 @@ class Dwarf(object):
     def _parseinfo(self):
         """
         Parse dwarfdump info section of an elf file.
+
+        The dwarfdump output is consumed line by line from a pipe and only the
+        unique paths are kept such that memory use is bounded by the number of
+        distinct source files rather than by the size of the output.
         """
-        rc, out, err = command.execute2(
-            cmd_loc=self.cmd_loc,
-            args=['-i', self.elf_location],
-            lib_dir=self.lib_loc,
-            to_files=True
-        )
-
-        if rc != 0:
-            error = open(err).read()
-            if error:
-                if 'bin/dwarfdump2' in error:
-                    self.parse_errors.append(
-                        error[error.index('bin/dwarfdump2'):])
-                else:
-                    self.parse_errors.append(error)
-
-        # loop through each returned line passing control to a handler
-        with open(out) as lines:
-            for line in lines:
-                line = line.strip()
-                if DCOMP_UNIT_START_RE().match(line):
-                    dwarfinfo = DwarfInfo()
-                    dwarfinfo.parse(self, lines)
+        seen = set()
+        with tempfile.TemporaryFile() as err:
+            proc = subprocess.Popen(
+                [self.cmd_loc, '-i', self.elf_location],
+                env=command.get_env(lib_dir=self.lib_loc) or None,
+                stdout=subprocess.PIPE,
+                stderr=err,
+                universal_newlines=True,
+                errors='replace',
+            )
+            try:
+                for path in parse_dwarfdump_info(proc.stdout):
+                    if path not in seen:
+                        seen.add(path)
+                        self._files.append(path)
+            finally:
+                proc.stdout.close()
+                rc = proc.wait()
+
+            if rc != 0:
+                err.seek(0)
+                error = err.read().decode('utf-8', errors='replace')
+                if error:
+                    if 'bin/dwarfdump2' in error:
+                        self.parse_errors.append(
+                            error[error.index('bin/dwarfdump2'):])
+                    else:
+                        self.parse_errors.append(error)
 
     def cleanup(self):
         original, std_includes = cleanup(self._files)
 
-        self.included_source_files.extend(x for x in std_includes
-                                          if x not in self.included_source_files)
+        seen_included = set(self.included_source_files)
+        for path in std_includes:
+            if path not in seen_included:
+                seen_included.add(path)
+                self.included_source_files.append(path)
 
-        self.original_source_files.extend(x for x in original
-                                          if x not in self.original_source_files)
+        seen_original = set(self.original_source_files)
+        for path in original:
+            if path not in seen_original:
+                seen_original.add(path)
+                self.original_source_files.append(path)
 
     def asdict(self):
         return dict([
@@ -132,16 +161,21 @@ class Dwarf(object):
 
 def cleanup(paths):
     """
-    Given a list of paths, returns two lists: a list of paths likely to be
-    original code and a list of paths likely to be standard includes.
+    Given a list of paths, returns two lists of unique paths: a list of paths
+    likely to be original code and a list of paths likely to be standard
+    includes.
     """
     # TODO: mostly copied from dwarf.Dwarf._cleanup ...
     # the code should not be duplicated
     std_includes = []
     original = []
+    seen = set()
     for p in paths:
         # FIXME: this will NOT work on windows paths
         p = posixpath.normpath(p)
+        if p in seen:
+            continue
+        seen.add(p)
         if contenttype.is_standard_include(p):
             std_includes.append(p)
         else:
@@ -149,6 +183,34 @@ def cleanup(paths):
     return original, std_includes
 
 
+def parse_dwarfdump_info(lines):
+    """
+    Yield source file paths parsed from an iterable of dwarfdump "-i" output
+    ``lines``.
+
+    This is a state machine that is fed one line at a time: each compilation
+    unit header provides the CU file name and compilation directory and its
+    local symbols provide the declaration and call files. It reports the same
+    paths as the former DwarfInfo.parse() that consumed the lines directly:
+    a compilation unit that follows local symbols is parsed with the same
+    DwarfInfo, and the compilation unit that follows a header without a
+    compilation dir is skipped.
+    """
+    dwarfinfo = None
+    for line in lines:
+        if dwarfinfo is None:
+            if _DCOMP_UNIT_START_RE.match(line.strip()):
+                dwarfinfo = DwarfInfo()
+            continue
+
+        if not dwarfinfo.feed(line):
+            yield from dwarfinfo.get_paths()
+            dwarfinfo = None
+
+    if dwarfinfo:
+        yield from dwarfinfo.get_paths()
+
+
 class DwarfInfo(object):
     """
     .debug_info
@@ -216,46 +278,60 @@ class DwarfInfo(object):
                     DW_AT_abstract_origin       <1147>
     """
 
+    # parsing states: in the compilation unit header or in its local symbols
+    HEADER = 'header'
+    LOCAL_SYMBOLS = 'local_symbols'
+
     def __init__(self):
-        self.dwarfdump_option = "-l"
-        self.start_re = DCOMP_UNIT_START_RE()
+        self.state = self.HEADER
         self.cu_filename = ''
         self.cu_comp_dir = ''
+        # unique local symbols paths, in order of appearance
         self.files = []
+        self._seen_files = set()
 
-    def parse(self, dwarf, location):
-        for line in location:
-            if re.match(DCOMP_UNIT_START_RE(), line):
-                break
+    def feed(self, line):
+        """
+        Process one dwarfdump ``line`` of this compilation unit. Return False
+        if this line ends this DwarfInfo.
+        """
+        is_cu_start = _DCOMP_UNIT_START_RE.match(line)
+        if self.state == self.HEADER:
+            if is_cu_start:
+                return False
             line = line.strip()
             # we have a filename followed by a compilation dir name
-            match = DCMPDIR_FILE_RE().match(line)
-            if match:
-                self.cu_filename = match.groups()[0]
-                continue
-            match = DCMPDIR_RE().match(line)
+            match = _DCMPDIR_FILE_RE.match(line)
             if match:
-                self.cu_comp_dir = match.groups()[0]
-                self.parse_local_symbols(location)
-
-        if posixpath.isabs(self.cu_filename):
-            dwarf._files.append(self.cu_filename)
-        else:
-            dwarf._files.append(posixpath.join(
-                self.cu_comp_dir, self.cu_filename))
-
-        dwarf._files.extend(self.files)
-
-    def parse_local_symbols(self, location):
-        for line in location:
-            if not line or re.match(DCOMP_UNIT_START_RE(), line):
-                return
-            line = line.strip()
-            match = DWARF_FILES_RE() .match(line)
+                self.cu_filename = match.group(1)
+                return True
+            match = _DCMPDIR_RE.match(line)
             if match:
-                filename = match.groups()[0]
-                if posixpath.isabs(filename):
-                    self.files.append(filename)
-                else:
-                    self.files.append(posixpath.join(
-                        self.cu_comp_dir, filename))
+                self.cu_comp_dir = match.group(1)
+                self.state = self.LOCAL_SYMBOLS
+            return True
+
+        if is_cu_start:
+            # the next compilation unit header updates this DwarfInfo
+            self.state = self.HEADER
+            return True
+
+        match = _DWARF_FILES_RE.match(line.strip())
+        if match:
+            path = self.abspath(match.group(1))
+            if path not in self._seen_files:
+                self._seen_files.add(path)
+                self.files.append(path)
+        return True
+
+    def abspath(self, filename):
+        if posixpath.isabs(filename):
+            return filename
+        return posixpath.join(self.cu_comp_dir, filename)
+
+    def get_paths(self):
+        """
+        Yield the paths of this compilation unit and of its local symbols.
+        """
+        yield self.abspath(self.cu_filename)
+        yield from self.files
@@ -14,20 +14,63 @@ pyelftools.
 Based on code by:
 Eli Bendersky (eliben@gmail.com): "This code is in the public domain"
 """
+import inspect
 import os
+import posixpath
+import re
+import struct
+import zlib
+from bisect import bisect_right
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
+from multiprocessing import current_process
+from tempfile import SpooledTemporaryFile
 
-from elftools.common.py3compat import bytes2str
+from elftools.common.exceptions import ELFCompressionError
+from elftools.common.utils import struct_parse
 from elftools.dwarf.descriptions import set_global_machine_arch
+from elftools.dwarf.dwarfinfo import DebugSectionDescriptor
 from elftools.elf.elffile import ELFFile
+from elftools.elf.relocation import RelocationHandler
 
 from typecode import contenttype
 
+from compiledcode.dwarf.dwarf2 import Entry
 
-def get_dwarf_cu_and_die_paths(location):
+# Size of the chunks used to read and decompress DWARF sections
+CHUNK_SIZE = 1024 * 1024
+
+# Maximum size of a DWARF section kept in memory. Larger sections are spilled
+# to a temporary file.
+MAX_IN_MEMORY_SECTION_SIZE = 64 * 1024 * 1024
+
+# Minimum size of the .debug_info section of an ELF file for its compilation
+# units to be decoded in parallel. Starting a pool of worker processes costs
+# more than decoding the CUs of smaller sections.
+MIN_PARALLEL_DEBUG_INFO_SIZE = 8 * 1024 * 1024
+
+
+def bytes2str(b):
+    """
+    Return a string decoded from ``b`` bytes. Note: elftools.common.py3compat
+    does not exist in pyelftools 0.30 and up.
+    """
+    return b.decode('utf-8', 'replace')
+
+
+def get_dwarf_cu_and_die_paths(location, processes=1):
     """
     Yield tuple of (path type, path) extracted from DWARFs in the ELF file at
     ``location``. Path type is either "primary" for CU paths or "secondary" for
     indirect references to DIE paths.
+
+    When ``processes`` is larger than 1 and the .debug_info section is at
+    least MIN_PARALLEL_DEBUG_INFO_SIZE bytes, the compilation units are split
+    in contiguous ranges of CU offsets that are decoded in parallel in a pool
+    of worker processes, each with its own ELFFile and DWARF context. The
+    results are the same as a sequential run.
     """
     if not os.path.exists(location):
         return
@@ -36,8 +79,20 @@ def get_dwarf_cu_and_die_paths(location):
     if (not T.is_elf) or T.is_stripped_elf:
         return
 
+    in_parallel = processes and processes > 1 and not current_process().daemon
+    if in_parallel and get_debug_info_size(location) >= MIN_PARALLEL_DEBUG_INFO_SIZE:
+        cu_offsets = get_cu_offsets(location)
+        if len(cu_offsets) > 1:
+            candidates = get_cu_paths_in_parallel(
+                location=location,
+                cu_offsets=cu_offsets,
+                processes=processes,
+            )
+            yield from filter_paths(candidates)
+            return
+
     with open(location, 'rb') as inp:
-        elffile = ELFFile(inp)
+        elffile = DwarfELFFile(inp)
         if not elffile.has_dwarf_info():
             return
 
@@ -46,66 +101,791 @@ def get_dwarf_cu_and_die_paths(location):
         # warning this is a global meaning that the library may not be thread safe
         set_global_machine_arch(elffile.get_machine_arch())
 
+        candidates = chain.from_iterable(
+            get_cu_paths(dwarfinfo, cu) for cu in dwarfinfo.iter_CUs())
+        yield from filter_paths(candidates)
+
+
+def get_debug_info_size(location):
+    """
+    Return the size of the .debug_info section of the ELF file at ``location``
+    as stored in the file, possibly compressed, or 0 if there is none.
+    """
+    with open(location, 'rb') as inp:
+        elffile = DwarfELFFile(inp)
+        for name in ('.debug_info', '.zdebug_info'):
+            section = elffile.get_section_by_name(name)
+            if section is not None:
+                return section['sh_size']
+    return 0
+
+
+def get_cu_offsets(location):
+    """
+    Return a list of the offsets of every compilation unit found in the
+    .debug_info section of the ELF file at ``location``. Only the CU headers
+    are parsed.
+    """
+    with open(location, 'rb') as inp:
+        elffile = DwarfELFFile(inp)
+        if not elffile.has_dwarf_info():
+            return []
+        dwarfinfo = elffile.get_dwarf_info()
+        return [cu.cu_offset for cu in dwarfinfo.iter_CUs()]
+
+
+def get_cu_paths_in_parallel(location, cu_offsets, processes):
+    """
+    Yield (path type, path) candidate tuples for the ``cu_offsets`` list of CU
+    offsets of the ELF file at ``location`` using a pool of ``processes``
+    worker processes. Candidates are yielded in the CU offsets order.
+    """
+    # use a few ranges per process to balance CUs of uneven sizes
+    range_count = min(len(cu_offsets), processes * 4)
+    range_size, remainder = divmod(len(cu_offsets), range_count)
+    cu_ranges = []
+    start = 0
+    for i in range(range_count):
+        end = start + range_size + (1 if i < remainder else 0)
+        cu_ranges.append(cu_offsets[start:end])
+        start = end
+
+    collector = partial(collect_cu_range_paths, location)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for candidates in executor.map(collector, cu_ranges):
+            yield from candidates
+
+
+def collect_cu_range_paths(location, cu_offsets):
+    """
+    Return a list of (path type, path) candidate tuples for the ``cu_offsets``
+    list of CU offsets of the ELF file at ``location``. This runs in a worker
+    process and opens its own ELFFile and DWARF context.
+    """
+    candidates = []
+    with open(location, 'rb') as inp:
+        elffile = DwarfELFFile(inp)
+        dwarfinfo = elffile.get_dwarf_info()
+        set_global_machine_arch(elffile.get_machine_arch())
+
+        # Repeated candidates of a range can be skipped as filter_paths would
+        # discard them anyway. This keeps the data sent back to the parent
+        # small.
         seen = set()
+        for cu_offset in cu_offsets:
+            cu = dwarfinfo.get_CU_at(cu_offset)
+            for candidate in get_cu_paths(dwarfinfo, cu):
+                if candidate not in seen:
+                    candidates.append(candidate)
+                    seen.add(candidate)
+    return candidates
+
+
+def filter_paths(candidates):
+    """
+    Yield unique (path type, path) tuples from a ``candidates`` iterable of
+    (path type, path) tuples as returned by ``get_cu_paths``.
+    """
+    seen = set()
+    for path_type, path in candidates:
+        if path in seen:
+            continue
+        if path_type.startswith('secondary-lp'):
+            # skip a line program file name if it is known with a directory
+            if any(x.endswith(f'/{path}') for x in seen):
+                continue
+        yield path_type, path
+        seen.add(path)
+
+
+def get_cu_paths(dwarfinfo, cu):
+    """
+    Yield (path type, path) candidate tuples found in the ``cu`` compilation
+    unit of the ``dwarfinfo`` DWARF. Candidates are not unique.
+    """
+    # The first Debug Informnation Entry in a CU has the paths.
+    top_die = cu.get_top_DIE()
+    yield 'primary', top_die.get_full_path()
+
+    lineprogram = dwarfinfo.line_program_for_CU(cu)
+
+    try:
+        cu_filename = bytes2str(lineprogram['file_entry'][0].name)
+        if len(lineprogram['include_directory']) > 0:
+            # add directory if possible
+            dir_index = lineprogram['file_entry'][0].dir_index
+            if dir_index > 0:
+                pdir = lineprogram['include_directory'][dir_index - 1]
+                cu_filename = f'{bytes2str(pdir)}/{cu_filename}'
+            yield 'secondary-lp1', cu_filename
+        else:
+            yield 'secondary-lp2', cu_filename
+    except IndexError:
+        pass
+
+    # also yield other dies
+    for die in cu.iter_DIEs():
+        if not die:
+            continue
+
+        decl_file_attrib = die.attributes.get("DW_AT_decl_file")
+        if not decl_file_attrib or not decl_file_attrib.value:
+            continue
+        die_lineprogram = die.dwarfinfo.line_program_for_CU(die.cu)
+        file_entry = die_lineprogram.header.file_entry[decl_file_attrib.value - 1]
+        fname = bytes2str(file_entry.name)
+        try:
+            file_dir = bytes2str(
+                die_lineprogram['include_directory'][file_entry.dir_index - 1])
+        except:
+            continue
 
-        for cu in dwarfinfo.iter_CUs():
+        yield 'secondary-decl1', f'{file_dir}/{fname}'
 
-            # The first Debug Informnation Entry in a CU has the paths.
-            top_die = cu.get_top_DIE()
-            path = top_die.get_full_path()
-            if path not in seen:
-                yield 'primary', path
-                seen.add(path)
+        comp_dir_attr = die.attributes.get('DW_AT_comp_dir', None)
+        comp_dir = bytes2str(
+            comp_dir_attr.value) if comp_dir_attr else ''
+        fname_attr = die.attributes.get('DW_AT_name', None)
+        fname = bytes2str(fname_attr.value) if fname_attr else ''
+        if comp_dir:
+            yield 'secondary-decl2', f'{comp_dir}/{fname}'
 
-            lineprogram = dwarfinfo.line_program_for_CU(cu)
 
+class DwarfELFFile(ELFFile):
+    """
+    An ELFFile that reads its DWARF sections with a bounded memory usage.
+
+    Plain, SHF_COMPRESSED and ".zdebug" GNU-compressed sections are read and
+    decompressed incrementally by chunks in a spooled temporary file that is
+    kept in memory up to MAX_IN_MEMORY_SECTION_SIZE bytes and spilled to disk
+    beyond this size. This overrides the DWARF_SECTION_HOOKS pyelftools
+    methods that are all removed if has_dwarf_section_hooks() is False.
+    """
+
+    def get_section_by_name(self, name):
+        section = super().get_section_by_name(name)
+        if section is None and name.startswith('.zdebug_'):
+            # small sections may be left uncompressed in a file that otherwise
+            # uses ".zdebug" sections
+            section = super().get_section_by_name('.debug_' + name[len('.zdebug_'):])
+        return section
+
+    def _read_dwarf_section(self, section, relocate_dwarf_sections):
+        has_phantom_bytes = getattr(self, 'has_phantom_bytes', None)
+        if has_phantom_bytes and has_phantom_bytes():
+            # pyelftools 0.31 and up drop every odd byte of the DWARF sections
+            # of XC16 PIC binaries. These are small and never compressed.
+            return super()._read_dwarf_section(section, relocate_dwarf_sections)
+
+        section_stream = SpooledTemporaryFile(max_size=MAX_IN_MEMORY_SECTION_SIZE)
+        for chunk in iter_section_data(section):
+            section_stream.write(chunk)
+        size = section_stream.tell()
+
+        # Note: relocations apply to the decompressed data
+        if relocate_dwarf_sections:
+            reloc_handler = RelocationHandler(self)
+            reloc_section = reloc_handler.find_relocations_for_section(section)
+            if reloc_section is not None:
+                reloc_handler.apply_section_relocations(
+                    section_stream, reloc_section)
+
+        return DebugSectionDescriptor(
+            stream=section_stream,
+            name=section.name,
+            global_offset=section['sh_offset'],
+            size=size,
+            address=section['sh_addr'])
+
+    @staticmethod
+    def _decompress_dwarf_section(section):
+        # ".zdebug" sections are already decompressed by _read_dwarf_section
+        return section
+
+
+def has_dwarf_section_hooks():
+    """
+    Return True if the private pyelftools ELFFile methods overridden by
+    DwarfELFFile exist with the expected signatures. setup.py pins the
+    pyelftools versions known to have these.
+    """
+    try:
+        read_params = inspect.signature(ELFFile._read_dwarf_section).parameters
+        decompress_params = inspect.signature(ELFFile._decompress_dwarf_section).parameters
+    except (AttributeError, TypeError, ValueError):
+        return False
+    return (
+        list(read_params) == ['self', 'section', 'relocate_dwarf_sections']
+        and list(decompress_params) == ['section']
+        and DebugSectionDescriptor._fields == (
+            'stream', 'name', 'global_offset', 'size', 'address')
+    )
+
+
+# The ELFFile methods overridden by DwarfELFFile: these work together and
+# are removed together as the ".zdebug" section lookup fallback is only valid
+# with the overridden decompression
+DWARF_SECTION_HOOKS = (
+    'get_section_by_name',
+    '_read_dwarf_section',
+    '_decompress_dwarf_section',
+)
+
+
+if not has_dwarf_section_hooks():
+    # read whole DWARF sections with the public pyelftools API instead
+    for hook in DWARF_SECTION_HOOKS:
+        delattr(DwarfELFFile, hook)
+
+
+def iter_section_data(section):
+    """
+    Yield chunks of bytes of the data of an ELF ``section``, decompressed if
+    this is a SHF_COMPRESSED or a ".zdebug" GNU-compressed section.
+    """
+    stream = section.stream
+    offset = section['sh_offset']
+    size = section['sh_size']
+
+    if section.compressed:
+        chdr_struct = section.structs.Elf_Chdr
+        chdr = struct_parse(chdr_struct, stream, stream_pos=offset)
+        if chdr['ch_type'] != 'ELFCOMPRESS_ZLIB':
+            raise ELFCompressionError(
+                f'Unknown compression type: {chdr["ch_type"]!r} '
+                f'for section: {section.name}')
+        hdr_size = chdr_struct.sizeof()
+        stream.seek(offset + hdr_size)
+        chunks = iter_chunks(stream, size=size - hdr_size)
+        yield from iter_decompressed(chunks, expected_size=chdr['ch_size'])
+
+    elif section.name.startswith('.zdebug'):
+        # These start with a "ZLIB" magic followed by the decompressed size as
+        # a big-endian 8 bytes integer.
+        stream.seek(offset)
+        if stream.read(4) != b'ZLIB':
+            raise ELFCompressionError(
+                f'Invalid compression type for section: {section.name}')
+        expected_size, = struct.unpack('>Q', stream.read(8))
+        chunks = iter_chunks(stream, size=size - 12)
+        yield from iter_decompressed(chunks, expected_size=expected_size)
+
+    else:
+        stream.seek(offset)
+        yield from iter_chunks(stream, size=section.data_size)
+
+
+def iter_chunks(stream, size=None):
+    """
+    Yield chunks of at most CHUNK_SIZE bytes read from a ``stream`` from its
+    current position up to ``size`` bytes or the end of the ``stream`` if
+    ``size`` is None.
+    """
+    while size is None or size > 0:
+        to_read = CHUNK_SIZE if size is None else min(CHUNK_SIZE, size)
+        chunk = stream.read(to_read)
+        if not chunk:
+            return
+        if size is not None:
+            size -= len(chunk)
+        yield chunk
+
+
+def iter_decompressed(chunks, expected_size):
+    """
+    Yield chunks of decompressed bytes from a ``chunks`` iterable of zlib
+    compressed bytes. Each yielded chunk is at most CHUNK_SIZE bytes long.
+    Raise an ELFCompressionError if the decompressed data is not
+    ``expected_size`` bytes long.
+    """
+    size = 0
+    decompressor = zlib.decompressobj()
+    for chunk in chunks:
+        while chunk:
+            decompressed = decompressor.decompress(chunk, CHUNK_SIZE)
+            size += len(decompressed)
+            yield decompressed
+            chunk = decompressor.unconsumed_tail
+    decompressed = decompressor.flush()
+    size += len(decompressed)
+    yield decompressed
+
+    if size != expected_size:
+        raise ELFCompressionError(
+            f'Decompressed data is {size} bytes long, '
+            f'should be {expected_size} bytes long')
+
+
+def get_debug_links(location):
+    """
+    Return a tuple of (debug link file name, debug link CRC32, build id) found
+    in the ELF file at ``location``, using None for a value that is not
+    present. These are used to locate a separate companion debug file for a
+    stripped ELF.
+
+    The debug link file name and CRC32 are from the ".gnu_debuglink" section
+    and the build id is a hex string from the NT_GNU_BUILD_ID note.
+    """
+    debug_link = crc = build_id = None
+    with open(location, 'rb') as inp:
+        elffile = ELFFile(inp)
+
+        debuglink_section = elffile.get_section_by_name('.gnu_debuglink')
+        if debuglink_section is not None:
+            data = debuglink_section.data()
+            name, _, _ = data.partition(b'\0')
+            if name:
+                debug_link = bytes2str(name)
+                # the CRC32 is the last 4 bytes after a 4 bytes aligned name
+                if len(data) >= 4:
+                    endian = '<' if elffile.little_endian else '>'
+                    crc, = struct.unpack(endian + 'I', data[-4:])
+
+        for section in elffile.iter_sections():
+            if section['sh_type'] != 'SHT_NOTE':
+                continue
+            for note in section.iter_notes():
+                if note['n_type'] == 'NT_GNU_BUILD_ID':
+                    build_id = note['n_desc']
+                    break
+            if build_id:
+                break
+
+    return debug_link, crc, build_id
+
+
+################################################################
+# SINGLE PASS DWARF SOURCES AND SYMBOLS EXTRACTION
+################################################################
+
+def get_dwarf_sources(location):
+    """
+    Return a tuple of (paths, entries) extracted from a single decode of the
+    DWARFs in the ELF file at ``location``, where:
+
+    - ``paths`` is a list of unique normalized paths of the compilation units
+      and of the files referenced in their DIEs, as collected with dwarfdump in
+      ``dwarf.Dwarf``.
+
+    - ``entries`` is a list of unique Entry(type, symbol, path, linenum) for
+      the ELF symbols, as collected with "nm -al" in ``dwarf2.get_dwarfs``.
+
+    The caller is responsible for checking that ``location`` is an ELF.
+    """
+    tables = DwarfTables()
+    with open(location, 'rb') as inp:
+        elffile = DwarfELFFile(inp)
+        if elffile.has_dwarf_info():
+            dwarfinfo = elffile.get_dwarf_info()
+            set_global_machine_arch(elffile.get_machine_arch())
+            for cu in dwarfinfo.iter_CUs():
+                tables.add_cu(dwarfinfo, cu)
+            tables.sort_lines()
+
+        # symbols are reported even without DWARF
+        entries = list(get_symbol_entries(elffile, tables))
+
+    paths = []
+    seen = set()
+    for path in tables.paths:
+        path = posixpath.normpath(path)
+        if path not in seen:
+            paths.append(path)
+            seen.add(path)
+    return paths, entries
+
+
+# DWARF location expression for a static address
+DW_OP_addr = 0x03
+
+
+class DwarfTables(object):
+    """
+    Tables collected from the compilation units of a DWARF: the source paths,
+    the functions and variables declaration files and lines and the line
+    program rows used to find the file and line of an address.
+    """
+
+    def __init__(self):
+        # list of source paths, not unique
+        self.paths = []
+        # {function name: [(low_pc, high_pc, path, line), ...]}
+        self.functions = defaultdict(list)
+        # {(variable name, address): (path, line)}
+        self.variables = {}
+        # sorted lists of line program rows addresses and of matching
+        # (path, line) or None for the end of a sequence
+        self.line_addresses = []
+        self.line_rows = []
+
+    def add_cu(self, dwarfinfo, cu):
+        """
+        Collect the paths, functions, variables and line rows of a ``cu``
+        compilation unit of a ``dwarfinfo`` DWARF.
+        """
+        top_die = cu.get_top_DIE()
+        comp_dir = get_str_attribute(top_die, 'DW_AT_comp_dir')
+        cu_name = get_str_attribute(top_die, 'DW_AT_name')
+        if cu_name:
+            self.paths.append(posixpath.join(comp_dir, cu_name))
+
+        lineprogram = dwarfinfo.line_program_for_CU(cu)
+        if not lineprogram:
+            return
+        file_paths = get_file_paths(lineprogram, comp_dir)
+
+        for die in cu.iter_DIEs():
+            if die.is_null():
+                continue
+
+            for file_attribute in ('DW_AT_decl_file', 'DW_AT_call_file'):
+                file_path = get_file_path(die, file_attribute, file_paths)
+                if file_path:
+                    self.paths.append(file_path)
+
+            if die.tag == 'DW_TAG_subprogram':
+                self.add_function(die, file_paths)
+            elif die.tag == 'DW_TAG_variable':
+                self.add_variable(die, file_paths)
+
+        for entry in lineprogram.get_entries():
+            state = entry.state
+            if state is None:
+                continue
+            if state.end_sequence:
+                self.line_addresses.append(state.address)
+                self.line_rows.append(None)
+                continue
+            file_path = file_paths.get(state.file)
+            if file_path and state.line:
+                self.line_addresses.append(state.address)
+                self.line_rows.append((file_path, state.line))
+
+    def add_function(self, die, file_paths):
+        low_pc = die.attributes.get('DW_AT_low_pc')
+        if not low_pc:
+            return
+        low_pc = low_pc.value
+        high_pc = die.attributes.get('DW_AT_high_pc')
+        if high_pc:
+            high_pc = high_pc.value
+            if isinstance(high_pc, int) and die.attributes['DW_AT_high_pc'].form != 'DW_FORM_addr':
+                # DWARF4 and up: this is an offset from the low_pc
+                high_pc += low_pc
+        else:
+            high_pc = low_pc + 1
+
+        origin = get_origin(die)
+        name = get_linkage_name(die) or get_linkage_name(origin)
+        if not name:
+            return
+        file_path = (
+            get_file_path(die, 'DW_AT_decl_file', file_paths)
+            or get_file_path(origin, 'DW_AT_decl_file', file_paths)
+        )
+        line = get_line(die) or get_line(origin)
+        self.functions[name].append((low_pc, high_pc, file_path, line))
+
+    def add_variable(self, die, file_paths):
+        # Note: like nm, we do not follow a DW_AT_specification for variables
+        address = get_static_address(die)
+        if address is None:
+            return
+        name = get_str_attribute(die, 'DW_AT_name')
+        if not name:
+            return
+        file_path = get_file_path(die, 'DW_AT_decl_file', file_paths)
+        self.variables[(name, address)] = file_path, get_line(die)
+
+    def sort_lines(self):
+        """
+        Sort line rows by address. At the same address, end of sequence
+        markers come first and rows keep their line program order.
+        """
+        rows = sorted(
+            zip(self.line_addresses, self.line_rows),
+            key=lambda r: (r[0], r[1] is not None),
+        )
+        self.line_addresses = [address for address, _ in rows]
+        self.line_rows = [row for _, row in rows]
+
+    def find_function(self, name, address):
+        """
+        Return a (path, line) tuple for the function ``name`` containing
+        ``address`` or None.
+        """
+        best = None
+        for low_pc, high_pc, file_path, line in self.functions.get(name, ()):
+            if low_pc <= address < high_pc:
+                size = high_pc - low_pc
+                if not best or size < best[0]:
+                    best = size, file_path, line
+        if best:
+            return best[1:]
+
+    def find_variable(self, name, address):
+        """
+        Return a (path, line) tuple for the variable ``name`` at ``address``
+        or None.
+        """
+        return self.variables.get((name, address))
+
+    def find_line(self, address):
+        """
+        Return a (path, line) tuple for the line program row containing
+        ``address`` or None.
+        """
+        index = bisect_right(self.line_addresses, address) - 1
+        if index >= 0:
+            return self.line_rows[index]
+
+
+def get_str_attribute(die, name):
+    """
+    Return the string value of the ``name`` attribute of a ``die`` or an empty
+    string.
+    """
+    attribute = die.attributes.get(name)
+    if attribute and isinstance(attribute.value, bytes):
+        return bytes2str(attribute.value)
+    return ''
+
+
+def get_origin(die):
+    """
+    Return the DIE this ``die`` is a concrete instance or a definition of or
+    the ``die`` itself.
+    """
+    for name in ('DW_AT_abstract_origin', 'DW_AT_specification'):
+        if name in die.attributes:
             try:
-                cu_filename = bytes2str(lineprogram['file_entry'][0].name)
-                if len(lineprogram['include_directory']) > 0:
-                    # add directory if possible
-                    dir_index = lineprogram['file_entry'][0].dir_index
-                    if dir_index > 0:
-                        pdir = lineprogram['include_directory'][dir_index - 1]
-                        cu_filename = f'{bytes2str(pdir)}/{cu_filename}'
-                    if cu_filename not in seen and not any(x.endswith(f'/{cu_filename}') for x in seen):
-                        yield 'secondary-lp1', cu_filename
-                        seen.add(cu_filename)
-                else:
-                    if cu_filename not in seen and not any(x.endswith(f'/{cu_filename}') for x in seen):
-                        yield 'secondary-lp2', cu_filename
-                        seen.add(cu_filename)
-            except IndexError:
+                return die.get_DIE_from_attribute(name)
+            except Exception:
                 pass
+    return die
+
+
+def get_linkage_name(die):
+    """
+    Return the symbol name of a ``die`` preferring a linkage name over a
+    plain name as symbols names are mangled.
+    """
+    return (
+        get_str_attribute(die, 'DW_AT_linkage_name')
+        or get_str_attribute(die, 'DW_AT_MIPS_linkage_name')
+        or get_str_attribute(die, 'DW_AT_name')
+    )
+
+
+def get_line(die):
+    line = die.attributes.get('DW_AT_decl_line')
+    return line and line.value or 0
+
+
+def get_static_address(die):
+    """
+    Return the static address of a variable ``die`` or None.
+    """
+    location = die.attributes.get('DW_AT_location')
+    if not location or not isinstance(location.value, list):
+        return
+    expression = location.value
+    if len(expression) < 2 or expression[0] != DW_OP_addr:
+        return
+    address_bytes = bytes(expression[1:])
+    byteorder = 'little' if die.dwarfinfo.config.little_endian else 'big'
+    return int.from_bytes(address_bytes, byteorder)
+
+
+def get_file_paths(lineprogram, comp_dir):
+    """
+    Return a mapping of {file index: path} for the files of a ``lineprogram``
+    where a relative path is joined to its directory and to the ``comp_dir``
+    compilation directory.
+    """
+    version = lineprogram.header.version
+    directories = [bytes2str(d) for d in lineprogram['include_directory']]
+    # DWARF5 indexes start at zero and the directory zero is the comp_dir
+    first_index = 0 if version >= 5 else 1
+
+    file_paths = {}
+    for index, file_entry in enumerate(lineprogram['file_entry'], first_index):
+        path = bytes2str(file_entry.name)
+        if not posixpath.isabs(path):
+            dir_index = file_entry.dir_index
+            if version < 5:
+                dir_index -= 1
+            if 0 <= dir_index < len(directories):
+                path = posixpath.join(directories[dir_index], path)
+            if comp_dir and not posixpath.isabs(path):
+                path = posixpath.join(comp_dir, path)
+        file_paths[index] = path
+    return file_paths
+
+
+def get_file_path(die, name, file_paths):
+    """
+    Return the path for the ``name`` file index attribute of a ``die`` or an
+    empty string.
+    """
+    attribute = die.attributes.get(name)
+    if attribute and attribute.value:
+        return file_paths.get(attribute.value, '')
+    return ''
+
+
+# names of symbols that look like a path to a source file
+POSSIBLE_SOURCE_PATH = re.compile(
+    r'^.*\.(c|cc|cpp|cxx|h|hh|hpp|hxx|i|m|y|s)?$', re.IGNORECASE).match
+
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+
+# symbol types of sections that are special-cased by nm
+SECTION_SYMBOL_TYPES = {
+    '.drectve': 'i',
+    '.edata': 'e',
+    '.idata': 'i',
+    '.pdata': 'p',
+}
+
+
+def get_symbol_entries(elffile, tables):
+    """
+    Yield unique Entry(type, symbol, path, linenum) for each defined symbol of
+    an ``elffile`` using the ``tables`` DwarfTables to find the symbols source
+    path and line as done by "nm -al".
+
+    A symbol is reported with the declaration file and line of its function
+    or variable as done by modern nm, and also with the file and line of its
+    address in the line programs as done by older nm. The latter also covers
+    code in data sections and the section symbols of object files, where all
+    sections start at address zero.
+    """
+    symtab = get_symbol_table(elffile)
+    if not symtab:
+        return
+
+    sections = list(elffile.iter_sections())
+    seen = set()
+
+    for index, symbol in enumerate(symtab.iter_symbols()):
+        if not index:
+            # skip the null symbol
+            continue
+
+        shndx = symbol['st_shndx']
+        if shndx == 'SHN_UNDEF':
+            continue
+
+        name = symbol.name
+        symbol_kind = symbol['st_info']['type']
+        section = None
+        if isinstance(shndx, int) and shndx < len(sections):
+            section = sections[shndx]
+            if symbol_kind == 'STT_SECTION':
+                name = section.name
+
+        symbol_type = get_symbol_type(symbol, section)
+        if not symbol_type:
+            continue
+
+        address = symbol['st_value']
+        locations = []
+        if section is not None:
+            if symbol_kind in ('STT_FUNC', 'STT_GNU_IFUNC'):
+                locations.append(tables.find_function(name, address))
+            else:
+                locations.append(tables.find_variable(name, address))
+            locations.append(tables.find_line(address))
+
+        entries = [
+            Entry(symbol_type, name, path, str(line))
+            for path, line in filter(None, locations)
+            if path and line
+        ]
+        if not entries and POSSIBLE_SOURCE_PATH(name):
+            entries = [Entry(symbol_type, '', name, '')]
+
+        for entry in entries:
+            if entry not in seen:
+                yield entry
+                seen.add(entry)
+
+
+def get_symbol_table(elffile):
+    """
+    Return the symbol table section of an ``elffile`` or its dynamic symbol
+    table or None. Sections are found by type rather than by name as the
+    section names string table may be corrupted. A table without a valid
+    linked string table is ignored.
+    """
+    symtab = None
+    for section in elffile.iter_sections():
+        if not hasattr(section, 'iter_symbols'):
+            continue
+        if not hasattr(getattr(section, 'stringtable', None), 'get_string'):
+            continue
+        if section['sh_type'] == 'SHT_SYMTAB':
+            return section
+        if section['sh_type'] == 'SHT_DYNSYM' and symtab is None:
+            symtab = section
+    return symtab
+
+
+def get_symbol_type(symbol, section):
+    """
+    Return a one letter symbol type for an ELF ``symbol`` defined in
+    ``section`` as reported by nm or None.
+    """
+    shndx = symbol['st_shndx']
+    bind = symbol['st_info']['bind']
+    symbol_kind = symbol['st_info']['type']
+
+    if shndx == 'SHN_COMMON':
+        return 'C'
+    if symbol_kind == 'STT_GNU_IFUNC':
+        return 'i'
+    if bind == 'STB_WEAK':
+        return 'V' if symbol_kind == 'STT_OBJECT' else 'W'
+    if bind == 'STB_GNU_UNIQUE':
+        return 'u'
+    if bind not in ('STB_LOCAL', 'STB_GLOBAL'):
+        return
+
+    if shndx == 'SHN_ABS':
+        symbol_type = 'a'
+    elif section is not None:
+        symbol_type = get_section_symbol_type(section)
+    else:
+        return
+
+    if bind == 'STB_GLOBAL':
+        symbol_type = symbol_type.upper()
+    return symbol_type
+
+
+def get_section_symbol_type(section):
+    """
+    Return a one letter symbol type for symbols defined in an ELF ``section``
+    as reported by nm.
+    """
+    name = section.name
+    for prefix, symbol_type in SECTION_SYMBOL_TYPES.items():
+        if name.startswith(prefix) and name[len(prefix):len(prefix) + 1] in '.$0123456789':
+            return symbol_type
 
-            # also yield other dies
-            for die in cu.iter_DIEs():
-                if not die:
-                    continue
-
-                decl_file_attrib = die.attributes.get("DW_AT_decl_file")
-                if not decl_file_attrib or not decl_file_attrib.value:
-                    continue
-                die_lineprogram = die.dwarfinfo.line_program_for_CU(die.cu)
-                file_entry = die_lineprogram.header.file_entry[decl_file_attrib.value - 1]
-                fname = bytes2str(file_entry.name)
-                try:
-                    file_dir = bytes2str(
-                        die_lineprogram['include_directory'][file_entry.dir_index - 1])
-                except:
-                    continue
-
-                path = f'{file_dir}/{fname}'
-                if path not in seen:
-                    yield 'secondary-decl1', path
-                    seen.add(path)
-
-                comp_dir_attr = die.attributes.get('DW_AT_comp_dir', None)
-                comp_dir = bytes2str(
-                    comp_dir_attr.value) if comp_dir_attr else ''
-                fname_attr = die.attributes.get('DW_AT_name', None)
-                fname = bytes2str(fname_attr.value) if fname_attr else ''
-                if comp_dir:
-                    path = f'{comp_dir}/{fname}'
-                    if path not in seen:
-                        yield 'secondary-decl2', path
-                        seen.add(path)
+    flags = section['sh_flags']
+    has_contents = section['sh_type'] != 'SHT_NOBITS'
+    if flags & SHF_EXECINSTR:
+        return 't'
+    if flags & SHF_ALLOC and has_contents:
+        return 'd' if flags & SHF_WRITE else 'r'
+    if not has_contents:
+        return 'b'
+    if name.startswith(('.debug', '.zdebug', '.gnu.linkonce.wi.', '.line', '.stab')):
+        return 'N'
+    if not flags & SHF_WRITE:
+        return 'n'
+    return '?'
@@ -8,20 +8,27 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+from collections import defaultdict
 from collections import namedtuple
 from functools import partial
 from itertools import chain
 import re
+import sys
 
 import attr
 
 from commoncode.cliutils import PluggableCommandLineOption
+from commoncode.cliutils import POST_SCAN_GROUP
 from commoncode.cliutils import SCAN_GROUP
+from plugincode.post_scan import PostScanPlugin
+from plugincode.post_scan import post_scan_impl
 from plugincode.scan import ScanPlugin
 from plugincode.scan import scan_impl
 from textcode import analysis
 from typecode import contenttype
 
+from compiledcode.utils import PathSuffixIndex
+
 
 @scan_impl
 class GWTScanner(ScanPlugin):
@@ -40,13 +47,22 @@ class GWTScanner(ScanPlugin):
                                    help='Parse GWT (Google Web Toolkit) ".symbolMap" files to extract compilation/debug symbols. Used to infer the relationship between the compiled JavaScript and the original Java Source code.',
                                    help_group=SCAN_GROUP,
                                    sort_order=100),
+
+        PluggableCommandLineOption(('--gwt-aggregate',),
+                                   is_flag=True, default=False,
+                                   required_options=['gwt'],
+                                   help='Report GWT symbols aggregated by source path with '
+                                   'their classes, line range and symbols count '
+                                   'instead of one entry for each symbol.',
+                                   help_group=SCAN_GROUP,
+                                   sort_order=101),
     ]
 
     def is_enabled(self, gwt, **kwargs):
         return gwt
 
-    def get_scanner(self, **kwargs):
-        return gwt_scan
+    def get_scanner(self, gwt_aggregate=False, **kwargs):
+        return partial(gwt_scan, aggregate=gwt_aggregate)
 
 
 # maps actual header names to our field names
@@ -66,7 +82,7 @@ def is_symbol_map(location):
     return location.lower().endswith('.symbolmap')
 
 
-def gwt_scan(location, **kwargs):
+def gwt_scan(location, aggregate=False, **kwargs):
     """
     return symbols extracted for a .symbolmap location. Symbol maps
     are produced by GWT compilation.
@@ -77,35 +93,223 @@ def gwt_scan(location, **kwargs):
     These files are like a CSV location with # python like comment lines.
     See as a good base to understand the format:
     http://code.google.com/p/speedtracer/source/browse/trunk/src/client/ui/src/com/google/speedtracer/client/GwtSymbolMapParser.java?r=84
-    Another format is compressed: this is not handled here yet:
+    Another format is compact and is handled too:
     http://code.google.com/p/speedtracer/source/browse/trunk/src/client/ui/src/com/google/speedtracer/client/CompactGwtSymbolMapParser.java?spec=svn84&r=84
     See also for general JS map parsing: https://github.com/pombredanne/python-sourcemap-1/blob/master/smap.py
+
+    If ``aggregate`` is True, return one entry for each source path instead of
+    one entry for each symbol.
     """
-    results = []
-    if is_symbol_map(location):
-        with open(location, 'rU') as symap_file:
-            for line in symap_file:
-                line = line.strip()
-                if not line:
-                    continue
-                if line.startswith('#'):
-                    # header line
-                    if any(x in line for x in gwt_headers):
-                        pass
-                    else:
-                        # ignore other comment lines
-                        pass
-                    continue
-
-                gwts = GwtSymbol(*line.split(','))
-                # remove possible jar:file: prefix
-                clean_path = gwts.sourceUri.replace('jar:file:', '')
-                # remove possible c: or drive name from windows paths. they
-                # are useless
-                clean_path = '/'.join([x for x in clean_path.split('/')
-                                       if ':' not in x])
-                results.append(dict(jsName=gwts.jsName,
-                                    jsniIdent=gwts.jsniIdent,
-                                    className=gwts.className,
-                                    memberName=gwts.memberName, clean_path=clean_path, sourceLine=gwts.sourceLine))
+    if not is_symbol_map(location):
+        return dict(gwt=[])
+
+    symbols = iter_symbols(location)
+    if aggregate:
+        results = aggregate_symbols(symbols)
+    else:
+        results = [
+            dict(
+                jsName=gwts.jsName,
+                jsniIdent=gwts.jsniIdent,
+                className=gwts.className,
+                memberName=gwts.memberName,
+                clean_path=gwts.sourceUri,
+                sourceLine=gwts.sourceLine,
+            )
+            for gwts in symbols
+        ]
     return dict(gwt=results)
+
+
+def clean_source_uri(source_uri):
+    """
+    Return a cleaned path from a GWT ``source_uri``.
+    """
+    # remove possible jar:file: prefix
+    clean_path = source_uri.replace('jar:file:', '')
+    # remove possible c: or drive name from windows paths. they
+    # are useless
+    return '/'.join([x for x in clean_path.split('/') if ':' not in x])
+
+
+def get_class_source_path(class_name):
+    """
+    Return the relative path of the Java source file of a fully qualified
+    ``class_name``, such as "com/foo/Bar.java" for "com.foo.Bar$Inner".
+    """
+    if not class_name:
+        return ''
+    top_level_class, _, _ = class_name.partition('$')
+    return top_level_class.replace('.', '/') + '.java'
+
+
+def iter_symbols(location):
+    """
+    Yield GwtSymbol parsed one line at a time from a GWT symbol map file at
+    ``location``. The sourceUri of each GwtSymbol is a cleaned path.
+
+    Both the regular CSV format and the compact format are supported. In the
+    compact format a "%<package>" line sets the package of the class names of
+    the "jsName,className,memberName" lines that follow. There is no source
+    line and the source path is derived from the class name.
+
+    The class names and the source paths repeat a lot: these are interned and
+    each source URI is cleaned only once.
+    """
+    intern = sys.intern
+    clean_paths = {}
+    package = ''
+    with open(location, encoding='utf-8', errors='replace') as symap_file:
+        for line in symap_file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                # ignore headers and other comment lines
+                continue
+
+            if line.startswith('%'):
+                # compact format package
+                package = line[1:].strip()
+                continue
+
+            fields = line.split(',')
+            if len(fields) == 6:
+                js_name, jsni_ident, class_name, member_name, source_uri, source_line = fields
+                clean_path = clean_paths.get(source_uri)
+                if clean_path is None:
+                    clean_path = clean_paths[source_uri] = intern(clean_source_uri(source_uri))
+
+            elif 2 <= len(fields) <= 3:
+                # compact format
+                js_name, class_name = fields[:2]
+                member_name = fields[2] if len(fields) == 3 else ''
+                if package and class_name and '.' not in class_name:
+                    class_name = package + '.' + class_name
+                jsni_ident = ''
+                clean_path = clean_paths.get(class_name)
+                if clean_path is None:
+                    clean_path = clean_paths[class_name] = intern(get_class_source_path(class_name))
+                source_line = ''
+
+            else:
+                # ignore malformed lines
+                continue
+
+            yield GwtSymbol(
+                jsName=js_name,
+                jsniIdent=jsni_ident,
+                className=intern(class_name),
+                memberName=member_name,
+                sourceUri=clean_path,
+                sourceLine=source_line,
+            )
+
+
+def aggregate_symbols(symbols):
+    """
+    Return a list of mappings, one for each source path of an iterable of
+    GwtSymbol ``symbols``, with the source path, the sorted class names, the
+    range of source lines and the count of symbols.
+    """
+    by_path = {}
+    for gwts in symbols:
+        path = gwts.sourceUri
+        aggregate = by_path.get(path)
+        if aggregate is None:
+            aggregate = by_path[path] = [set(), None, None, 0]
+        classes, start_line, end_line, _ = aggregate
+        classes.add(gwts.className)
+        if gwts.sourceLine.isdigit():
+            line = int(gwts.sourceLine)
+            if start_line is None or line < start_line:
+                aggregate[1] = line
+            if end_line is None or line > end_line:
+                aggregate[2] = line
+        aggregate[3] += 1
+
+    return [
+        dict(
+            clean_path=path,
+            classes=sorted(classes),
+            start_line=start_line,
+            end_line=end_line,
+            symbols_count=count,
+        )
+        for path, (classes, start_line, end_line, count) in sorted(by_path.items())
+    ]
+
+
+@post_scan_impl
+class GWTJavaSources(PostScanPlugin):
+    """
+    Annotate the Java source files of the codebase with the GWT compiled
+    permutations, i.e. the ".symbolMap" files, that include them.
+    """
+    resource_attributes = dict(
+        gwt_permutations=attr.ib(default=attr.Factory(list), repr=False),
+    )
+
+    options = [
+        PluggableCommandLineOption(('--gwt-java-sources',),
+                                   is_flag=True, default=False,
+                                   required_options=['gwt'],
+                                   help='Annotate the Java source files with the GWT '
+                                   'compiled permutations ".symbolMap" files that '
+                                   'include them.',
+                                   help_group=POST_SCAN_GROUP,
+                                   sort_order=100),
+    ]
+
+    def is_enabled(self, gwt_java_sources, **kwargs):
+        return gwt_java_sources
+
+    def process_codebase(self, codebase, **kwargs):
+        map_java_sources(codebase)
+
+
+def map_java_sources(codebase):
+    """
+    Update the Java source file resources of a ``codebase`` with the paths of
+    the symbol maps resources that reference them.
+
+    This is a hash join: the unique source paths of all symbol maps are
+    collected first and each is then looked up once in an index of the Java
+    resources paths by file name.
+    """
+    java_resources_index = PathSuffixIndex()
+    symbol_maps_by_source_path = defaultdict(set)
+
+    for resource in codebase.walk():
+        if not resource.is_file:
+            continue
+
+        if resource.name.endswith('.java'):
+            java_resources_index.add(resource.path, resource)
+
+        for symbol in resource.gwt or []:
+            source_path = symbol.get('clean_path')
+            if source_path:
+                symbol_maps_by_source_path[source_path].add(resource.path)
+
+    java_resources_by_path = {}
+    permutations_by_path = defaultdict(set)
+    for source_path, symbol_maps in symbol_maps_by_source_path.items():
+        for java_resource in find_java_resources(source_path, java_resources_index):
+            java_resources_by_path[java_resource.path] = java_resource
+            permutations_by_path[java_resource.path].update(symbol_maps)
+
+    for path, symbol_maps in permutations_by_path.items():
+        java_resource = java_resources_by_path[path]
+        java_resource.gwt_permutations = sorted(symbol_maps)
+        codebase.save_resource(java_resource)
+
+
+def find_java_resources(source_path, java_resources_index):
+    """
+    Return a list of the Java resources that best match a GWT symbol map
+    ``source_path`` using the longest common path suffix. A suffix must have at
+    least a parent directory and a file name to avoid matching by file name
+    alone: a source path without a parent directory matches nothing.
+    """
+    # only the path in a jar is relevant as in "some.jar!/com/foo/Bar.java"
+    _, _, source_path = source_path.rpartition('!/')
+    return java_resources_index.find_longest(source_path)
@@ -10,6 +10,7 @@
 
 import os
 import sys
+import zipfile
 from functools import partial
 from io import BytesIO
 from itertools import chain
@@ -17,13 +18,19 @@ from struct import unpack
 
 import attr
 from commoncode.cliutils import PluggableCommandLineOption as CommandLineOption
+from commoncode.cliutils import POST_SCAN_GROUP
 from commoncode.cliutils import SCAN_GROUP
 from commoncode import fileutils
+from formattedcode import FileOptionType
+from plugincode.post_scan import PostScanPlugin
+from plugincode.post_scan import post_scan_impl
 from plugincode.scan import ScanPlugin
 from plugincode.scan import scan_impl
 from typecode import contenttype
 
 from compiledcode.javaclass import javaclass
+from compiledcode.javaclass.index import INTERFACE_NAMES_KEY
+from compiledcode.javaclass.index import build_index
 
 
 @scan_impl
@@ -41,33 +48,193 @@ class JavaClassScanner(ScanPlugin):
                           help='Collect java class metadata',
                           help_group=SCAN_GROUP,
                           sort_order=100),
+
+        CommandLineOption(('--javaclass-archives',),
+                          is_flag=True, default=False,
+                          required_options=['javaclass'],
+                          help='Also collect the metadata of the .class files '
+                               'inside .jar, .war and .ear Java archives, '
+                               'aggregated for each archive, without extracting '
+                               'these archives.',
+                          help_group=SCAN_GROUP,
+                          sort_order=101),
+
+        CommandLineOption(('--javaclass-compact',),
+                          is_flag=True, default=False,
+                          required_options=['javaclass'],
+                          help='Only collect the java class name, super class, '
+                               'interfaces, version, access and the methods '
+                               'and fields signatures and skip the constants '
+                               'pool.',
+                          help_group=SCAN_GROUP,
+                          sort_order=102),
     ]
 
     def is_enabled(self, javaclass, **kwargs):
         return javaclass
 
-    def get_scanner(self, **kwargs):
-        return scan_javaclass
+    def get_scanner(self, javaclass_archives=False, javaclass_compact=False,
+                    javaclass_index=None, **kwargs):
+        return partial(
+            scan_javaclass,
+            javaclass_archives=javaclass_archives,
+            javaclass_compact=javaclass_compact,
+            javaclass_interface_names=bool(javaclass_index),
+        )
 
 
-def scan_javaclass(location, **kwargs):
+@post_scan_impl
+class JavaClassIndexer(PostScanPlugin):
     """
-    Return a mapping content  of a class fie
+    Build an index of the Java classes collected across the whole codebase
+    with their providing resources, packages, super classes and interfaces
+    and write it to a sidecar JSON file.
+    """
+
+    options = [
+        CommandLineOption(('--javaclass-index',),
+                          type=FileOptionType(mode='w', encoding='utf-8', lazy=True),
+                          metavar='FILE',
+                          default=None,
+                          required_options=['javaclass'],
+                          help='Write to FILE a compact JSON index of the Java '
+                               'classes fully qualified names to the resources '
+                               'that provide them, with packages, super '
+                               'classes, interfaces and duplicated classes.',
+                          help_group=POST_SCAN_GROUP,
+                          sort_order=100),
+    ]
+
+    def is_enabled(self, javaclass_index, **kwargs):
+        return javaclass_index
+
+    def process_codebase(self, codebase, javaclass_index, **kwargs):
+        index = build_index(codebase)
+        try:
+            index.dump(javaclass_index)
+        finally:
+            javaclass_index.close()
+
+
+JAVA_ARCHIVE_EXTENSIONS = ('.jar', '.war', '.ear')
+
+
+def is_java_archive(location):
+    """
+    Return True if the file at ``location`` is a Java archive.
+    """
+    return (
+        location.lower().endswith(JAVA_ARCHIVE_EXTENSIONS)
+        and zipfile.is_zipfile(location)
+    )
+
+
+def scan_javaclass(location, javaclass_archives=False, javaclass_compact=False,
+                   javaclass_interface_names=False, **kwargs):
+    """
+    Return a mapping content of a class file or, if ``javaclass_archives`` is
+    True, of the classes of a Java archive. Skip the constants pool if
+    ``javaclass_compact`` is True. Also collect the interfaces internal names
+    if ``javaclass_interface_names`` is True such that the class index is
+    built without parsing the classes again.
     """
     T = contenttype.get_type(location)
-    if not T.is_java_class:
+    if T.is_java_class:
+        with open(location, 'rb') as data:
+            c = javaclass.Class(data.read())
+        javaclass_data = get_javaclass_data(
+            c,
+            compact=javaclass_compact,
+            interface_names=javaclass_interface_names,
+        )
+
+    elif javaclass_archives and T.is_file and is_java_archive(location):
+        with zipfile.ZipFile(location) as archive:
+            javaclass_data = get_archive_javaclass_data(
+                archive,
+                interface_names=javaclass_interface_names,
+            )
+
+    else:
         return
 
+    return dict(
+        javaclass=javaclass_data,
+    )
+
+
+def get_archive_javaclass_data(archive, interface_names=False):
+    """
+    Return a mapping of aggregated class metadata for all the .class entries
+    of a Java ``archive`` ZipFile, including the entries of the Java archives
+    nested in this archive, such as the WEB-INF/lib/*.jar of a .war.
+
+    Each .class entry is read and parsed in memory, one at a time. Also
+    collect the interfaces internal names if ``interface_names`` is True.
+    """
+    classes = []
+    packages = set()
+    errors = []
+    for path, c in iter_archive_classes(archive, errors):
+        # the constants pool is never reported for archives
+        class_data = dict(Path=path)
+        class_data.update(get_javaclass_data(c, compact=True, interface_names=interface_names))
+        classes.append(class_data)
+        packages.add(c.package)
+
+    javaclass_data = dict()
+    javaclass_data['Classes Count'] = len(classes)
+    javaclass_data['Packages'] = sorted(packages)
+    javaclass_data['Classes'] = classes
+    if errors:
+        javaclass_data['Errors'] = errors
+    return javaclass_data
+
+
+def iter_archive_classes(archive, errors, prefix=''):
+    """
+    Yield tuples of (path, javaclass.Class) for the .class entries of a Java
+    ``archive`` ZipFile and of its nested Java archives. Paths of nested
+    entries are prefixed with the nested archive path and a "!/" separator.
+    Append an error message to the ``errors`` list for each entry that cannot
+    be parsed.
+    """
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        name = info.filename
+        path = prefix + name
+        lower_name = name.lower()
+        try:
+            if lower_name.endswith('.class'):
+                yield path, javaclass.Class(archive.read(info))
+
+            elif lower_name.endswith(JAVA_ARCHIVE_EXTENSIONS):
+                with zipfile.ZipFile(BytesIO(archive.read(info))) as nested:
+                    yield from iter_archive_classes(nested, errors, prefix=path + '!/')
+
+        except Exception as e:
+            errors.append('%(path)s: %(e)r' % locals())
+
+
+def get_javaclass_data(c, compact=False, interface_names=False):
+    """
+    Return a mapping of metadata for a javaclass.Class ``c``.
+
+    If ``compact`` is True, skip the constants pool and only report the
+    version, access, class, super class, interfaces and the methods and fields
+    signatures. The constants pool is decoded lazily so that only the
+    constants referenced by these are ever decoded.
+
+    If ``interface_names`` is True, also report the interfaces internal names,
+    such as java/lang/Runnable, that the "Interfaces" shortened names lose.
+    """
     javaclass_data = dict()
-    SHOW_CONSTS = 1
-    with open(location, 'rb') as data:
-        f = BytesIO(data.read())
-    c = javaclass.Class(f)
 
     javaclass_data['Version'] = 'Version: %i.%i (%s)' % (
         c.version[1], c.version[0], javaclass.getJavacVersion(c.version))
 
-    if SHOW_CONSTS:
+    if not compact:
         javaclass_data['Constants Pool'] = str(len(c.constants))
         constants = dict()
         for i in range(1, len(c.constants)):
@@ -144,6 +311,11 @@ def scan_javaclass(location, **kwargs):
     if methods:
         javaclass_data['Methods'] = methods
 
+    if compact:
+        fields = [str(field) for field in c.fields]
+        if fields:
+            javaclass_data['Fields'] = fields
+
     javaclass_data['Class'] = c.name
 
     javaclass_data['Super Class'] = c.superClass
@@ -153,7 +325,7 @@ def scan_javaclass(location, **kwargs):
         interfaces.append(str(inter))
     if interfaces:
         javaclass_data['Interfaces'] = interfaces
+        if interface_names:
+            javaclass_data[INTERFACE_NAMES_KEY] = list(c.interfaceNames)
 
-    return dict(
-        javaclass=javaclass_data,
-    )
+    return javaclass_data
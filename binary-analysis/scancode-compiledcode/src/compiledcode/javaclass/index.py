@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-plugins for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+"""
+An index of the Java classes collected with the javaclass scan across a whole
+codebase.
+"""
+
+import json
+from collections import defaultdict
+
+# Separator between a Java archive path and the path of one of its entries
+ARCHIVE_ENTRY_SEPARATOR = '!/'
+
+# The javaclass key of the interfaces internal names of a class collected
+# during the scan for the index
+INTERFACE_NAMES_KEY = 'Interface Classes'
+
+
+def get_fqcn(internal_name):
+    """
+    Return a fully qualified Java class name given a class file
+    ``internal_name`` such as "java/lang/Object".
+    """
+    return internal_name.replace('/', '.')
+
+
+def get_package(fqcn):
+    """
+    Return the package name of a ``fqcn`` fully qualified Java class name.
+    """
+    package, _, _ = fqcn.rpartition('.')
+    return package
+
+
+class JavaClassIndex(object):
+    """
+    An index of fully qualified Java class names to the paths of the resources
+    that provide them, with the classes of each package and the super class
+    and interfaces edges between classes.
+
+    A class inside a Java archive is provided by a path made of the archive
+    path and of the archive entry path, separated by "!/".
+    """
+
+    def __init__(self):
+        # {fqcn: [paths]}
+        self.providers = defaultdict(list)
+        # {package: set of fqcn}
+        self.packages = defaultdict(set)
+        # {fqcn: super class fqcn}
+        self.superclasses = {}
+        # {fqcn: [interface fqcn]}
+        self.interfaces = {}
+
+    def add(self, path, name, superclass='', interfaces=()):
+        """
+        Add a class with a class file internal ``name`` provided by a resource
+        at ``path`` with optional ``superclass`` and ``interfaces`` internal
+        names.
+        """
+        fqcn = get_fqcn(name)
+        self.providers[fqcn].append(path)
+        self.packages[get_package(fqcn)].add(fqcn)
+        if superclass:
+            self.superclasses[fqcn] = get_fqcn(superclass)
+        if interfaces:
+            self.interfaces[fqcn] = [get_fqcn(i) for i in interfaces]
+
+    def add_javaclass(self, path, javaclass):
+        """
+        Add the classes of a resource at ``path`` given its ``javaclass`` scan
+        data, either for a single class file or for a Java archive.
+
+        The interfaces internal names collected during the scan are removed
+        from the ``javaclass`` scan data once used. Return True if any was
+        removed.
+        """
+        classes = javaclass.get('Classes')
+        if classes is None:
+            classes = [javaclass]
+            prefix = None
+        else:
+            prefix = path + ARCHIVE_ENTRY_SEPARATOR
+
+        removed = False
+        for class_data in classes:
+            interfaces = class_data.pop(INTERFACE_NAMES_KEY, None)
+            removed = removed or interfaces is not None
+            name = class_data.get('Class')
+            if not name:
+                continue
+            self.add(
+                path=prefix + class_data['Path'] if prefix else path,
+                name=name,
+                superclass=class_data.get('Super Class'),
+                interfaces=interfaces,
+            )
+        return removed
+
+    def get_providers(self, fqcn):
+        """
+        Return a list of the paths of the resources that provide a ``fqcn``
+        fully qualified Java class name.
+        """
+        return self.providers.get(fqcn, [])
+
+    def get_duplicates(self):
+        """
+        Return a mapping of {fqcn: [paths]} for the classes that are provided
+        by more than one resource.
+        """
+        return {
+            fqcn: paths
+            for fqcn, paths in self.providers.items()
+            if len(paths) > 1
+        }
+
+    def get_subclasses(self, fqcn):
+        """
+        Return a sorted list of the classes that directly extend or implement
+        a ``fqcn`` fully qualified Java class name.
+        """
+        subclasses = set(
+            name for name, superclass in self.superclasses.items()
+            if superclass == fqcn
+        )
+        subclasses.update(
+            name for name, interfaces in self.interfaces.items()
+            if fqcn in interfaces
+        )
+        return sorted(subclasses)
+
+    def to_dict(self):
+        """
+        Return a mapping of this index suitable for JSON serialization.
+        """
+        return dict(
+            classes=dict(sorted(self.providers.items())),
+            packages={
+                package: sorted(classes)
+                for package, classes in sorted(self.packages.items())
+            },
+            superclasses=dict(sorted(self.superclasses.items())),
+            interfaces=dict(sorted(self.interfaces.items())),
+            duplicates=dict(sorted(self.get_duplicates().items())),
+        )
+
+    @classmethod
+    def from_dict(cls, mapping):
+        """
+        Return a new index built from a ``mapping`` created with to_dict().
+        """
+        index = cls()
+        index.providers.update(mapping.get('classes') or {})
+        for package, classes in (mapping.get('packages') or {}).items():
+            index.packages[package] = set(classes)
+        index.superclasses.update(mapping.get('superclasses') or {})
+        index.interfaces.update(mapping.get('interfaces') or {})
+        return index
+
+    def dump(self, output_file):
+        """
+        Write this index as compact JSON to an ``output_file`` file-like
+        object.
+        """
+        json.dump(self.to_dict(), output_file, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, input_file):
+        """
+        Return a new index loaded from an ``input_file`` file-like object
+        written with dump().
+        """
+        return cls.from_dict(json.load(input_file))
+
+
+def build_index(codebase):
+    """
+    Return a JavaClassIndex built from the javaclass scan data of the
+    ``codebase`` resources.
+    """
+    index = JavaClassIndex()
+    for resource in codebase.walk():
+        javaclass = getattr(resource, 'javaclass', None)
+        if javaclass and index.add_javaclass(resource.path, javaclass):
+            codebase.save_resource(resource)
+    return index
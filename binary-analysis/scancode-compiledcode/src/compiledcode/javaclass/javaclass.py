@@ -1,8 +1,9 @@
 
 import os
 import sys
-from struct import unpack
-from io import BytesIO
+from array import array
+from functools import lru_cache
+from struct import Struct
 
 """
 A python lib for parsing Java class files, suitable for static
@@ -53,6 +54,12 @@ CONSTANT_Long = 5
 CONSTANT_Double = 6
 CONSTANT_NameAndType = 12
 CONSTANT_Utf8 = 1
+CONSTANT_MethodHandle = 15
+CONSTANT_MethodType = 16
+CONSTANT_Dynamic = 17
+CONSTANT_InvokeDynamic = 18
+CONSTANT_Module = 19
+CONSTANT_Package = 20
 
 ACC_DEFAULT = 0x0000
 ACC_PUBLIC = 0x0001
@@ -162,74 +169,114 @@ def getAccessFromFlags(flags):
     return 'default'
 
 
+# Size of the caches of parsed and formatted descriptors shared by all the
+# classes parsed in a process: a few descriptors such as "()V" are very common.
+DESCRIPTOR_CACHE_SIZE = 8192
+
+PRIMITIVE_TYPES = {
+    'B': 'byte',
+    'C': 'char',
+    'D': 'double',
+    'F': 'float',
+    'I': 'int',
+    'J': 'long',
+    'S': 'short',
+    'Z': 'boolean',
+    'V': 'void',
+}
+
+# primitive types that can be used as arguments
+_ARG_PRIMITIVE_TYPES = frozenset('BCDFIJSZ')
+
+
 class MethodDesc:
 
     def __init__(self, descStr):
-        self.args = []
         self.descStr = descStr
-        desc = list(descStr)
-        self.args = _parseArgs(desc)
-        self.returnType = ''.join(desc)
+        args, self.returnType = parseMethodDescriptor(descStr)
+        self.args = list(args)
 
 
-def _parseArgs(desc, count=-1):
+@lru_cache(maxsize=DESCRIPTOR_CACHE_SIZE)
+def parseMethodDescriptor(descStr):
+    """
+    Return a tuple of (tuple of argument types, return type) parsed from a
+    method ``descStr`` descriptor string such as "(ILjava/lang/String;)V".
+    """
+    args, end = _scanArgs(descStr, 0, -1)
+    return tuple(args), descStr[end:]
+
+
+def _scanArgs(desc, start, count):
+    """
+    Return a tuple of (list of argument types, end index) parsed from a
+    ``desc`` descriptor string starting at the ``start`` index and stopping
+    after ``count`` arguments if ``count`` is not -1.
+    """
     args = []
-    while len(desc) and len(args) != count:
-        c = desc.pop(0)
+    i = start
+    length = len(desc)
+    while i < length and len(args) != count:
+        c = desc[i]
+        i += 1
         if c == ')':
             break
 
         elif c == '(':
             pass
 
-        elif c in ['B', 'C', 'D', 'F', 'I', 'J', 'S', 'Z']:
+        elif c in _ARG_PRIMITIVE_TYPES:
             args.append(c)
 
         elif c == 'L':
-            s = c
-            while c != ';':
-                c = desc.pop(0)
-                s += c
-            args.append(s)
+            end = desc.index(';', i) + 1
+            args.append(desc[i - 1:end])
+            i = end
 
         elif c == '[':
             dim = 1
-            while desc[0] == '[':
+            while desc[i] == '[':
                 dim += 1
-                desc.pop(0)
-            s = _parseArgs(desc, 1)[0]
-            # desc = desc[len(s):]
-            args.append(('[' * dim) + s)
+                i += 1
+            component, i = _scanArgs(desc, i, 1)
+            args.append(('[' * dim) + component[0])
+
+    return args, i
 
-    return args
+
+def _parseArgs(desc, count=-1):
+    """
+    Return a list of argument types parsed from a ``desc`` descriptor string
+    or list of characters, stopping after ``count`` arguments if ``count`` is
+    not -1. The parsed characters are removed from a ``desc`` list.
+    """
+    if isinstance(desc, list):
+        args, end = _scanArgs(''.join(desc), 0, count)
+        del desc[:end]
+        return args
+    if count == -1:
+        return list(parseMethodDescriptor(desc)[0])
+    return _scanArgs(desc, 0, count)[0]
 
 
+@lru_cache(maxsize=DESCRIPTOR_CACHE_SIZE)
 def _fmtType(desc, pkg=''):
     """
     Convert a Java type code into a human readable string.
     """
-    types = {'B':'byte', 'C':'char', 'D':'double', 'F':'float', 'I':'int',
-             'J':'long', 'S':'short', 'Z':'boolean', 'V':'void'}
-
-    dim = 0
-    for i in range(len(desc)):
-        if desc[i] == '[':
-            dim += 1
-        else:
-            break
+    if not isinstance(desc, str):
+        desc = desc.decode('utf-8')
 
+    dim = len(desc) - len(desc.lstrip('['))
     array = dim * '[]'
     desc = desc[dim:]
 
     try:
-        return '%s%s' % (types[desc], array)
+        return '%s%s' % (PRIMITIVE_TYPES[desc], array)
     except KeyError:
         # class
         pass
 
-    if not isinstance(desc, str):
-        desc = desc.decode('utf-8')
-
     if desc.startswith('L'):
         name = desc[1:]
         name = name[:-1]  # strip ;
@@ -243,7 +290,8 @@ def _fmtType(desc, pkg=''):
 class Method:
     """
     Represents a Java method.
-    The bytecode for the method is stored under the key "Code" in attrs.
+    The bytecode for the method is not stored in attrs: use Class.getCode()
+    to get it from the class data.
     """
 
     def __init__(self, klass, access, name, desc, attrs):
@@ -253,6 +301,8 @@ class Method:
         self.name = name
         self.desc = desc
         self.attrs = attrs
+        # (offset, length) of the "Code" attribute in the class data
+        self.code = None
         d = MethodDesc(desc)
         self.args = d.args
         self.returnType = d.returnType
@@ -334,86 +384,172 @@ class MethodRef:
         return self.desc + ' ' + self._class + '.' + self.name
 
 
-class Class:
-
-    def __init__(self, f):
-        """
-        Load a java class from file object "f"
-        """
-        print(f.read(4))  # magic
-        self.version = unpack('>HH', f.read(4))
+# Precompiled big endian structures of the class file format, used with
+# unpack_from on a memoryview of the whole class file to avoid copies.
+_BU2 = Struct('>BH')
+_U2 = Struct('>H')
+_U2U2 = Struct('>HH')
+_I4 = Struct('>i')
+_F4 = Struct('>f')
+_I8 = Struct('>q')
+_D8 = Struct('>d')
+_HEADER = Struct('>IHHH')
+_CLASS_INFO = Struct('>HHHH')
+_MEMBER = Struct('>HHHH')
+_ATTRIBUTE = Struct('>HI')
+
+JAVA_CLASS_MAGIC = 0xCAFEBABE
+
+
+# {tag: structure of the constant value that follows the tag} for constants
+# other than Utf8
+_CONSTANT_STRUCTS = {
+    CONSTANT_Class: _U2,
+    CONSTANT_String: _U2,
+    CONSTANT_MethodType: _U2,
+    CONSTANT_Module: _U2,
+    CONSTANT_Package: _U2,
+    CONSTANT_Fieldref: _U2U2,
+    CONSTANT_Methodref: _U2U2,
+    CONSTANT_InterfaceMethodref: _U2U2,
+    CONSTANT_NameAndType: _U2U2,
+    CONSTANT_Dynamic: _U2U2,
+    CONSTANT_InvokeDynamic: _U2U2,
+    CONSTANT_MethodHandle: _BU2,
+    CONSTANT_Integer: _I4,
+    CONSTANT_Float: _F4,
+    CONSTANT_Long: _I8,
+    CONSTANT_Double: _D8,
+}
+
+
+class ConstantPool:
+    """
+    A read-only sequence of the constants of a class file constant pool.
 
-        # print(unpack('>H', f.read(2)))
+    Only the offsets of the constants are collected when the pool is created.
+    Each constant is decoded as a [tag, value, ...] list on first access and
+    then cached. The first slot is a reserved Utf8 constant and the second
+    slot of a Long or Double constant is None.
+    """
 
-        [constCount] = unpack('>H', f.read(2))
-        self.constants = [[CONSTANT_Utf8, 'reserved']]
+    def __init__(self, data, offset, count):
+        self._data = data
+        self._count = count
+        self._decoded = {0: [CONSTANT_Utf8, 'reserved']}
+        # offset of each constant tag, or -1 for an unusable slot
+        self._offsets = offsets = array('l', [-1]) * count
+        structs = _CONSTANT_STRUCTS
         i = 1
+        while i < count:
+            offsets[i] = offset
+            tag = data[offset]
+            if tag == CONSTANT_Utf8:
+                [length] = _U2.unpack_from(data, offset + 1)
+                offset += 3 + length
+            else:
+                struct = structs.get(tag)
+                if not struct:
+                    raise Exception('UNKNOWN CONST TAG! ' + str(tag) + ' at ' + hex(offset))
+                offset += 1 + struct.size
+                if tag == CONSTANT_Long or tag == CONSTANT_Double:
+                    # takes up 2 constant pool spots
+                    i += 1
+            i += 1
+        # offset of the data that follows the constant pool
+        self.end = offset
 
-        while i < constCount:
-            [tag] = unpack('b', f.read(1))
+    def __len__(self):
+        return self._count
 
-            if tag == CONSTANT_Class:
-                self.constants.append([tag, unpack('>H', f.read(2))[0]])
+    def __getitem__(self, index):
+        decoded = self._decoded
+        try:
+            return decoded[index]
+        except KeyError:
+            pass
 
-            elif (tag == CONSTANT_Fieldref or
-                 tag == CONSTANT_Methodref or
-                 tag == CONSTANT_InterfaceMethodref):
+        if index < 0:
+            index += self._count
+        offset = self._offsets[index]
+        if offset == -1:
+            # this needs to be considered in dumpClass!
+            constant = None
+        else:
+            data = self._data
+            tag = data[offset]
+            if tag == CONSTANT_Utf8:
+                [length] = _U2.unpack_from(data, offset + 1)
+                start = offset + 3
+                constant = [tag, str(data[start:start + length], 'utf-8', 'replace')]
+            else:
+                constant = [tag, *_CONSTANT_STRUCTS[tag].unpack_from(data, offset + 1)]
+        decoded[index] = constant
+        return constant
 
-                self.constants.append([tag] + list(unpack('>HH', f.read(4))))
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
 
-            elif tag == CONSTANT_String:
-                self.constants.append([tag] + list(unpack('>H', f.read(2))))
+    @property
+    def decoded_count(self):
+        """
+        Return the number of constants decoded and cached so far.
+        """
+        return len(self._decoded)
 
-            elif tag == CONSTANT_Float:
-                self.constants.append([tag] + list(unpack('>f', f.read(4))))
 
-            elif tag == CONSTANT_Integer:
-                self.constants.append([tag] + list(unpack('>i', f.read(4))))
+def _read_data(f):
+    """
+    Return a bytes-like object from a file-like object or bytes-like ``f``.
+    """
+    read = getattr(f, 'read', None)
+    if read:
+        return read()
+    return f
 
-            elif tag == CONSTANT_Double:
-                [val] = unpack('>d', f.read(8))
-                self.constants.append([tag] + [val])
-                # takes up 2 constant pool spots
-                self.constants.append(None)  # this needs to be considered in dumpClass!
-                i += 1
-            elif tag == CONSTANT_Long:
-                [hi] = unpack('>l', f.read(4))
-                [lo] = unpack('>l', f.read(4))
-                self.constants.append([tag, ((int(hi) << 4) + lo)])
-                # takes up 2 constant pool spots
-                self.constants.append(None)  # this needs to be considered in dumpClass!
-                i += 1
-            elif tag == CONSTANT_NameAndType:
-                self.constants.append([tag] + list(unpack('>HH', f.read(4))))
-            elif tag == CONSTANT_Utf8:
-                [length] = unpack('>H', f.read(2))
-                s = f.read(length)
-                self.constants.append([tag, s])
-            else:
-                raise Exception('UNKNOWN CONST TAG! ' + str(tag) + ' at ' + hex(f.tell()))
-            i += 1
 
-        [self.access] = unpack('>H', f.read(2))
-        [className] = unpack('>H', f.read(2))
-        self.name = self.constants[self.constants[className][1]][1].decode('utf-8', errors='ignore')
+class Class:
 
-        self.package = os.path.dirname(self.name).replace('/', '.')
+    def __init__(self, f):
+        """
+        Load a java class from file-like object or bytes-like object "f"
+        """
+        data = memoryview(_read_data(f))
+        self._data = data
+
+        magic, minor, major, constCount = _HEADER.unpack_from(data, 0)
+        if magic != JAVA_CLASS_MAGIC:
+            raise Exception('NOT A JAVA CLASS: bad magic: ' + hex(magic))
+        self.version = (minor, major)
+        offset = _HEADER.size
 
-        [className] = unpack('>H', f.read(2))
+        # constants are decoded lazily, only when referenced
+        self.constants = constants = ConstantPool(data, offset, constCount)
+        offset = constants.end
+
+        self.access, className, superClassName, count = _CLASS_INFO.unpack_from(data, offset)
+        offset += _CLASS_INFO.size
+        self.name = constants[constants[className][1]][1]
+
+        self.package = os.path.dirname(self.name).replace('/', '.')
 
         # added as part of #711: java.lang.Object is an exceptional case
         if self.name != 'java/lang/Object':
-            self.superClass = self.constants[self.constants[className][1]][1]
+            self.superClass = constants[constants[superClassName][1]][1]
         else:
             self.superClass = ''
 
         # interfaces
-        [count] = unpack('>H', f.read(2))
         self.interfaces = []
-        for i in range(count):
-            [index] = unpack('>H', f.read(2))
-            index = self.constants[index][1]
-            iname = self.constants[index][1]
+        # interfaces internal names, such as java/lang/Runnable
+        self.interfaceNames = []
+        for _ in range(count):
+            [index] = _U2.unpack_from(data, offset)
+            offset += 2
+            index = constants[index][1]
+            iname = constants[index][1]
+            self.interfaceNames.append(iname)
             iname = _canonicalize(iname, self.package)
             self.interfaces.append(iname)
 
@@ -430,41 +566,70 @@ class Class:
             self.classSig += ' implements ' + ', '.join(self.interfaces)
 
         # fields
-        [count] = unpack('>H', f.read(2))
+        [count] = _U2.unpack_from(data, offset)
+        offset += 2
         self.fields = []
-        for i in range(count):
-            [access, name, desc, acount] = unpack('>HHHH', f.read(8))
-            attrs = {}
-            for _ in range(acount):
-                [aname, alen] = unpack('>HI', f.read(6))
-                aname = self.constants[aname][1]
-                attrs[aname] = f.read(alen)
-            name = self.constants[name][1]
-            desc = self.constants[desc][1]
+        for _ in range(count):
+            access, name, desc, acount = _MEMBER.unpack_from(data, offset)
+            offset += _MEMBER.size
+            attrs, _code, offset = self._parseAttributes(acount, offset)
+            name = constants[name][1]
+            desc = constants[desc][1]
             self.fields.append(Field(self, access, name, desc, attrs))
 
         # methods
         methods = []
-        [count] = unpack('>H', f.read(2))
-        for i in range(count):
-            [access, name, desc, acount] = unpack('>HHHH', f.read(8))
-            attrs = {}
-            for _ in range(acount):
-                [aname, alen] = unpack('>HI', f.read(6))
-                aname = self.constants[aname][1]
-                attrs[aname] = f.read(alen)
-            name = self.constants[name][1]
-            desc = self.constants[desc][1]
-            methods.append(Method(self, access, name, desc, attrs))
+        [count] = _U2.unpack_from(data, offset)
+        offset += 2
+        for _ in range(count):
+            access, name, desc, acount = _MEMBER.unpack_from(data, offset)
+            offset += _MEMBER.size
+            attrs, code, offset = self._parseAttributes(acount, offset)
+            name = constants[name][1]
+            desc = constants[desc][1]
+            method = Method(self, access, name, desc, attrs)
+            method.code = code
+            methods.append(method)
 
         # attributes
-        [count] = unpack('>H', f.read(2))
+        [count] = _U2.unpack_from(data, offset)
+        offset += 2
+        self.attrs, _code, offset = self._parseAttributes(count, offset)
+        self.methods = methods
+
+    def _parseAttributes(self, count, offset):
+        """
+        Return a tuple of (attrs, code, offset) for ``count`` attributes
+        starting at ``offset`` where attrs is a mapping of {name: bytes},
+        code is an (offset, length) tuple of the "Code" attribute body or None
+        and offset is the offset after these attributes.
+
+        The potentially large "Code" bodies are skipped and never copied.
+        """
+        data = self._data
+        constants = self.constants
         attrs = {}
+        code = None
         for _ in range(count):
-            [aname, alen] = unpack('>HI', f.read(6))
-            attrs[self.getConst(aname)] = f.read(alen)
-        self.attrs = attrs
-        self.methods = methods
+            aname, alen = _ATTRIBUTE.unpack_from(data, offset)
+            offset += _ATTRIBUTE.size
+            aname = constants[aname][1]
+            if aname == 'Code':
+                code = (offset, alen)
+            else:
+                attrs[aname] = bytes(data[offset:offset + alen])
+            offset += alen
+        return attrs, code, offset
+
+    def getCode(self, method):
+        """
+        Return the bytes of the "Code" attribute of a ``method`` of this class
+        or None.
+        """
+        if not method.code:
+            return None
+        offset, length = method.code
+        return bytes(self._data[offset:offset + length])
 
     def isPublic(self):
         return self.access & ACC_PUBLIC
@@ -522,8 +687,7 @@ def dumpClass(path):
     """
     SHOW_CONSTS = 1
     with open(path, 'rb') as data:
-        f = BytesIO(data.read())
-    c = Class(f)
+        c = Class(data.read())
     print('Version: %i.%i (%s)' % (c.version[1], c.version[0], getJavacVersion(c.version),))
 
     if SHOW_CONSTS:
@@ -15,11 +15,20 @@ import attr
 
 from commoncode import fileutils
 from commoncode.cliutils import PluggableCommandLineOption
+from commoncode.cliutils import POST_SCAN_GROUP
 from commoncode.cliutils import SCAN_GROUP
+from formattedcode import FileOptionType
+from plugincode.post_scan import PostScanPlugin
+from plugincode.post_scan import post_scan_impl
 from plugincode.scan import ScanPlugin
 from plugincode.scan import scan_impl
 from typecode import contenttype
 
+from compiledcode.lkmclue.modules import build_kernel_modules
+from compiledcode.lkmclue.modules import dump_kernel_modules
+from compiledcode.lkmclue.modules import get_identifiers
+from compiledcode.lkmclue.modules import IDENTIFIERS_KEY
+from compiledcode.lkmclue.modules import is_source
 from compiledcode.sourcecode import kernel
 
 
@@ -43,24 +52,60 @@ class LKMClueScanner(ScanPlugin):
     def is_enabled(self, lkmclue, **kwargs):
         return lkmclue
 
-    def get_scanner(self, **kwargs):
-        return get_lkm_clues
+    def get_scanner(self, lkm_modules=None, **kwargs):
+        return partial(get_lkm_clues, lkm_identifiers=bool(lkm_modules))
 
 
-def get_lkm_clues(location, **kwargs):
+@post_scan_impl
+class LKMModules(PostScanPlugin):
+    """
+    Group the scanned sources in probable Linux kernel modules using the
+    Kbuild files and the LKM clues and write these modules with their
+    licenses, exported symbols and GPL-only symbols used to a sidecar JSON
+    file.
+    """
+
+    options = [
+        PluggableCommandLineOption(('--lkm-modules',),
+                                   type=FileOptionType(mode='w', encoding='utf-8', lazy=True),
+                                   metavar='FILE',
+                                   default=None,
+                                   required_options=['lkmclue'],
+                                   help='Write to FILE a JSON list of the probable Linux '
+                                   'kernel modules with their sources, licenses, '
+                                   'exported symbols and the GPL-only symbols of '
+                                   'other modules that they use.',
+                                   help_group=POST_SCAN_GROUP,
+                                   sort_order=100),
+    ]
+
+    def is_enabled(self, lkm_modules, **kwargs):
+        return lkm_modules
+
+    def process_codebase(self, codebase, lkm_modules, **kwargs):
+        modules = build_kernel_modules(codebase)
+        try:
+            dump_kernel_modules(modules, lkm_modules)
+        finally:
+            lkm_modules.close()
+
+
+def get_lkm_clues(location, lkm_identifiers=False, **kwargs):
     """
     Return a mapping content
         key: lkm_clue_type and
         value: list of lkm_clue
+    Also collect the names of the functions called in a source file if
+    ``lkm_identifiers`` is True such that the kernel modules are built without
+    reading the sources again.
     """
     clues = dict()
     for type, clue in kernel.find_lkms(location):
         if not type or not clue:
             continue
-        if clues.get(type):
-            clues[type] = clues.get(type).append(clue)
-        else:
-            clues[type] = [clue]
+        clues.setdefault(type, []).append(clue)
+    if lkm_identifiers and is_source(location):
+        clues[IDENTIFIERS_KEY] = get_identifiers(location)
     return dict(
         lkm_clue=clues,
     )
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-plugins for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+"""
+Group the sources of a codebase in probable Linux kernel modules using the
+Kbuild makefiles and the lkm_clue scan data and resolve the use of GPL-only
+exported symbols across modules.
+"""
+
+import json
+import posixpath
+import re
+from collections import defaultdict
+
+import attr
+
+from compiledcode.makedepend import iter_logical_lines
+
+KBUILD_FILE_NAMES = ('Kbuild', 'Makefile')
+
+# The extensions of the sources an object file can be compiled from
+SOURCE_EXTENSIONS = ('.c', '.S', '.s')
+
+# Module licenses that the kernel accepts as GPL-compatible to use GPL-only
+# symbols as listed in include/linux/license.h
+GPL_COMPATIBLE_LICENSES = frozenset([
+    'GPL',
+    'GPL v2',
+    'GPL and additional rights',
+    'Dual BSD/GPL',
+    'Dual MIT/GPL',
+    'Dual MPL/GPL',
+])
+
+# The lkm_clue key of the names of the functions called in a source collected
+# during the scan for the GPL-only symbol resolution
+IDENTIFIERS_KEY = 'lkm-identifier'
+
+# A Kbuild assignment as in "obj-m += foo.o", "obj-$(CONFIG_FOO) := foo.o" or
+# "foo-objs := a.o b.o": the name, the suffix and the value
+KBUILD_ASSIGNMENT = re.compile(
+    r'^\s*([\w.-]+?)-(objs|y|m|\$\([^)]*\))\s*(?::=|\+=|\?=|=)\s*(.*)$'
+).match
+
+# The C comments, string and character literals that cannot call a function
+C_COMMENTS_AND_LITERALS = re.compile(
+    r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'',
+    re.DOTALL,
+).sub
+
+# An identifier followed by an opening parenthesis as in a function call
+C_CALLS = re.compile(r'\b([A-Za-z_]\w*)\s*\(').findall
+
+# The C keywords that can be followed by an opening parenthesis
+C_KEYWORDS = frozenset([
+    'if', 'for', 'while', 'switch', 'return', 'sizeof', 'typeof',
+    '__typeof__', 'alignof', '_Alignof', '__alignof__', 'defined',
+    '__attribute__', 'asm', '__asm__', 'case', 'do', 'else',
+])
+
+
+@attr.s
+class KernelModule(object):
+    """
+    A probable Linux kernel module built from one or more source files.
+    """
+    # path of the .ko module relative to the codebase root
+    path = attr.ib()
+    name = attr.ib()
+    # path of the Kbuild file that declares this module if any
+    kbuild = attr.ib(default=None)
+    # the config option of a module built only if this option is "m" as
+    # declared with "obj-$(CONFIG_XXX)", or None
+    config = attr.ib(default=None)
+    sources = attr.ib(default=attr.Factory(list))
+    licenses = attr.ib(default=attr.Factory(list))
+    exports = attr.ib(default=attr.Factory(list))
+    gpl_exports = attr.ib(default=attr.Factory(list))
+    # {GPL-only symbol: providing module path}
+    gpl_symbols_used = attr.ib(default=attr.Factory(dict))
+
+    @property
+    def gpl_compatible(self):
+        """
+        Return True if all the module licenses are GPL-compatible, False if
+        any is not and None if the module has no license.
+        """
+        if not self.licenses:
+            return None
+        return all(lic in GPL_COMPATIBLE_LICENSES for lic in self.licenses)
+
+    def to_dict(self):
+        mapping = attr.asdict(self)
+        mapping['gpl_compatible'] = self.gpl_compatible
+        return mapping
+
+
+def is_kbuild(path):
+    """
+    Return True if the file at ``path`` is a Kbuild file or a Makefile.
+    """
+    return posixpath.basename(path) in KBUILD_FILE_NAMES
+
+
+def parse_kbuild(lines):
+    """
+    Return a mapping of {module name: ([object paths], config)} of the
+    loadable modules declared in the Kbuild or Makefile text ``lines``.
+
+    Modules are declared with "obj-m" or "obj-$(CONFIG_XXX)" and a composite
+    module lists its objects with "<name>-objs", "<name>-y", "<name>-m" or
+    "<name>-$(CONFIG_XXX)". Built-in "obj-y" objects are not modules. The
+    config is the "CONFIG_XXX" option of a conditional module or None.
+    """
+    # {module name: config}
+    modules = {}
+    composites = defaultdict(list)
+    for line in iter_logical_lines(lines):
+        line = line.partition('#')[0]
+        match = KBUILD_ASSIGNMENT(line)
+        if not match:
+            continue
+        name, suffix, value = match.groups()
+        objects = [v for v in value.split() if v.endswith('.o')]
+        if name == 'obj':
+            if suffix == 'm':
+                config = None
+            elif suffix.startswith('$('):
+                config = suffix[2:-1]
+            else:
+                continue
+            for obj in objects:
+                modules.setdefault(obj[:-2], config)
+        else:
+            composites[name].extend(objects)
+
+    return {
+        module: (composites.get(module) or [module + '.o'], config)
+        for module, config in modules.items()
+    }
+
+
+def get_object_source(object_path, files):
+    """
+    Return the path of the source of an ``object_path`` found in a set of
+    ``files`` paths or None.
+    """
+    base = object_path[:-2]
+    for extension in SOURCE_EXTENSIONS:
+        source = base + extension
+        if source in files:
+            return source
+
+
+def is_source(path):
+    """
+    Return True if the file at ``path`` is a source an object file can be
+    compiled from.
+    """
+    return path.endswith(SOURCE_EXTENSIONS)
+
+
+def get_identifiers(location):
+    """
+    Return a sorted list of the unique names of the functions called in the
+    source file at ``location``, ignoring comments, strings and
+    keywords. Only these names can be calls to GPL-only exported functions.
+    """
+    with open(location, encoding='utf-8', errors='replace') as inp:
+        text = C_COMMENTS_AND_LITERALS(' ', inp.read())
+    return sorted(set(C_CALLS(text)) - C_KEYWORDS)
+
+
+def build_kernel_modules(codebase):
+    """
+    Return a list of KernelModule built from the Kbuild files and the lkm_clue
+    scan data of a ``codebase``.
+
+    The sources listed in a Kbuild file are grouped in the module that lists
+    them. The other sources with lkm_clue data are grouped by directory in a
+    module named after the directory, or after the only source with a module
+    license in this directory.
+
+    The GPL-only exported symbols of all modules are indexed first such that
+    the names of the functions called in each module sources are resolved
+    with a single lookup each, rather than matching every module against every
+    other module. These names are collected during the scan and removed from
+    the lkm_clue scan data once used.
+    """
+    files = set()
+    kbuilds = []
+    clues_by_path = {}
+    # {path: [called function names]}
+    identifiers_by_path = {}
+
+    for resource in codebase.walk():
+        if not resource.is_file:
+            continue
+        files.add(resource.path)
+        if is_kbuild(resource.path):
+            kbuilds.append(resource)
+        lkm_clue = getattr(resource, 'lkm_clue', None)
+        if not lkm_clue:
+            continue
+        identifiers = lkm_clue.pop(IDENTIFIERS_KEY, None)
+        if identifiers is not None:
+            identifiers_by_path[resource.path] = identifiers
+            codebase.save_resource(resource)
+        if lkm_clue:
+            clues_by_path[resource.path] = lkm_clue
+
+    modules = []
+    claimed = set()
+    for kbuild in kbuilds:
+        base_dir = posixpath.dirname(kbuild.path)
+        with open(kbuild.location, encoding='utf-8', errors='replace') as lines:
+            declared = parse_kbuild(lines)
+        for name, (objects, config) in sorted(declared.items()):
+            module = KernelModule(
+                path=posixpath.join(base_dir, name + '.ko'),
+                name=name,
+                kbuild=kbuild.path,
+                config=config,
+            )
+            for object_path in objects:
+                object_path = posixpath.normpath(posixpath.join(base_dir, object_path))
+                source = get_object_source(object_path, files)
+                if source and source not in module.sources:
+                    module.sources.append(source)
+                    claimed.add(source)
+            modules.append(module)
+
+    # {directory: [paths]} of the unclaimed sources with clues
+    unclaimed = defaultdict(list)
+    for path in sorted(clues_by_path):
+        if path not in claimed:
+            unclaimed[posixpath.dirname(path)].append(path)
+
+    for directory, sources in sorted(unclaimed.items()):
+        licensed = [s for s in sources if clues_by_path[s].get('lkm-license')]
+        if len(licensed) == 1:
+            name = posixpath.splitext(posixpath.basename(licensed[0]))[0]
+        else:
+            name = posixpath.basename(directory) or 'module'
+        modules.append(KernelModule(
+            path=posixpath.join(directory, name + '.ko'),
+            name=name,
+            sources=sources,
+        ))
+
+    # {GPL-only symbol: providing module path}
+    gpl_symbols = {}
+    for module in modules:
+        exports = set()
+        gpl_exports = set()
+        licenses = set()
+        for source in module.sources:
+            clues = clues_by_path.get(source) or {}
+            licenses.update(clues.get('lkm-license') or [])
+            exports.update(clues.get('lkm-symbol') or [])
+            gpl_exports.update(clues.get('lkm-symbol-gpl') or [])
+        module.licenses = sorted(licenses)
+        module.exports = sorted(exports - gpl_exports)
+        module.gpl_exports = sorted(gpl_exports)
+        for symbol in module.gpl_exports:
+            gpl_symbols.setdefault(symbol, module.path)
+
+    if gpl_symbols:
+        for module in modules:
+            used = {}
+            for source in module.sources:
+                for identifier in identifiers_by_path.get(source) or []:
+                    provider = gpl_symbols.get(identifier)
+                    if provider and provider != module.path:
+                        used[identifier] = provider
+            module.gpl_symbols_used = dict(sorted(used.items()))
+
+    return modules
+
+
+def get_kernel_modules_data(modules):
+    """
+    Return a mapping suitable for JSON serialization of a list of KernelModule
+    ``modules`` with an index of their exported symbols.
+    """
+    symbols = {}
+    for module in modules:
+        for symbol in module.exports:
+            symbols.setdefault(symbol, dict(module=module.path, gpl_only=False))
+        for symbol in module.gpl_exports:
+            symbols.setdefault(symbol, dict(module=module.path, gpl_only=True))
+
+    return dict(
+        modules=[module.to_dict() for module in modules],
+        symbols=dict(sorted(symbols.items())),
+    )
+
+
+def dump_kernel_modules(modules, output_file):
+    """
+    Write the ``modules`` list of KernelModule as JSON to an ``output_file``
+    file-like object.
+    """
+    json.dump(get_kernel_modules_data(modules), output_file, indent=2)
@@ -52,65 +52,172 @@ def is_make_depend(location):
 
 def makedepend_scan(location, **kwargs):
     """
-    Return path of the .o location and the list of the source location paths
-    that were built in the .o given the location of the .d location generated
-    by makedepend
+    Return a mapping of {target path: [prerequisite source paths]} for each
+    rule target given the location of a .d make dependency file generated by
+    makedepend or by gcc -M and its variants such as "-MD -MP".
+
+    Phony targets, the .d dependency files targets and the rules without
+    prerequisites such as the empty rules created with gcc -MP are skipped.
     """
-    obj_path = ''
-    src_paths = []
-    if is_make_depend(location):
-        file_name = fileutils.resource_name(fileutils.as_posixpath(location))
+    if not is_make_depend(location):
+        return
 
-        with open(location, 'rU') as dfile:
-            for line in dfile:
-                line = line.strip()
+    file_name = fileutils.resource_name(fileutils.as_posixpath(location))
 
-                if not line or line == "\\":
-                    continue
+    # {target: ([prerequisites], {prerequisites})}
+    dependencies = {}
+    phony_targets = set()
+    with open(location, encoding='utf-8', errors='replace') as dfile:
+        for targets, prerequisites in parse_make_rules(dfile):
+            if '.PHONY' in targets:
+                phony_targets.update(prerequisites)
+                continue
+
+            if not prerequisites:
+                continue
 
-                if ":" in line and obj_path:
-                    break
-
-                if ":" in line:
-                    left, right = line.split(":")
-                    left = left.strip()
-                    # Assuming there is no space in the filename and that
-                    # several files may exist on the left side, space
-                    # separated FIXME: we should use a proper makefile parser
-                    if " " in left:
-                        left_files = []
-                        for f in left.split():
-                            if (f not in left_files
-                                and f != file_name
-                                and not f.endswith(file_name)
-                                    and not f.endswith('.d')):
-                                left_files.append(f)
-
-                        lenf = len(left_files)
-
-                        if lenf >= 1:
-                            obj_path = left_files[0]
-                    else:
-                        obj_path = left
-
-                    right = right.strip()
-                    right = right.rstrip("\\")
-                    right = right.strip()
-
-                    if right:
-                        for r in right.split():
-                            src_paths.append(r)
-
-                else:
-                    line = line.strip()
-                    line = line.rstrip("\\")
-                    line = line.strip()
-                    if line and not line.endswith('.d'):
-                        # FIXME: we assume no spaces in filenames: use a make
-                        # parser
-                        for p in line.split():
-                            src_paths.append(p)
-    if obj_path and src_paths:
-        makedepend_result = dict()
-        makedepend_result[obj_path] = src_paths
+            for target in targets:
+                if target.endswith('.d') or target.endswith(file_name):
+                    continue
+                target_prerequisites = dependencies.get(target)
+                if target_prerequisites is None:
+                    target_prerequisites = dependencies[target] = ([], set())
+                ordered, seen = target_prerequisites
+                for prerequisite in prerequisites:
+                    if prerequisite not in seen and not prerequisite.endswith('.d'):
+                        seen.add(prerequisite)
+                        ordered.append(prerequisite)
+
+    makedepend_result = {
+        target: ordered
+        for target, (ordered, _seen) in dependencies.items()
+        if ordered and target not in phony_targets
+    }
+    if makedepend_result:
         return dict(makedepend=makedepend_result)
+
+
+def parse_make_rules(lines):
+    """
+    Yield tuples of (list of targets, list of prerequisites) for each rule
+    parsed from an iterable of make dependency ``lines``. The lines are
+    streamed once.
+
+    Backslash-newline continuations, comments, escaped spaces, "#" and ":"
+    and "$$" are handled. Double-colon rules are treated as regular rules.
+    Order-only prerequisites, recipes and variable assignments are ignored.
+    """
+    for logical_line in iter_logical_lines(lines):
+        tokens, separator = tokenize(logical_line)
+        if separator is None:
+            # not a rule
+            continue
+        targets = tokens[:separator]
+        prerequisites = tokens[separator:]
+        if '|' in prerequisites:
+            # skip order-only prerequisites, typically directories
+            prerequisites = prerequisites[:prerequisites.index('|')]
+        if targets:
+            yield targets, prerequisites
+
+
+def iter_logical_lines(lines):
+    """
+    Yield logical lines from an iterable of physical ``lines`` joining lines
+    ending with a backslash continuation. Skip recipe lines and their
+    continuation lines.
+    """
+    parts = []
+    in_recipe = False
+    for line in lines:
+        line = line.rstrip('\r\n')
+        # an odd count of trailing backslashes is a continuation
+        stripped = line.rstrip('\\')
+        continued = (len(line) - len(stripped)) % 2
+
+        if in_recipe or (not parts and line.startswith('\t')):
+            # a recipe line
+            in_recipe = continued
+            continue
+
+        if continued:
+            parts.append(line[:-1])
+            continue
+
+        parts.append(line)
+        yield ' '.join(parts)
+        parts = []
+
+    if parts:
+        yield ' '.join(parts)
+
+
+def tokenize(line):
+    """
+    Return a tuple of (list of tokens, index of the first prerequisite token
+    or None if this is not a rule) for a logical make dependency ``line``.
+    A line with an unescaped "=" is a variable assignment such as "A = b:c",
+    "A := b", "A ?= b", "A += b" or a target-specific "foo.o: A = b" and not
+    a rule.
+    """
+    tokens = []
+    separator = None
+    token = []
+    i = 0
+    length = len(line)
+    while i < length:
+        c = line[i]
+
+        if c == '\\' and i + 1 < length and line[i + 1] in ' \t#:\\':
+            # escaped character
+            token.append(line[i + 1])
+            i += 2
+            continue
+
+        if c == '$' and i + 1 < length and line[i + 1] == '$':
+            token.append('$')
+            i += 2
+            continue
+
+        if c == '#':
+            # a comment
+            break
+
+        if c in ' \t':
+            if token:
+                tokens.append(''.join(token))
+                token = []
+            i += 1
+            continue
+
+        if c == '=':
+            # a variable assignment, not a rule
+            return [], None
+
+        if c == ':' and separator is None and not is_drive_letter(token, line, i):
+            if token:
+                tokens.append(''.join(token))
+                token = []
+            separator = len(tokens)
+            # a double-colon rule
+            i += 2 if line[i + 1:i + 2] == ':' else 1
+            continue
+
+        token.append(c)
+        i += 1
+
+    if token:
+        tokens.append(''.join(token))
+    return tokens, separator
+
+
+def is_drive_letter(token, line, i):
+    """
+    Return True if the colon at index ``i`` of a ``line`` is part of a Windows
+    drive letter such as "C:/" or "C:\\" that follows a single letter ``token``.
+    """
+    return (
+        len(token) == 1
+        and token[0].isalpha()
+        and line[i + 1:i + 2] in ('/', '\\')
+    )
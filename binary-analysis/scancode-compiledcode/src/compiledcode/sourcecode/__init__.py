@@ -8,6 +8,7 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+import posixpath
 from functools import partial
 from itertools import chain
 
@@ -15,13 +16,17 @@ import attr
 
 from commoncode import fileutils
 from commoncode.cliutils import PluggableCommandLineOption
+from commoncode.cliutils import POST_SCAN_GROUP
 from commoncode.cliutils import SCAN_GROUP
+from plugincode.post_scan import PostScanPlugin
+from plugincode.post_scan import post_scan_impl
 from plugincode.scan import ScanPlugin
 from plugincode.scan import scan_impl
 from typecode import contenttype
 
 from compiledcode.sourcecode import kernel
 from compiledcode.sourcecode.metrics import file_lines_count
+from compiledcode.sourcecode.source import get_ctags_filter
 
 
 @scan_impl
@@ -60,3 +65,98 @@ def get_codecommentlines(location, **kwargs):
         codelines=codelines,
         commentlines=commentlines
     )
+
+
+@scan_impl
+class SourceSymbolsScanner(ScanPlugin):
+    """
+    Collect the local and global functions of source code files using ctags.
+    """
+    resource_attributes = dict(
+        source_local_functions=attr.ib(default=attr.Factory(list), repr=False),
+        source_global_functions=attr.ib(default=attr.Factory(list), repr=False),
+    )
+
+    options = [
+        PluggableCommandLineOption(('--source-symbols',),
+                                   is_flag=True, default=False,
+                                   help='Collect the local and global functions '
+                                   'defined or declared in source code files.',
+                                   help_group=SCAN_GROUP,
+                                   sort_order=100),
+    ]
+
+    def is_enabled(self, source_symbols, **kwargs):
+        return source_symbols
+
+    def get_scanner(self, **kwargs):
+        return get_source_symbols
+
+
+def get_source_symbols(location, **kwargs):
+    """
+    Return a mapping of the local and global functions of the source file at
+    ``location`` or None if this is not a source file.
+
+    A single ctags process is reused for all the files scanned in a process.
+    """
+    T = contenttype.get_type(location)
+    if not T.is_source or not T.is_text:
+        return
+    local_functions, global_functions = get_ctags_filter().get_functions(location)
+    return dict(
+        source_local_functions=sorted(set(local_functions)),
+        source_global_functions=sorted(set(global_functions)),
+    )
+
+
+@post_scan_impl
+class CodeCommentLinesTotals(PostScanPlugin):
+    """
+    Set the number of lines of code and lines of comments of each directory
+    to the totals of all the files in its tree.
+    """
+
+    options = [
+        PluggableCommandLineOption(('--codecommentlines-totals',),
+                                   is_flag=True, default=False,
+                                   required_options=['codecommentlines'],
+                                   help='Report for each directory the total number '
+                                   'of lines of code and comments of all the files '
+                                   'in its tree.',
+                                   help_group=POST_SCAN_GROUP,
+                                   sort_order=100),
+    ]
+
+    def is_enabled(self, codecommentlines_totals, **kwargs):
+        return codecommentlines_totals
+
+    def process_codebase(self, codebase, **kwargs):
+        sum_codecommentlines(codebase)
+
+
+def sum_codecommentlines(codebase):
+    """
+    Update the codelines and commentlines of each directory of a ``codebase``
+    with the totals of all the files in its tree.
+
+    This is a single bottom-up walk where each resource adds its already
+    computed values to its parent directory.
+    """
+    # {directory path: [codelines, commentlines]}
+    totals = {}
+    for resource in codebase.walk(topdown=False):
+        if resource.is_file:
+            codelines = resource.codelines or 0
+            commentlines = resource.commentlines or 0
+        else:
+            codelines, commentlines = totals.pop(resource.path, (0, 0))
+            resource.codelines = codelines
+            resource.commentlines = commentlines
+            codebase.save_resource(resource)
+
+        if not codelines and not commentlines:
+            continue
+        parent = totals.setdefault(posixpath.dirname(resource.path), [0, 0])
+        parent[0] += codelines
+        parent[1] += commentlines
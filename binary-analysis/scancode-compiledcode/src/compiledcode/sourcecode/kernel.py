@@ -9,16 +9,17 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
-import re
 import logging
+import mmap
+import re
 
-from cluecode import finder
+from commoncode.text import toascii
+from textcode import analysis
 
 LOG = logging.getLogger(__name__)
 
 # TODO: beef up.
 # add detailed annotation for each of the common MODULE_XXX macros
-# add support for checking the GPL symbols GPLONLY and so on
 # add support for finding the init_module and module_init functions defs
 # add separate support for finding all linux includes
 LKM_REGEXES = [
@@ -27,20 +28,74 @@ LKM_REGEXES = [
     ('lkm-make-flag', '\-DMODULE'),
     ('lkm-make-flag', '\_\_KERNEL\_\_'),
     ('lkm-license', 'MODULE_LICENSE.*\("(.*)"\);'),
-    ('lkm-symbol', 'EXPORT_SYMBOL.*\("(.*)"\);'),
-    ('lkm-symbol-gpl', 'EXPORT_SYMBOL_GPL.*\("(.*)"\);'),
+    # match both the plain EXPORT_SYMBOL(foo); and quoted ("foo") forms and
+    # the namespaced EXPORT_SYMBOL_NS_GPL(foo, NS); variants
+    ('lkm-symbol', r'EXPORT_SYMBOL\w*\s*\(\s*"?(\w+)'),
+    ('lkm-symbol-gpl', r'EXPORT_SYMBOL(?:_NS)?_GPL\w*\s*\(\s*"?(\w+)'),
+]
+
+
+# A literal that must be present in a line for each LKM_REGEXES to match,
+# in the same order
+LKM_LITERALS = [
+    'linux/module.h',
+    '-DMODULE',
+    '__KERNEL__',
+    'MODULE_LICENSE',
+    'EXPORT_SYMBOL',
+    '_GPL',
+]
+
+# Compiled once: list of (key, compiled regex, literal)
+_LKM_PATTERNS = [
+    (key, re.compile(regex), literal)
+    for (key, regex), literal in zip(LKM_REGEXES, LKM_LITERALS)
 ]
 
+# The distinct literals used to reject a file before any line is matched
+_LKM_FILE_LITERALS = tuple(sorted(set(
+    literal.encode('ascii') for literal in LKM_LITERALS if literal != '_GPL'
+)))
+
 
 def lkm_patterns():
-    return [(key, re.compile(regex),) for key, regex in LKM_REGEXES]
+    return [(key, pattern) for key, pattern, _literal in _LKM_PATTERNS]
+
+
+def has_lkm_literals(location):
+    """
+    Return True if the file at ``location`` contains any of the literal strings
+    required by the LKM regexes. This is a fast bytes search on a memory map.
+    """
+    with open(location, 'rb') as inp:
+        try:
+            data = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            return False
+        with data:
+            return any(data.find(literal) != -1 for literal in _LKM_FILE_LITERALS)
 
 
 def find_lkms(location):
     """
     Yield possible LKM-related clues found in file at location.
+
+    Files without any of the LKM literals are rejected first with a fast
+    bytes search and the regexes only run on the lines that contain the
+    literal they require.
     """
-    matches = finder.find(location, lkm_patterns())
-    matches = finder.apply_filters(matches, finder.unique_filter)
-    for key, lkm_clue, _line, _lineno in matches:
-        yield key, lkm_clue
+    if not has_lkm_literals(location):
+        return
+
+    seen = set()
+    for _line_number, line in analysis.numbered_text_lines(location, demarkup=False):
+        for key, pattern, literal in _LKM_PATTERNS:
+            if literal not in line:
+                continue
+            for match in pattern.findall(line):
+                lkm_clue = toascii(match)
+                if (key, lkm_clue) in seen:
+                    continue
+                seen.add((key, lkm_clue))
+                yield key, lkm_clue
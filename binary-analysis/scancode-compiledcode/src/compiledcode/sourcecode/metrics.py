@@ -8,17 +8,536 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+from collections import Counter
+from functools import lru_cache
+from heapq import heapify
+from heapq import heappop
+from heapq import heapreplace
+from operator import itemgetter
+
 import typecode
 from commoncode.filetype import counter
-from commoncode.functional import memoize
+from commoncode import fileutils
 from commoncode import filetype
 
+# Maximum number of files line counts to keep cached. The code and comment
+# lines counts of a file are requested one after the other, so a small cache
+# is enough to do only one pass on each file.
+LINES_COUNT_CACHE_SIZE = 1024
+
+# Size of the chunks read from a file
+CHUNK_SIZE = 1024 * 1024
+
+# The first bytes of the lines that start a comment in any language
+COMMENT_STARTS = (b'/', b'#', b';', b'*')
+
+_first_byte = itemgetter(slice(0, 1))
+
+
+def count_lines(data):
+    """
+    Return a tuple of (code, comment) line counts in ``data`` bytes made of
+    complete lines each ending with a newline.
+
+    Only the first non-blank byte of each line is used to classify it and
+    these are counted at once.
+    """
+    stripped = list(map(bytes.lstrip, data.split(b'\n')))
+    # the empty string after the last newline is not a line
+    stripped.pop()
+    first_bytes = Counter(map(_first_byte, stripped))
+    comment = sum(first_bytes[start] for start in COMMENT_STARTS)
+    if first_bytes[b'@']:
+        comment += sum(1 for line in stripped if line.startswith(b'@rem'))
+    return len(stripped) - first_bytes[b''] - comment, comment
+
+
+# Comment syntaxes as a tuple of:
+# - the line comment starts,
+# - the (start, end) delimiters of the block comments,
+# - the (start, end) delimiters of the multi-line strings that are comments
+#   when they start a line such as Python docstrings and code otherwise,
+# - the strings as (start, end, spans lines, has backslash escapes): a comment
+#   start in a string is not a comment. An end of None is for C++ raw strings
+#   such as R"delimiter(...)delimiter".
+# Each marker costs a search over the whole file, so a syntax has only the
+# strings of its languages.
+C_QUOTES = ((b'"', b'"', False, True), (b"'", b"'", False, True))
+
+C_SYNTAX = ((b'//',), ((b'/*', b'*/'),), (), C_QUOTES)
+
+# C++ raw strings
+CPP_SYNTAX = ((b'//',), ((b'/*', b'*/'),), (), C_QUOTES + ((b'R"', None, True, False),))
+
+# Java, Kotlin, Scala and Swift text blocks
+JAVA_SYNTAX = ((b'//',), ((b'/*', b'*/'),), (), C_QUOTES + ((b'"""', b'"""', True, True),))
+
+# JavaScript template literals and Go raw strings
+JAVASCRIPT_SYNTAX = ((b'//',), ((b'/*', b'*/'),), (), C_QUOTES + ((b'`', b'`', True, False),))
+
+# Rust strings span lines and a single quote is also a lifetime
+RUST_SYNTAX = (
+    (b'//',),
+    ((b'/*', b'*/'),),
+    (),
+    ((b'"', b'"', True, True), (b'r#"', b'"#', True, False)),
+)
+
+# strings in single or double quotes spanning lines with backslash escapes
+MULTI_LINE_QUOTES = ((b'"', b'"', True, True), (b"'", b"'", True, True))
+
+COMMENT_SYNTAXES = {
+    'c': C_SYNTAX,
+    'cpp': CPP_SYNTAX,
+    'java': JAVA_SYNTAX,
+    'javascript': JAVASCRIPT_SYNTAX,
+    'rust': RUST_SYNTAX,
+    'php': ((b'//', b'#'), ((b'/*', b'*/'),), (), MULTI_LINE_QUOTES),
+    'css': ((), ((b'/*', b'*/'),), (), C_QUOTES),
+    'python': (
+        (b'#',),
+        (),
+        ((b'"""', b'"""'), (b"'''", b"'''")),
+        C_QUOTES,
+    ),
+    'shell': ((b'#',), (), (), ((b'"', b'"', True, True), (b"'", b"'", True, False))),
+    'ruby': ((b'#',), ((b'=begin', b'=end'),), (), MULTI_LINE_QUOTES),
+    'perl': ((b'#',), ((b'=pod', b'=cut'),), (), MULTI_LINE_QUOTES),
+    'markup': ((), ((b'<!--', b'-->'),), (), ()),
+    'sql': ((b'--',), ((b'/*', b'*/'),), (), ((b"'", b"'", True, False),)),
+    'lua': (
+        (b'--',),
+        ((b'--[[', b']]'),),
+        (),
+        ((b'"', b'"', False, True), (b"'", b"'", False, True), (b'[[', b']]', True, False)),
+    ),
+    'haskell': ((b'--',), ((b'{-', b'-}'),), (), ((b'"', b'"', False, True),)),
+    'lisp': ((b';',), ((b'#|', b'|#'),), (), ((b'"', b'"', True, True),)),
+    'asm': ((b';', b'#', b'//', b'@'), ((b'/*', b'*/'),), (), ((b'"', b'"', False, True),)),
+    'batch': ((b'@rem', b'@REM', b'rem ', b'REM ', b'::'), (), (), ()),
+}
+
+# {file extension: comment syntax name}
+SYNTAX_BY_EXTENSION = {
+    '.c': 'c', '.h': 'c', '.i': 'c', '.inc': 'c', '.m': 'c', '.cs': 'c',
+    '.cc': 'cpp', '.cp': 'cpp', '.cpp': 'cpp', '.cxx': 'cpp', '.c++': 'cpp',
+    '.hh': 'cpp', '.hpp': 'cpp', '.hxx': 'cpp', '.h++': 'cpp', '.ii': 'cpp',
+    '.mm': 'cpp',
+    '.java': 'java', '.swift': 'java', '.kt': 'java', '.scala': 'java', '.groovy': 'java',
+    '.js': 'javascript', '.ts': 'javascript', '.go': 'javascript',
+    '.rs': 'rust',
+    '.php': 'php',
+    '.css': 'css',
+    '.py': 'python', '.pyx': 'python',
+    '.sh': 'shell', '.bash': 'shell', '.mk': 'shell', '.cmake': 'shell',
+    '.pl': 'perl', '.pm': 'perl',
+    '.rb': 'ruby',
+    '.html': 'markup', '.htm': 'markup', '.xml': 'markup', '.xsl': 'markup',
+    '.sql': 'sql',
+    '.lua': 'lua',
+    '.hs': 'haskell',
+    '.lisp': 'lisp', '.el': 'lisp', '.clj': 'lisp', '.scm': 'lisp',
+    '.s': 'asm', '.asm': 'asm',
+    '.bat': 'batch', '.cmd': 'batch',
+}
+
+# {pygments programming language: comment syntax name} used for files
+# without a known extension
+SYNTAX_BY_PROGRAMMING_LANGUAGE = {
+    'C': 'c',
+    'C++': 'cpp',
+    'Java': 'java',
+    'JavaScript': 'javascript',
+    'Python': 'python',
+    'Bash': 'shell',
+    'Makefile': 'shell',
+    'Perl': 'perl',
+    'Ruby': 'ruby',
+    'HTML': 'markup',
+    'XML': 'markup',
+}
+
+
+def get_comment_syntax(location, T=None):
+    """
+    Return a comment syntax name for the file at ``location`` using its
+    extension or its ``T`` content type programming language or None.
+    """
+    extension = fileutils.file_extension(location).lower()
+    name = SYNTAX_BY_EXTENSION.get(extension)
+    if not name and T:
+        name = SYNTAX_BY_PROGRAMMING_LANGUAGE.get(T.programming_language)
+    return name
+
+
+# backslash line continuations
+CONTINUATIONS = (b'\\\n', b'\\\r\n')
+
+# kinds of markers
+LINE_COMMENT = 0
+BLOCK_COMMENT = 1
+DOCSTRING = 2
+STRING = 3
+
+
+def get_markers(syntax):
+    """
+    Return a list of (marker, kind, end, spans lines, has escapes) for the
+    comment and string markers of a ``syntax`` comment syntax tuple, longest
+    markers first such that "--[[" is preferred over "--" at the same position.
+    """
+    line_comments, block_comments, docstrings, strings = syntax
+    markers = [(start, LINE_COMMENT, b'\n', False, False) for start in line_comments]
+    markers.extend((start, BLOCK_COMMENT, end, True, False) for start, end in block_comments)
+    markers.extend((start, DOCSTRING, end, True, True) for start, end in docstrings)
+    markers.extend(
+        (start, STRING, end, multi_line, escapes)
+        for start, end, multi_line, escapes in strings)
+    return sorted(markers, key=lambda m: -len(m[0]))
+
+
+# {comment syntax name: markers}
+MARKERS = {name: get_markers(syntax) for name, syntax in COMMENT_SYNTAXES.items()}
+
+
+def count_nonblank_lines(data):
+    """
+    Return the number of lines with any non-whitespace byte in ``data`` bytes
+    made of complete lines each ending with a newline.
+    """
+    lines = data.split(b'\n')
+    # the empty string after the last newline is not a line
+    lines.pop()
+    return len(lines) - lines.count(b'') - list(map(bytes.isspace, lines)).count(True)
+
+
+class SourceLinesCounter(object):
+    """
+    Count the code and comment lines of a source file using its comment syntax
+    with a lexer fed with chunks of complete lines. The block comments and
+    strings left open at the end of a chunk continue in the next chunk.
+
+    A line with any code is a code line, a line with only comments is a
+    comment line and blank lines are not counted.
+
+    This jumps from one comment or multi-line string marker to the next,
+    skipping over the strings and the block comments. The markers are found
+    by their first byte with single byte searches as these are much faster
+    than multiple bytes searches. The comment lines are counted at each
+    comment and all the other non-blank lines are code lines.
+
+    The strings that end on their line only matter if they contain a comment
+    marker: they are skipped only on the lines with a marker, from the start
+    of the line or from the previous backslash line continuation.
+    """
+
+    def __init__(self, syntax_name):
+        markers = MARKERS[syntax_name]
+        self.comment_starts = tuple(m[0] for m in markers if m[1] != STRING)
+        # the strings ending on their line
+        self.line_strings = [
+            m for m in markers if m[1] == STRING and not m[3] and m[2]]
+        # a list of (first byte or marker, markers longest first) for the
+        # comments and multi-line strings
+        groups = {}
+        for marker in markers:
+            if marker not in self.line_strings:
+                key = marker[0][:1]
+                if key.isalnum() or key == b'=':
+                    # too common in code: search the whole marker
+                    key = marker[0]
+                groups.setdefault(key, []).append(marker)
+        self.marker_groups = list(groups.items())
+        # a (kind, end, spans lines, has escapes) tuple for a block comment
+        # or a string continued from the previous chunk
+        self.pending = None
 
-@memoize
+    def count_lines(self, data):
+        """
+        Return a tuple of (code, comment) line counts in ``data`` bytes made
+        of complete lines each ending with a newline.
+        """
+        length = len(data)
+        groups = self.marker_groups
+        line_strings = self.line_strings
+        comment_starts = self.comment_starts
+        find = data.find
+        startswith = data.startswith
+        comment = 0
+        # the inner lines of the block comments spanning lines counted at once
+        inner_lines = []
+        pos = 0
+        if self.pending:
+            kind, end, multi_line, escapes = self.pending
+            self.pending = None
+            if kind == STRING:
+                pos = self.skip_string(data, 0, end, multi_line, escapes)
+            else:
+                pos, comment = self.skip_comment(
+                    data, 0, end, True, inner_lines, continued=True)
+
+        # a heap of the (next position, group index) of the markers first
+        # bytes still found in data
+        heap = []
+        for i, (key, _markers) in enumerate(groups):
+            first_pos = find(key, pos)
+            if first_pos != -1:
+                heap.append((first_pos, i))
+        heapify(heap)
+        # the position of the next backslash line continuation
+        continuation = -1
+
+        while heap:
+            start, i = heap[0]
+            key, markers = groups[i]
+            if start < pos:
+                # skipped in a string or a comment: find it again
+                first_pos = find(key, pos)
+                if first_pos == -1:
+                    heappop(heap)
+                else:
+                    heapreplace(heap, (first_pos, i))
+                continue
+
+            for marker in markers:
+                if startswith(marker[0], start):
+                    break
+            else:
+                # a first byte that starts no marker
+                first_pos = find(key, start + 1)
+                if first_pos == -1:
+                    heappop(heap)
+                else:
+                    heapreplace(heap, (first_pos, i))
+                continue
+
+            if start and data[start - 1] == 10:
+                line_start = start
+                starts_line = True
+            else:
+                line_start = data.rfind(b'\n', 0, start) + 1
+                starts_line = not data[line_start:start].strip()
+
+            if line_strings:
+                if continuation < pos:
+                    continuation = find_continuation(data, pos)
+                if continuation < start:
+                    # a string may continue on the next lines
+                    string_pos = self.skip_line_strings(data, pos, start)
+                elif not starts_line:
+                    string_pos = self.skip_line_strings(
+                        data, max(pos, line_start), start)
+                else:
+                    string_pos = start
+                if string_pos > start:
+                    # the marker is in a string
+                    pos = string_pos
+                    continue
+
+            marker, kind, end, multi_line, escapes = marker
+            body_start = start + len(marker)
+            if kind == STRING:
+                pos = self.skip_string(data, body_start, end, multi_line, escapes)
+                continue
+
+            if kind == LINE_COMMENT:
+                if starts_line:
+                    comment += 1
+                pos = find(b'\n', start)
+                continue
+
+            if kind == DOCSTRING and not starts_line:
+                # a multi-line string in code
+                pos = self.skip_string(data, body_start, end, multi_line, escapes)
+                continue
+
+            end_pos = find(end, body_start)
+            if end_pos == -1:
+                # the comment continues in the next chunk
+                pos, block_comment = self.skip_comment(
+                    data, body_start, end, starts_line, inner_lines)
+                comment += block_comment
+                continue
+
+            # Note: this is skip_comment() inlined for speed
+            first_line_end = find(b'\n', body_start, end_pos)
+            pos = end_pos + len(end)
+            if first_line_end != -1:
+                # the comment spans lines: count its non-blank inner lines
+                last_line_start = data.rfind(b'\n', 0, pos) + 1
+                if last_line_start > first_line_end + 1:
+                    inner_lines.append(data[first_line_end + 1:last_line_start - 1])
+                if starts_line:
+                    comment += 1
+                starts_line = True
+
+            # the last line is a comment line if nothing but comments follow
+            if starts_line:
+                if data[pos] == 10:
+                    comment += 1
+                else:
+                    suffix = data[pos:find(b'\n', pos)].strip()
+                    if not suffix or suffix.startswith(comment_starts):
+                        comment += 1
+
+        if line_strings and data.endswith(CONTINUATIONS):
+            # a string may continue in the next chunk
+            self.skip_line_strings(data, pos, length)
+
+        if inner_lines:
+            inner_lines.append(b'')
+            comment += count_nonblank_lines(b'\n'.join(inner_lines))
+        return count_nonblank_lines(data) - comment, comment
+
+    def skip_line_strings(self, data, pos, limit):
+        """
+        Return the position after the strings ending on their line that start
+        from ``pos`` up to ``limit`` in ``data``. This is larger than
+        ``limit`` if ``limit`` is in a string.
+        """
+        find = data.find
+        while pos < limit:
+            start = -1
+            for marker, _kind, end, _multi_line, escapes in self.line_strings:
+                marker_pos = find(marker, pos, limit)
+                if marker_pos != -1 and (start == -1 or marker_pos < start):
+                    start = marker_pos
+                    string = marker, end, escapes
+            if start == -1:
+                return limit
+
+            marker, end, escapes = string
+            body_start = start + len(marker)
+            # fast path for the common strings without a backslash
+            end_pos = find(end, body_start, find(b'\n', body_start))
+            if end_pos != -1 and data[end_pos - 1] != 92:
+                pos = end_pos + len(end)
+            else:
+                pos = self.skip_string(data, body_start, end, False, escapes)
+        return pos
+
+    def skip_comment(self, data, pos, end, starts_line, inner_lines, continued=False):
+        """
+        Return a tuple of (position after the end, comment lines count) for a
+        block comment with an ``end`` delimiter whose body starts at ``pos`` in
+        ``data``. ``starts_line`` is True if only blanks precede the comment on
+        its first line. ``continued`` is True if the comment started in a
+        previous chunk. The inner lines of a comment spanning lines are
+        appended to the ``inner_lines`` list to be counted later.
+        """
+        length = len(data)
+        comment = 0
+        end_pos = data.find(end, pos)
+        if continued:
+            first_line_end = -1
+        else:
+            first_line_end = data.find(b'\n', pos, length if end_pos == -1 else end_pos)
+
+        if end_pos == -1:
+            # the comment continues in the next chunk
+            self.pending = (BLOCK_COMMENT, end, True, False)
+            if starts_line and not continued:
+                comment += 1
+            inner_lines.append(data[first_line_end + 1:])
+            return length, comment
+
+        end_pos += len(end)
+        if continued or first_line_end != -1:
+            # the comment spans lines: count its non-blank inner lines
+            last_line_start = data.rfind(b'\n', 0, end_pos) + 1
+            if last_line_start > first_line_end + 1:
+                inner_lines.append(data[first_line_end + 1:last_line_start - 1])
+            if starts_line and not continued:
+                comment += 1
+            starts_line = True
+
+        # the last line is a comment line if nothing but comments follow
+        if starts_line:
+            suffix_end = data.find(b'\n', end_pos)
+            suffix = data[end_pos:length if suffix_end == -1 else suffix_end].strip()
+            if not suffix or suffix.startswith(self.comment_starts):
+                comment += 1
+        return end_pos, comment
+
+    def skip_string(self, data, pos, end, multi_line, escapes):
+        """
+        Return the position after the end of a string with an ``end``
+        delimiter whose body starts at ``pos`` in ``data``. A string that
+        does not span lines ends at the end of its line unless this line ends
+        with a backslash. A string left open continues in the next chunk.
+        """
+        length = len(data)
+        if end is None:
+            # a C++ raw string with a delimiter of up to 16 characters
+            paren = data.find(b'(', pos, pos + 17)
+            if paren == -1 or b'\n' in data[pos:paren]:
+                end, multi_line, escapes = b'"', False, True
+            else:
+                end = b')' + data[pos:paren] + b'"'
+                pos = paren + 1
+
+        while True:
+            limit = length if multi_line else data.find(b'\n', pos)
+            if limit == -1:
+                limit = length
+            end_pos = data.find(end, pos, limit)
+            if end_pos == -1:
+                if not multi_line:
+                    if not (escapes and data[pos:limit].rstrip(b'\r').endswith(b'\\')):
+                        return limit
+                    # a line continuation
+                    pos = limit + 1
+                    if pos < length:
+                        continue
+                self.pending = (STRING, end, multi_line, escapes)
+                return length
+
+            if escapes:
+                backslash = end_pos
+                while backslash > pos and data[backslash - 1] == 92:
+                    backslash -= 1
+                if (end_pos - backslash) % 2:
+                    # an escaped end delimiter
+                    pos = end_pos + 1
+                    continue
+            return end_pos + len(end)
+
+
+def find_continuation(data, pos):
+    """
+    Return the position of the first backslash line continuation from ``pos``
+    in ``data`` or the ``data`` length. Backslashes are found with a single
+    byte search as these are rare outside of strings.
+    """
+    find = data.find
+    while True:
+        pos = find(b'\\', pos)
+        if pos == -1:
+            return len(data)
+        if data.startswith(CONTINUATIONS, pos):
+            return pos
+        pos += 1
+
+
+def count_source_lines(data, syntax_name):
+    """
+    Return a tuple of (code, comment) line counts in ``data`` bytes using the
+    ``syntax_name`` comment syntax.
+    """
+    if data and not data.endswith(b'\n'):
+        data += b'\n'
+    return SourceLinesCounter(syntax_name).count_lines(data)
+
+
+@lru_cache(maxsize=LINES_COUNT_CACHE_SIZE)
 def file_lines_count(location):
     """
     Return a tuple of (code, comment) line counts in a source text file at
-    `location`. Memoization guarantees that we do only one pass on a file.
+    `location`. Caching guarantees that we do only one pass on a file.
+
+    The file is read as bytes in large chunks and the lines are counted per
+    chunk without decoding with a lexer for the file language comment syntax
+    if known. Otherwise, the lines are classified using only their first byte.
     """
 
     code = 0
@@ -28,15 +547,31 @@ def file_lines_count(location):
     if not T.is_source:
         return code, comment
 
-    with open(location) as lines:
-        for line in lines:
-            ls = line.strip()
-            if ls:
-                # TODO implement a better comment function
-                if ls.startswith(('/', '#', '@rem', ';', '*',)):
-                    comment += 1
-                else:
-                    code += 1
+    syntax_name = get_comment_syntax(location, T)
+    if syntax_name:
+        count = SourceLinesCounter(syntax_name).count_lines
+    else:
+        count = count_lines
+
+    with open(location, 'rb') as inp:
+        tail = b''
+        while True:
+            chunk = inp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk = tail + chunk
+            end = chunk.rfind(b'\n') + 1
+            tail = chunk[end:]
+            chunk_code, chunk_comment = count(chunk[:end])
+            code += chunk_code
+            comment += chunk_comment
+
+        if tail:
+            # a last line without a trailing newline
+            chunk_code, chunk_comment = count(tail + b'\n')
+            code += chunk_code
+            comment += chunk_comment
+
     return code, comment
 
 
@@ -1,4 +1,3 @@
-
 # -*- coding: utf-8 -*-
 #
 # Copyright (c) nexB Inc. and others. All rights reserved.
@@ -9,8 +8,11 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+import atexit
 import logging
 import os
+import subprocess
+import tempfile
 
 from commoncode import command
 from commoncode import fileutils
@@ -28,13 +30,30 @@ LOG = logging.getLogger(__name__)
 
 bin_dir = os.path.join(os.path.dirname(__file__), 'bin')
 
+# Maximum number of source files passed to a single ctags invocation
+BATCH_SIZE = 256
+
+# ctags arguments to list functions and prototypes with their long kind
+# names, file scope and line numbers, in the order of the source files
+CTAGS_ARGS = [
+    '--fields=Kf',
+    '--c-kinds=fp',
+    '--excmd=number',
+    '--sort=no',
+]
+
+FUNCTION_KINDS = ('function', 'prototype')
+
+# Line written by ctags in filter mode after the tags of each source file
+FILTER_TERMINATOR = '\f\n'
+
 
 class Source(object):
     """
     Source code object.
     """
 
-    def __init__(self, sourcefile):
+    def __init__(self, sourcefile, local_functions=None, global_functions=None):
         # yield nothing if we do not have a proper command
         self.sourcefile = sourcefile
 
@@ -46,51 +65,222 @@ class Source(object):
         self.files = []
         self.files.append(fileutils.file_name(sourcefile))
         # a list of function names
-        self.local_functions = []
-        self.global_functions = []
+        self.local_functions = local_functions or []
+        self.global_functions = global_functions or []
 
-        self._collect_and_parse_tags()
+        if local_functions is None and global_functions is None:
+            self._collect_and_parse_tags()
+
+    @classmethod
+    def from_files(cls, sourcefiles, batch_size=BATCH_SIZE):
+        """
+        Yield a Source for each of the ``sourcefiles`` paths running ctags
+        once for each batch of ``batch_size`` files rather than once per file.
+        """
+        cmd_loc = get_location(SCANCODE_CTAGS_EXE)
+        lib_loc = get_location(SCANCODE_CTAGS_LIB)
+        functions = iter_functions(sourcefiles, cmd_loc, lib_loc, batch_size)
+        for sourcefile, local_functions, global_functions in functions:
+            yield cls(sourcefile, local_functions, global_functions)
 
     def symbols(self):
         glocal = flatten([self.local_functions, self.global_functions])
         return sorted(glocal)
 
     def _collect_and_parse_tags(self):
-        ctags_args = ['--fields=K',
-                      '--c-kinds=fp',
-                      '-f', '-',
-                      self.sourcefile
-                      ]
-        ctags_temp_dir = fileutils.get_temp_dir(base_dir='ctags')
-        envt = {'TMPDIR': ctags_temp_dir}
-        try:
-            rc, stdo, err = command.execute2(cmd_loc=self.cmd_loc, ctags_args, env=envt,
-                                             lib_dir=self.lib_loc, to_files=True)
+        functions = iter_functions([self.sourcefile], self.cmd_loc, self.lib_loc)
+        for _sourcefile, local_functions, global_functions in functions:
+            self.local_functions.extend(local_functions)
+            self.global_functions.extend(global_functions)
+
+
+def iter_functions(sourcefiles, cmd_loc, lib_loc=None, batch_size=BATCH_SIZE):
+    """
+    Yield a tuple of (sourcefile, [local functions], [global functions]) for
+    each of the ``sourcefiles`` paths in order. Run a single ctags command at
+    ``cmd_loc`` for each batch of ``batch_size`` files and demultiplex its
+    output per file.
+    """
+    sourcefiles = list(sourcefiles)
+    for start in range(0, len(sourcefiles), batch_size):
+        batch = sourcefiles[start:start + batch_size]
+        # {sourcefile: ([local functions], [global functions])}
+        functions = {sourcefile: ([], []) for sourcefile in batch}
+        for sourcefile, name, is_local in parse_tags(run_ctags(batch, cmd_loc, lib_loc)):
+            local_functions, global_functions = functions.setdefault(sourcefile, ([], []))
+            if is_local:
+                local_functions.append(name)
+            else:
+                global_functions.append(name)
+
+        for sourcefile in batch:
+            local_functions, global_functions = functions[sourcefile]
+            yield sourcefile, local_functions, global_functions
 
+
+def run_ctags(sourcefiles, cmd_loc, lib_loc=None):
+    """
+    Yield the tag lines output by a single ctags command at ``cmd_loc`` run on
+    all the ``sourcefiles`` paths. The output is streamed from a pipe.
+    Raise an Exception on errors.
+    """
+    ctags_temp_dir = fileutils.get_temp_dir(base_dir='ctags')
+    env = command.get_env(base_vars={'TMPDIR': ctags_temp_dir}, lib_dir=lib_loc)
+    try:
+        with tempfile.TemporaryFile() as err:
+            proc = subprocess.Popen(
+                [cmd_loc] + CTAGS_ARGS + ['-f', '-'] + list(sourcefiles),
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=err,
+                universal_newlines=True,
+                errors='replace',
+            )
+            try:
+                yield from proc.stdout
+            finally:
+                proc.stdout.close()
+                rc = proc.wait()
+
+            err.seek(0)
+            error = err.read().decode('utf-8', errors='replace')
+            if 'cannot open temporary file' in error:
+                raise Exception('ctags: cannot open temporary file '
+                                ': Permission denied')
             if rc != 0:
-                raise Exception(open(err).read())
+                raise Exception(error)
+    finally:
+        fileutils.delete(ctags_temp_dir)
+
+
+def parse_tags(lines):
+    """
+    Yield a tuple of (sourcefile, function name, is local) for each function
+    or prototype tag of ctags ``lines`` output with the long kind name field.
+    A tag line is a tab-separated list of the name, the source file, the line
+    number address, the kind and an optional "file:" for file-scoped tags.
+    """
+    for line in lines:
+        if line.startswith('!'):
+            continue
+
+        fields = line.rstrip('\r\n').split('\t')
+        if len(fields) < 4:
+            continue
+
+        name, sourcefile, _address, kind = fields[:4]
+        if kind not in FUNCTION_KINDS:
+            continue
+        yield sourcefile, name, 'file:' in fields[4:]
+
+
+class CtagsFilter(object):
+    """
+    A long-lived ctags process running in filter mode that reads source file
+    paths one per line and writes back their tags followed by a terminator
+    line. This avoids starting a new ctags process for each source file.
+    """
+
+    def __init__(self, cmd_loc, lib_loc=None):
+        self.cmd_loc = cmd_loc
+        self.lib_loc = lib_loc
+        # the id of the process that owns the ctags process: a forked child
+        # process must start its own ctags process
+        self.owner_pid = os.getpid()
+        # created in the temp dir of the scan run that ScanCode deletes once
+        # done: a filter started in a scan worker process is never closed as
+        # the atexit handlers do not run when a worker process exits
+        self.temp_dir = fileutils.get_temp_dir(prefix='ctags-')
+        self.err = tempfile.TemporaryFile()
+        env = command.get_env(base_vars={'TMPDIR': self.temp_dir}, lib_dir=lib_loc)
+        self.proc = subprocess.Popen(
+            [cmd_loc, '--filter=yes', '--filter-terminator=' + FILTER_TERMINATOR] + CTAGS_ARGS,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self.err,
+            universal_newlines=True,
+            errors='replace',
+        )
 
-            with open(stdo, 'rb') as lines:
-                for line in lines:
-                    if 'cannot open temporary file' in line:
-                        raise Exception('ctags: cannot open temporary file '
-                                        ': Permission denied')
+    def is_alive(self):
+        return (
+            self.owner_pid == os.getpid()
+            and self.proc.poll() is None
+            and os.path.exists(self.temp_dir)
+        )
 
-                    if line.startswith('!'):
-                        continue
+    def get_tag_lines(self, sourcefile):
+        """
+        Return a list of the tag lines of a ``sourcefile`` path.
+        Raise an Exception on errors.
+        """
+        if '\n' in sourcefile or '\r' in sourcefile:
+            # a path with a line break cannot be sent in filter mode
+            return list(run_ctags([sourcefile], self.cmd_loc, self.lib_loc))
 
-                    line = line.strip()
-                    if not line:
-                        continue
+        self.proc.stdin.write(sourcefile + '\n')
+        self.proc.stdin.flush()
+        lines = []
+        for line in iter(self.proc.stdout.readline, ''):
+            if line == FILTER_TERMINATOR:
+                return lines
+            lines.append(line)
 
-                    splitted = line.split('\t')
+        self.err.seek(0)
+        error = self.err.read().decode('utf-8', errors='replace')
+        self.close()
+        raise Exception(error)
+
+    def get_functions(self, sourcefile):
+        """
+        Return a tuple of ([local functions], [global functions]) of a
+        ``sourcefile`` path.
+        """
+        local_functions = []
+        global_functions = []
+        for _sourcefile, name, is_local in parse_tags(self.get_tag_lines(sourcefile)):
+            if is_local:
+                local_functions.append(name)
+            else:
+                global_functions.append(name)
+        return local_functions, global_functions
+
+    def close(self):
+        if self.owner_pid != os.getpid():
+            return
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.stdout.close()
+        self.proc.wait()
+        self.err.close()
+        fileutils.delete(self.temp_dir)
+
+
+# The CtagsFilter of the current process
+_ctags_filter = None
+
+
+def get_ctags_filter():
+    """
+    Return a CtagsFilter shared by all the calls in the current process,
+    starting a new ctags process if needed.
+    """
+    global _ctags_filter
+    if _ctags_filter is None or not _ctags_filter.is_alive():
+        close_ctags_filter()
+        _ctags_filter = CtagsFilter(
+            cmd_loc=get_location(SCANCODE_CTAGS_EXE),
+            lib_loc=get_location(SCANCODE_CTAGS_LIB),
+        )
+    return _ctags_filter
 
-                    if (line.endswith('function\tfile:')
-                            or line.endswith('prototype\tfile:')):
-                        self.local_functions.append(splitted[0])
 
-                    elif (line.endswith('function')
-                          or line.endswith('prototype')):
-                        self.global_functions.append(splitted[0])
-        finally:
-            fileutils.delete(ctags_temp_dir)
+@atexit.register
+def close_ctags_filter():
+    global _ctags_filter
+    if _ctags_filter is not None:
+        _ctags_filter.close()
+        _ctags_filter = None
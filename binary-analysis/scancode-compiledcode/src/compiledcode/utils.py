@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-plugins for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+from collections import defaultdict
+
+
+def get_path_segments(path):
+    """
+    Return a list of the non-empty segments of a POSIX ``path``.
+    """
+    return [segment for segment in path.split('/') if segment]
+
+
+class PathSuffixIndex(object):
+    """
+    An index of values by path to find the paths ending with a path suffix
+    made of whole path segments.
+
+    Each path is indexed by file name with its parent segments in reverse
+    order that are compared on lookup: the index size is linear in the size
+    of the paths rather than quadratic in their depth.
+    """
+
+    def __init__(self):
+        # {file name: [(reversed parent segments, value)]}
+        self.entries_by_name = defaultdict(list)
+
+    def add(self, path, value):
+        segments = get_path_segments(path)
+        if segments:
+            parents = tuple(reversed(segments[:-1]))
+            self.entries_by_name[segments[-1]].append((parents, value))
+
+    def get(self, suffix):
+        """
+        Return a list of the values of the paths ending with a path ``suffix``.
+        """
+        segments = get_path_segments(suffix)
+        if not segments:
+            return []
+        parents = tuple(reversed(segments[:-1]))
+        size = len(parents)
+        return [
+            value for entry_parents, value in self.entries_by_name.get(segments[-1], ())
+            if entry_parents[:size] == parents
+        ]
+
+    def find_longest(self, path, minimum=2):
+        """
+        Return a list of the values of the paths that share the longest common
+        suffix with ``path`` of at least ``minimum`` segments. Return an empty
+        list if ``path`` has fewer than ``minimum`` segments.
+        """
+        segments = get_path_segments(path)
+        if len(segments) < minimum:
+            return []
+
+        parents = segments[-2::-1]
+        longest = minimum - 1
+        values = []
+        for entry_parents, value in self.entries_by_name.get(segments[-1], ()):
+            common = 0
+            for parent, entry_parent in zip(parents, entry_parents):
+                if parent != entry_parent:
+                    break
+                common += 1
+            if common > longest:
+                longest = common
+                values = [value]
+            elif common == longest:
+                values.append(value)
+        return values
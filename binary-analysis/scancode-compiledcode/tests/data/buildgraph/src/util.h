@@ -0,0 +1 @@
+int util(void);
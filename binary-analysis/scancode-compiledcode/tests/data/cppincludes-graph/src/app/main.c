@@ -0,0 +1,5 @@
+#include "util.h"
+#include <lib/api.h>
+#include <stdio.h>
+
+int main(void) { return 0; }
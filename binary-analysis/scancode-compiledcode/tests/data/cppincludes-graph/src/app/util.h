@@ -0,0 +1,3 @@
+#include "config.h"
+
+int util(void);
@@ -0,0 +1,3 @@
+#include <lib/types.h>
+
+int api(void);
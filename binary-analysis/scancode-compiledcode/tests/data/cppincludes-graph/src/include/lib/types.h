@@ -0,0 +1,3 @@
+#include <lib/api.h>
+
+typedef int api_t;
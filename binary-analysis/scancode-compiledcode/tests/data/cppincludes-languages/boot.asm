@@ -0,0 +1,2 @@
+%include "constants.inc"
+section .text
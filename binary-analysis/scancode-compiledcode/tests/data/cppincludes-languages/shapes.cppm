@@ -0,0 +1,9 @@
+module;
+#include <cassert>
+export module shapes;
+import <vector>;
+import "point.h";
+export import shapes.circle;
+import :detail;
+
+export int area();
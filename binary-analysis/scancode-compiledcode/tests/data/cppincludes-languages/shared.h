@@ -0,0 +1,6 @@
+#pragma once
+#include <stddef.h>
+@import Foundation;
+import <vector>;
+
+int count(void);
@@ -0,0 +1,7 @@
+#import <Foundation/Foundation.h>
+#import "view.h"
+@import UIKit;
+@import Foundation.NSString;
+
+@implementation View
+@end
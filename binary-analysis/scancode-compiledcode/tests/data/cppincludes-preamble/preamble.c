@@ -0,0 +1,12 @@
+/*
+ * A file with includes after its preamble.
+ */
+#include <stdio.h>
+// a comment
+#define LONG_MACRO(a) \
+    ((a) + 1)
+#  include "local.h"
+
+static int value = 1;
+
+#include <late.h>
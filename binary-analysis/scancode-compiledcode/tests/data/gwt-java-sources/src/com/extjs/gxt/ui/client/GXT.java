@@ -0,0 +1,4 @@
+package com.extjs.gxt.ui.client;
+
+public class GXT {
+}
@@ -0,0 +1,4 @@
+package com.google.gwt.core.client;
+
+public class JavaScriptObject {
+}
@@ -0,0 +1,12 @@
+#include <linux/module.h>
+
+int hello_func(void) { return 1; }
+EXPORT_SYMBOL(hello_func);
+
+int hello_gpl_func(void) { return 2; }
+EXPORT_SYMBOL_GPL( hello_gpl_func );
+
+int hello_ns_func(void) { return 3; }
+EXPORT_SYMBOL_NS_GPL(hello_ns_func, HELLO);
+
+MODULE_LICENSE("GPL");
@@ -0,0 +1,11 @@
+#include <linux/module.h>
+
+extern int foo_gpl_func(void);
+extern int foo_func(void);
+
+static int bar_init(void)
+{
+	return foo_gpl_func() + foo_func();
+}
+
+MODULE_LICENSE("Proprietary");
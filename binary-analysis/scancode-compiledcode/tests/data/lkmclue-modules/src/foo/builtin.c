@@ -0,0 +1,4 @@
+int builtin(void)
+{
+	return 0;
+}
@@ -0,0 +1,9 @@
+#include <linux/module.h>
+
+int foo_gpl_func(void);
+int foo_func(void);
+
+EXPORT_SYMBOL_GPL(foo_gpl_func);
+EXPORT_SYMBOL(foo_func);
+
+MODULE_LICENSE("GPL");
@@ -0,0 +1,9 @@
+int foo_gpl_func(void)
+{
+	return 1;
+}
+
+int foo_func(void)
+{
+	return foo_gpl_func();
+}
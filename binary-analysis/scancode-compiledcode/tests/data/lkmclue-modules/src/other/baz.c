@@ -0,0 +1,11 @@
+#include <linux/module.h>
+
+extern int foo_func(void);
+
+static int baz_init(void)
+{
+	return foo_func();
+}
+
+EXPORT_SYMBOL_NS_GPL(baz_ns_func, BAZ);
+MODULE_LICENSE("Dual BSD/GPL");
@@ -0,0 +1,12 @@
+#include <linux/init.h>
+#include <linux/module.h>
+
+int hello_value = 1;
+EXPORT_SYMBOL("hello_value");
+
+int hello_gpl_value = 2;
+EXPORT_SYMBOL_GPL("hello_gpl_value");
+EXPORT_SYMBOL_GPL("hello_gpl_value");
+
+MODULE_LICENSE("GPL");
+MODULE_AUTHOR("nobody");
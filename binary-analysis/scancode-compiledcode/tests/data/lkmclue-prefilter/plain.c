@@ -0,0 +1,8 @@
+#include <stdio.h>
+
+/* A plain user space program without any kernel module clue. */
+int main(void)
+{
+    printf("hello\n");
+    return 0;
+}
@@ -0,0 +1,6 @@
+extern int foo(int value);
+
+int bar(void)
+{
+    return foo(21);
+}
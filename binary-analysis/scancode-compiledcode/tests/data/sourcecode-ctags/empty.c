@@ -0,0 +1 @@
+/* nothing to see here */
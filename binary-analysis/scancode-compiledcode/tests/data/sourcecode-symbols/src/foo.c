@@ -0,0 +1,13 @@
+#include "foo.h"
+
+static int helper(int value);
+
+static int helper(int value)
+{
+    return value * 2;
+}
+
+int foo(int value)
+{
+    return helper(value);
+}
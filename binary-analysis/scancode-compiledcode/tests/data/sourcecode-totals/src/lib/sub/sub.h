@@ -0,0 +1,3 @@
+// sub
+// more
+int sub(void);
@@ -0,0 +1,4 @@
+# a tool
+import os
+
+print(os.sep)
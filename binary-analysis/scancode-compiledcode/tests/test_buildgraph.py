@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-plugins for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+import os
+from io import StringIO
+from unittest import mock
+
+from commoncode.testcase import FileBasedTesting
+from scancode.cli_test_utils import run_scan_click
+
+from compiledcode import buildgraph
+
+
+class TestBuildGraph(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def get_graph(self):
+        graph = buildgraph.BuildGraph()
+        binary = graph.add_node('bin/app', buildgraph.BINARY)
+        obj = graph.add_node('build/app.o', buildgraph.OBJECT)
+        source = graph.add_node('src/app.c', buildgraph.SOURCE)
+        header = graph.add_node('src/app.h', buildgraph.HEADER)
+        graph.add_edge(binary, obj)
+        graph.add_edge(obj, source)
+        graph.add_edge(source, header)
+        # duplicated edges are ignored
+        graph.add_edge(source, header)
+        return graph
+
+    def test_build_graph_interns_nodes_and_dedupes_edges(self):
+        graph = self.get_graph()
+        assert graph.add_node('src/app.c', buildgraph.HEADER) == 2
+        assert graph.kinds[2] == buildgraph.SOURCE
+        assert len(graph.edges_from) == 3
+
+    def test_build_graph_get_provenance(self):
+        graph = self.get_graph()
+        expected = {
+            'object': ['build/app.o'],
+            'source': ['src/app.c'],
+            'header': ['src/app.h'],
+        }
+        assert graph.get_provenance('bin/app') == expected
+        assert graph.get_provenance('src/app.c') == {'header': ['src/app.h']}
+        assert graph.get_provenance('unknown') == {}
+
+    def test_build_graph_columns_roundtrip(self):
+        graph = self.get_graph()
+        stream = StringIO()
+        graph.dump(stream)
+        stream.seek(0)
+        loaded = buildgraph.BuildGraph.load(stream)
+        assert loaded.to_columns() == graph.to_columns()
+        assert loaded.to_columns()['edges'] == dict(source=[0, 1, 2], target=[1, 2, 3])
+
+    def test_build_graph_links_bare_dwarf_source_names_to_the_binary(self):
+        codebase = mock.Mock()
+        codebase.walk.return_value = [
+            mock.Mock(
+                is_file=True,
+                path='build/src/main.d',
+                makedepend={'main.o': ['main.c']},
+                dwarf_source_path=None,
+            ),
+            mock.Mock(
+                is_file=True,
+                path='build/hello',
+                makedepend=None,
+                dwarf_source_path=['/build/src/main.c', 'main.c'],
+            ),
+        ]
+        graph = buildgraph.build_graph_from_codebase(codebase)
+        assert graph.get_provenance('build/hello') == {
+            'object': ['build/src/main.o'],
+            'source': ['build/src/main.c', 'main.c'],
+        }
+
+    def test_scan_build_graph_joins_makedepend_and_dwarf(self):
+        test_dir = self.get_test_loc('buildgraph')
+        result_file = self.get_temp_file('json')
+        graph_file = self.get_temp_file('json')
+        args = [
+            '--dwarf', '--makedepend', '--build-graph', graph_file,
+            test_dir, '--json', result_file,
+        ]
+        run_scan_click(args)
+        with open(graph_file) as inp:
+            graph = buildgraph.BuildGraph.load(inp)
+
+        assert graph.get_binaries() == ['buildgraph/src/hello']
+        expected = {
+            'object': ['buildgraph/src/main.o', 'buildgraph/src/util.o'],
+            'source': ['buildgraph/src/main.c', 'buildgraph/src/util.c'],
+            'header': ['/usr/include/stdc-predef.h', 'buildgraph/src/util.h'],
+        }
+        assert graph.get_provenance('buildgraph/src/hello') == expected
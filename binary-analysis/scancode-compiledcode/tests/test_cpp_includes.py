@@ -15,6 +15,8 @@ from scancode.cli_test_utils import run_scan_click
 
 from commoncode.testcase import FileBasedTesting
 
+from compiledcode import cppincludes
+
 
 class TestScanPluginCPPIncludesScan(FileBasedTesting):
 
@@ -27,3 +29,87 @@ class TestScanPluginCPPIncludesScan(FileBasedTesting):
         run_scan_click(args)
         test_loc = self.get_test_loc('cppincludes/expected.json')
         check_json_scan(test_loc, result_file, regen=False)
+
+    def test_cpp_includes_preamble_only(self):
+        test_file = self.get_test_loc('cppincludes-preamble/preamble.c')
+        result = cppincludes.cpp_includes(test_file, preamble_only=True)
+        assert result == dict(cpp_includes=['<stdio.h', '"local.h'])
+
+        result = cppincludes.cpp_includes(test_file)
+        assert result == dict(cpp_includes=['<stdio.h', '"local.h', '<late.h'])
+
+    def test_find_includes(self):
+        data = b'int a; # include <a.h>\n#import "b/c.h"\n#includes <d.h>\n#define X #'
+        assert list(cppincludes.find_includes(data)) == ['<a.h', '"b/c.h']
+
+    def test_cpp_includes_re_matches_text_lines(self):
+        line = '  # include <a.h>\n#import "b/c.h"\n#includes <d.h>'
+        assert cppincludes.cpp_includes_re().findall(line) == ['<a.h', '"b/c.h']
+
+    def test_get_preamble_end(self):
+        data = b'\n/* c */\n#if X \\\n  && Y\n#endif\n// c\r\nint main;\n'
+        assert data[cppincludes.get_preamble_end(data):] == b'int main;\n'
+        assert cppincludes.get_preamble_end(b'#include <a.h>') == 14
+        assert cppincludes.get_preamble_end(b'/* unterminated') == 15
+
+    def test_get_transitive_includes_with_cycles(self):
+        edges = {
+            'a.c': ['b.h', 'c.h'],
+            'b.h': ['c.h'],
+            'c.h': ['d.h'],
+            'd.h': ['c.h', 'e.h'],
+        }
+        expected = {
+            'a.c': {'b.h', 'c.h', 'd.h', 'e.h'},
+            'b.h': {'c.h', 'd.h', 'e.h'},
+            'c.h': {'d.h', 'e.h'},
+            'd.h': {'c.h', 'e.h'},
+            'e.h': set(),
+        }
+        assert cppincludes.get_transitive_includes(edges) == expected
+
+    def test_resolve_include(self):
+        files = set(['src/a/main.c', 'src/a/util.h', 'src/b/util.h', 'inc/sys/util.h'])
+        index = cppincludes.build_suffix_index(files)
+        resolve = cppincludes.resolve_include
+        assert resolve('"util.h', 'src/a/main.c', files, index) == 'src/a/util.h'
+        assert resolve('<util.h', 'src/b/x.c', files, index) == 'src/b/util.h'
+        assert resolve('<util.h', 'src/a/main.c', files, index, ['inc/sys']) == 'inc/sys/util.h'
+        assert resolve('<sys/util.h', 'src/a/main.c', files, index) == 'inc/sys/util.h'
+        assert resolve('<stdio.h', 'src/a/main.c', files, index) is None
+
+    def test_cpp_includes_graph(self):
+        test_dir = self.get_test_loc('cppincludes-graph/src')
+        result_file = self.get_temp_file('json')
+        args = [
+            '--cpp-includes', '--cpp-includes-graph',
+            '--cpp-include-root', 'src/include',
+            test_dir, '--json', result_file,
+        ]
+        run_scan_click(args)
+        test_loc = self.get_test_loc('cppincludes-graph/expected.json')
+        check_json_scan(test_loc, result_file, regen=False)
+
+    def test_find_includes_cpp_modules(self):
+        data = b'module;\n#include <a.h>\nexport module m;\n  import <vector>;\nimport std.core;\nint import_count;\n'
+        expected = ['<a.h', '<vector', 'std.core']
+        assert list(cppincludes.find_includes(data, language='cpp')) == expected
+
+    def test_get_preamble_end_with_cpp_modules(self):
+        data = b'module;\n#include <a.h>\nexport module m;\nimport <vector>;\nint a;\n'
+        end = cppincludes.get_preamble_end(data, language='cpp')
+        assert data[end:] == b'int a;\n'
+
+    def test_get_preamble_end_on_a_header_of_any_language(self):
+        assert cppincludes.get_language('foo/bar.H') == 'any'
+        data = b'#include <a.h>\n@import Foundation;\nimport <vector>;\nint a;\n'
+        end = cppincludes.get_preamble_end(data, language='any')
+        assert data[end:] == b'int a;\n'
+
+    def test_cpp_includes_languages(self):
+        test_dir = self.get_test_loc('cppincludes-languages')
+        result_file = self.get_temp_file('json')
+        args = ['--cpp-includes', test_dir, '--json', result_file]
+        run_scan_click(args)
+        test_loc = self.get_test_loc('cppincludes-languages.expected.json')
+        check_json_scan(test_loc, result_file, regen=False)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-plugins for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+from scancode.cli_test_utils import check_json_scan
+from scancode.cli_test_utils import run_scan_click
+
+from commoncode.testcase import FileBasedTesting
+
+from compiledcode import dwarf
+
+
+class TestScanPluginDwarf(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_dwarf_processes_requires_a_single_process_scan(self):
+        test_file = self.get_test_loc('dwarf-debuglink/input/usr/bin/hello')
+        result_file = self.get_temp_file('json')
+        args = ['--dwarf', '--dwarf-processes', '2', test_file, '--json', result_file]
+        result = run_scan_click(args, expected_rc=2, retry=False, processes='2')
+        assert '"--dwarf-processes" option can only be used' in result.output
+
+    def test_dwarf_processes_with_a_single_process_scan(self):
+        test_file = self.get_test_loc('dwarf-debuglink/input/usr/bin/hello')
+        result_file = self.get_temp_file('json')
+        args = ['--dwarf', '--dwarf-processes', '2', test_file, '--json', result_file]
+        run_scan_click(args, processes='0')
+
+
+class TestScanPluginDwarfDebugLinks(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_dwarf_debug_links(self):
+        test_dir = self.get_test_loc('dwarf-debuglink/input')
+        result_file = self.get_temp_file('json')
+        args = ['--dwarf', '--dwarf-debug-links', test_dir, '--json', result_file]
+        run_scan_click(args)
+        test_loc = self.get_test_loc('dwarf-debuglink/expected.json')
+        check_json_scan(test_loc, result_file, regen=False)
+
+    def test_resolve_debug_links_only_opens_files_that_may_be_elfs(self):
+        test_dir = self.get_test_loc('dwarf-debuglink/input/usr/bin')
+        elf = os.path.join(test_dir, 'hello')
+        resources = [
+            SimpleNamespace(is_file=True, location=None, dwarf_source_path=[]),
+            SimpleNamespace(is_file=True, location=elf, dwarf_source_path=[], is_binary=False),
+            SimpleNamespace(
+                is_file=True, location=elf, dwarf_source_path=[], mime_type='text/plain'),
+            SimpleNamespace(
+                is_file=True,
+                location=elf,
+                dwarf_source_path=[],
+                is_binary=True,
+                mime_type='application/x-pie-executable',
+            ),
+        ]
+        codebase = mock.Mock(walk=mock.Mock(return_value=resources))
+        with mock.patch.object(dwarf, 'is_elf', wraps=dwarf.is_elf) as is_elf:
+            with mock.patch.object(dwarf, 'find_debug_file', return_value=None) as find:
+                dwarf.resolve_debug_links(codebase)
+        is_elf.assert_called_once_with(elf)
+        find.assert_called_once()
+        assert find.call_args.kwargs['resource'] is resources[-1]
+
+    def test_is_elf_on_a_missing_file(self):
+        assert not dwarf.is_elf(os.path.join(self.get_temp_dir(), 'missing'))
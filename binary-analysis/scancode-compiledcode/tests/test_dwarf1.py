@@ -15,7 +15,9 @@ from commoncode.testcase import FileBasedTesting
 from scancode.cli_test_utils import check_json_scan
 from scancode.cli_test_utils import run_scan_click
 
+from compiledcode.dwarf.dwarf import cleanup
 from compiledcode.dwarf.dwarf import Dwarf
+from compiledcode.dwarf.dwarf import parse_dwarfdump_info
 
 
 class TestDwarf(FileBasedTesting):
@@ -45,17 +47,42 @@ class TestDwarf(FileBasedTesting):
         except Exception as e:
             assert expected_msg in str(e)
 
+    def test_parse_dwarfdump_info(self):
+        test_loc = self.get_test_loc('dwarf/dwarfdump-info.txt')
+        with open(test_loc) as lines:
+            result = list(parse_dwarfdump_info(lines))
+        # the second compilation unit follows local symbols and is parsed in
+        # the same unit: its name and compilation dir replace the first ones
+        expected = [
+            '/home/jqbx34/ssdeep-2.0/main.c',
+            '/usr/include/bits/types.h',
+            '/usr/include/stdio.h',
+            '/home/jqbx34/ssdeep-2.0/main.h',
+        ]
+        assert result == expected
+
+    def test_cleanup_dedupes_and_splits_standard_includes(self):
+        paths = [
+            '/home/jqbx34/ssdeep-2.0/main.c',
+            '/usr/include/stdio.h',
+            '/home/jqbx34/ssdeep-2.0/./main.c',
+            '/usr/include/stdio.h',
+        ]
+        original, std_includes = cleanup(paths)
+        assert original == ['/home/jqbx34/ssdeep-2.0/main.c']
+        assert std_includes == ['/usr/include/stdio.h']
+
     def check_dwarf(self, test_file, expected_file, regen=False):
         dwarf = Dwarf(self.get_test_loc(test_file))
         result = dwarf.asdict()
 
         expected_file = self.get_test_loc(expected_file)
         if regen:
-            with open(expected_file, 'wb') as exc:
-                json.dump(result, exc, indent=2, encoding='utf-8')
+            with open(expected_file, 'w') as exc:
+                json.dump(result, exc, indent=2)
 
-        with open(expected_file, 'rb') as exc:
-            expected = json.load(exc, encoding='utf-8', object_pairs_hook=dict)
+        with open(expected_file) as exc:
+            expected = json.load(exc)
 
         assert sorted(expected['original_source_files']) == sorted(
             result['original_source_files'])
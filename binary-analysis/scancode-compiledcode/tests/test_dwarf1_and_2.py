@@ -14,7 +14,6 @@ from unittest.case import skipIf
 
 from commoncode.testcase import FileBasedTesting
 from commoncode.system import on_mac
-from commoncode.system import on_windows
 
 from compiledcode import dwarf
 
@@ -24,6 +23,13 @@ class TestDwarf3(FileBasedTesting):
     test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
 
     def check_dwarf3(self, test_file, expected_file, regen=False):
+        """
+        Check the paths of ``test_file`` against the "paths" of the
+        ``expected_file``. Its "dropped_legacy_paths" are the paths that were
+        collected with dwarfdump and nm and that are no longer reported: their
+        error messages reported as paths and the bare file names for which
+        the DWARF has a full path.
+        """
         try:
             test_loc = self.get_test_loc(test_file)
         except:
@@ -32,22 +38,20 @@ class TestDwarf3(FileBasedTesting):
             pass
         result = list(dwarf.dwarf_source_path(test_loc))
         expected_loc = self.get_test_loc(expected_file)
-        if regen:
-            with open(expected_loc, 'wb') as exc:
-                json.dump(result, exc, indent=2, encoding='utf-8')
+        with open(expected_loc) as exc:
+            expected = json.load(exc)
 
-        with open(expected_loc, 'rb') as exc:
-            expected = json.load(exc, encoding='utf-8', object_pairs_hook=dict)
+        if regen:
+            expected['paths'] = result
+            with open(expected_loc, 'w') as exc:
+                json.dump(expected, exc, indent=2)
 
-        assert sorted(expected) == sorted(result)
+        assert sorted(expected['paths']) == sorted(result)
+        assert set(expected['dropped_legacy_paths']).isdisjoint(result)
 
     def test_dwarf3_corrupted_malformed_stringtable(self):
-        test_file = 'elf-corrupted/malformed_stringtable'
-        expected_file = 'elf-corrupted/malformed_stringtable.dwarf3.expected.json'
-        if on_windows:
-            # nm gets less on Windows from this elf
-            expected_file = 'elf-corrupted/malformed_stringtable.win.dwarf3.expected.json'
-        self.check_dwarf3(test_file, expected_file)
+        self.check_dwarf3('elf-corrupted/malformed_stringtable',
+                          'elf-corrupted/malformed_stringtable.dwarf3.expected.json')
 
     def test_dwarf3_with_error_misc_elfs_cpp_test_o(self):
         self.check_dwarf3('misc_elfs/cpp-test.o',
@@ -10,9 +10,12 @@
 
 import json
 import os
+from unittest import mock
 from unittest.case import expectedFailure
 
 from commoncode.testcase import FileBasedTesting
+from elftools.elf.elffile import ELFFile
+from typecode import contenttype
 
 from compiledcode.dwarf import dwarfng
 
@@ -72,10 +75,10 @@ class TestDwarfNg(FileBasedTesting):
         except Exception as e:
             assert emsg1 in str(e)
 
-    def check_dwarfng(self, test_file, expected_file, regen=False):
+    def check_dwarfng(self, test_file, expected_file, processes=1, regen=False):
         test_loc = self.get_test_loc(test_file)
         result = [list(r)
-                  for r in dwarfng.get_dwarf_cu_and_die_paths(test_loc)]
+                  for r in dwarfng.get_dwarf_cu_and_die_paths(test_loc, processes=processes)]
 
         expected_loc = self.get_test_loc(expected_file, must_exist=False)
 
@@ -88,6 +91,83 @@ class TestDwarfNg(FileBasedTesting):
 
         assert result == expected
 
+    def test_dwarfng_libgnutls_so_26_22_4_with_processes(self):
+        with mock.patch.object(dwarfng, 'MIN_PARALLEL_DEBUG_INFO_SIZE', 0):
+            self.check_dwarfng('dwarf2/libgnutls.so.26.22.4',
+                               'dwarf2/libgnutls.so.26.22.4.dwarfng.expected.json',
+                               processes=3)
+
+    def test_dwarfng_ssdeep_i686_with_processes(self):
+        with mock.patch.object(dwarfng, 'MIN_PARALLEL_DEBUG_INFO_SIZE', 0):
+            self.check_dwarfng('dwarf/ssdeep.i686',
+                               'dwarf/ssdeep.i686.dwarfng.expected.json',
+                               processes=2)
+
+    def test_dwarfng_with_processes_on_a_small_debug_info_is_sequential(self):
+        test_loc = self.get_test_loc('dwarf/ssdeep.i686')
+        size = dwarfng.get_debug_info_size(test_loc)
+        assert 0 < size < dwarfng.MIN_PARALLEL_DEBUG_INFO_SIZE
+        with mock.patch.object(dwarfng, 'get_cu_paths_in_parallel') as in_parallel:
+            self.check_dwarfng('dwarf/ssdeep.i686',
+                               'dwarf/ssdeep.i686.dwarfng.expected.json',
+                               processes=2)
+        assert not in_parallel.called
+
+    def test_dwarfng_get_cu_offsets(self):
+        test_loc = self.get_test_loc('dwarf/ssdeep.i686')
+        offsets = dwarfng.get_cu_offsets(test_loc)
+        assert len(offsets) > 1
+        assert offsets == sorted(offsets)
+
+    def test_dwarfng_with_shf_compressed_sections(self):
+        self.check_dwarfng('dwarf/hello-compressed.debug',
+                           'dwarf/hello-compressed.debug.dwarfng.expected.json')
+
+    def test_dwarfng_with_zdebug_sections(self):
+        self.check_dwarfng('dwarf/greeter-zdebug.debug',
+                           'dwarf/greeter-zdebug.debug.dwarfng.expected.json')
+
+    def test_dwarfng_with_zdebug_sections_and_relocations(self):
+        self.check_dwarfng('dwarf/greet-zdebug.o',
+                           'dwarf/greet-zdebug.o.dwarfng.expected.json')
+
+    def test_dwarfng_with_small_chunks_and_spooled_sections(self):
+        with mock.patch.object(dwarfng, 'CHUNK_SIZE', 7), \
+                mock.patch.object(dwarfng, 'MAX_IN_MEMORY_SECTION_SIZE', 100):
+            self.check_dwarfng('dwarf/hello-compressed.debug',
+                               'dwarf/hello-compressed.debug.dwarfng.expected.json')
+
+    def test_dwarfng_without_dwarf_section_hooks(self):
+        # the fallback used when has_dwarf_section_hooks() is False
+        hooks = {
+            name: dwarfng.DwarfELFFile.__dict__[name]
+            for name in dwarfng.DWARF_SECTION_HOOKS
+        }
+        expected_sources = dwarfng.get_dwarf_sources(self.get_test_loc('dwarf/ssdeep.i686'))
+        try:
+            for name in hooks:
+                delattr(dwarfng.DwarfELFFile, name)
+            self.check_dwarfng('dwarf/ssdeep.i686',
+                               'dwarf/ssdeep.i686.dwarfng.expected.json')
+            test_loc = self.get_test_loc('dwarf/ssdeep.i686')
+            assert dwarfng.get_dwarf_sources(test_loc) == expected_sources
+        finally:
+            for name, hook in hooks.items():
+                setattr(dwarfng.DwarfELFFile, name, hook)
+
+    def test_dwarfng_get_debug_links(self):
+        test_loc = self.get_test_loc('dwarf-debuglink/input/usr/bin/greeter')
+        assert dwarfng.get_debug_links(test_loc) == ('greeter.debug', 1140962656, None)
+
+    def test_dwarfng_get_debug_links_with_build_id(self):
+        test_loc = self.get_test_loc('dwarf-debuglink/input/usr/bin/hello')
+        expected = (
+            'dc88622273f7c226534a57a8afc2a78fee7f7c.debug',
+            1111397077,
+            '14dc88622273f7c226534a57a8afc2a78fee7f7c',
+        )
+        assert dwarfng.get_debug_links(test_loc) == expected
+
     def test_dwarfng_corrupted_malformed_stringtable(self):
         test_file = 'elf-corrupted/malformed_stringtable'
         expected_file = 'elf-corrupted/malformed_stringtable.dwarfng.expected.json'
@@ -209,3 +289,78 @@ class TestDwarfNg(FileBasedTesting):
     def test_dwarfng_amd64_exec(self):
         self.check_dwarfng('dwarf/amd64_exec',
                            'dwarf/amd64_exec.dwarfng.expected.json')
+
+    def check_dwarf_sources_against_legacy(self, test_file):
+        """
+        Check that the single pass extraction finds all the paths and symbol
+        entries that the legacy dwarfdump and nm based extractions found.
+        """
+        test_loc = self.get_test_loc(test_file)
+        paths, entries = dwarfng.get_dwarf_sources(test_loc)
+
+        dwarf1_loc = self.get_test_loc(test_file + '.dwarf.expected.json', must_exist=False)
+        if os.path.exists(dwarf1_loc):
+            with open(dwarf1_loc) as exc:
+                dwarf1 = json.load(exc)
+            legacy_paths = dwarf1['original_source_files'] + dwarf1['included_source_files']
+            assert (test_file, set(legacy_paths).difference(paths)) == (test_file, set())
+
+        with open(self.get_test_loc(test_file + '.dwarf2.expected.json')) as exc:
+            dwarf2 = json.load(exc)
+        # symbol type letters are not compared: the legacy nm used section
+        # names to pick a letter where modern nm uses the section flags
+        legacy_entries = set(tuple(e[1:]) for e in dwarf2)
+        missing = legacy_entries.difference(tuple(e[1:]) for e in entries)
+        assert (test_file, missing) == (test_file, set())
+
+    def test_dwarf_sources_against_legacy_on_all_elfs(self):
+        test_dir = self.test_data_dir
+        suffix = '.dwarf2.expected.json'
+        checked = 0
+        for root, _dirs, files in os.walk(test_dir):
+            for name in sorted(files):
+                if not name.endswith(suffix):
+                    continue
+                test_loc = os.path.join(root, name[:-len(suffix)])
+                if not os.path.exists(test_loc) or not contenttype.get_type(test_loc).is_elf:
+                    continue
+                test_file = os.path.relpath(test_loc, test_dir)
+                self.check_dwarf_sources_against_legacy(test_file)
+                checked += 1
+        assert checked > 20
+
+    def test_dwarf_sources_on_stripped_file(self):
+        test_loc = self.get_test_loc('dwarf/file_stripped')
+        assert dwarfng.get_dwarf_sources(test_loc) == ([], [])
+
+    def test_has_dwarf_section_hooks_with_the_supported_pyelftools(self):
+        assert dwarfng.has_dwarf_section_hooks()
+        assert '_read_dwarf_section' in vars(dwarfng.DwarfELFFile)
+
+    def check_dwarf_sections_same_as_pyelftools(self, test_file):
+        test_loc = self.get_test_loc(test_file)
+        with open(test_loc, 'rb') as inp:
+            expected = get_dwarf_sections_data(ELFFile(inp).get_dwarf_info())
+        with open(test_loc, 'rb') as inp:
+            result = get_dwarf_sections_data(dwarfng.DwarfELFFile(inp).get_dwarf_info())
+        assert result == expected
+        assert expected
+
+    def test_dwarf_section_hooks_read_shf_compressed_sections_as_pyelftools(self):
+        self.check_dwarf_sections_same_as_pyelftools('dwarf/hello-compressed.debug')
+
+    def test_dwarf_section_hooks_read_plain_sections_as_pyelftools(self):
+        self.check_dwarf_sections_same_as_pyelftools('dwarf/ssdeep.x86_64')
+
+
+def get_dwarf_sections_data(dwarfinfo):
+    """
+    Return a mapping of {section attribute name: section data} for the DWARF
+    sections of a pyelftools ``dwarfinfo``.
+    """
+    sections = {}
+    for name, section in vars(dwarfinfo).items():
+        if name.startswith('debug_') and hasattr(section, 'stream'):
+            section.stream.seek(0)
+            sections[name] = section.stream.read(section.size)
+    return sections
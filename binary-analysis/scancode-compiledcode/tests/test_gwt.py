@@ -15,6 +15,9 @@ from scancode.cli_test_utils import run_scan_click
 
 from commoncode.testcase import FileBasedTesting
 
+from compiledcode import gwt
+from compiledcode.utils import PathSuffixIndex
+
 
 class TestScanPluginGWTScan(FileBasedTesting):
 
@@ -27,3 +30,57 @@ class TestScanPluginGWTScan(FileBasedTesting):
         run_scan_click(args)
         test_loc = self.get_test_loc('gwt/expected.json')
         check_json_scan(test_loc, result_file, regen=False)
+
+    def test_gwt_scan_aggregate(self):
+        test_loc = self.get_test_loc('gwt/gwt.symbolMap')
+        result = gwt.gwt_scan(test_loc, aggregate=True)
+        expected = dict(gwt=[
+            dict(
+                clean_path='/Views/zoro/lib/lib/gxt/gxt-2.2.6-gwt22.jar!/com/extjs/gxt/ui/client/GXT.java',
+                classes=['com.extjs.gxt.ui.client.GXT'],
+                start_line=33,
+                end_line=187,
+                symbols_count=7,
+            )
+        ])
+        assert result == expected
+
+    def test_gwt_scan_compact_symbol_map(self):
+        test_loc = self.get_test_loc('gwt-compact/compact.symbolMap')
+        result = gwt.gwt_scan(test_loc)['gwt']
+        assert len(result) == 5
+        expected = dict(
+            jsName='qc',
+            jsniIdent='',
+            className='com.extjs.gxt.ui.client.GXT',
+            memberName='$clinit',
+            clean_path='com/extjs/gxt/ui/client/GXT.java',
+            sourceLine='',
+        )
+        assert result[1] == expected
+        assert result[3]['className'] == 'com.google.gwt.core.client.JavaScriptObject'
+        assert result[4]['className'] == 'java.lang.Object'
+
+    def test_iter_symbols_interns_class_names_and_paths(self):
+        test_loc = self.get_test_loc('gwt/gwt.symbolMap')
+        symbols = list(gwt.iter_symbols(test_loc))
+        assert all(s.className is symbols[0].className for s in symbols)
+        assert all(s.sourceUri is symbols[0].sourceUri for s in symbols)
+
+    def test_gwt_java_sources(self):
+        test_dir = self.get_test_loc('gwt-java-sources')
+        result_file = self.get_temp_file('json')
+        args = ['--gwt', '--gwt-java-sources', test_dir, '--json', result_file]
+        run_scan_click(args)
+        test_loc = self.get_test_loc('gwt-java-sources.expected.json')
+        check_json_scan(test_loc, result_file, regen=False)
+
+    def test_find_java_resources_uses_the_longest_suffix(self):
+        index = PathSuffixIndex()
+        index.add('app/src/com/foo/Bar.java', 'app')
+        index.add('lib/src/org/foo/Bar.java', 'lib')
+        index.add('other/Bar.java', 'other')
+        assert gwt.find_java_resources('some.jar!/com/foo/Bar.java', index) == ['app']
+        assert gwt.find_java_resources('foo/Bar.java', index) == ['app', 'lib']
+        assert gwt.find_java_resources('net/Bar.java', index) == []
+        assert gwt.find_java_resources('Bar.java', index) == []
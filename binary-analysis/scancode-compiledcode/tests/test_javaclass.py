@@ -8,16 +8,57 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+import json
 import os
-from unittest.case import expectedFailure
+from io import StringIO
 
 from scancode.cli_test_utils import check_json_scan
 from scancode.cli_test_utils import run_scan_click
 
 from commoncode.testcase import FileBasedTesting
 
+from compiledcode.javaclass import index
+from compiledcode.javaclass import javaclass
+
+
+class TestJavaClass(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def get_class(self):
+        with open(self.get_test_loc('javaclass/ControlPanel.class'), 'rb') as f:
+            return javaclass.Class(f.read())
+
+    def test_class_parses_from_bytes(self):
+        c = self.get_class()
+        assert c.name == 'org/apache/log4j/chainsaw/ControlPanel'
+        assert c.superClass == 'javax/swing/JPanel'
+        assert c.version == (3, 45)
+        assert len(c.constants) == 266
+
+    def test_class_does_not_copy_method_code_in_attrs(self):
+        c = self.get_class()
+        for method in c.methods:
+            assert 'Code' not in method.attrs
+            assert method.code
+            code = c.getCode(method)
+            assert len(code) == method.code[1]
+
+    def test_class_decodes_constants_lazily(self):
+        c = self.get_class()
+        assert c.constants.decoded_count < len(c.constants) / 2
+        constants = list(c.constants)
+        assert constants[0] == [javaclass.CONSTANT_Utf8, 'reserved']
+        assert c.constants.decoded_count == len(c.constants)
+
+    def test_class_fails_on_bad_magic(self):
+        try:
+            javaclass.Class(b'\x00' * 16)
+            self.fail('Exception not raised')
+        except Exception as e:
+            assert 'bad magic' in str(e)
+
 
-@expectedFailure
 class TestScanPluginJavaClassScan(FileBasedTesting):
 
     test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
@@ -29,3 +70,124 @@ class TestScanPluginJavaClassScan(FileBasedTesting):
         run_scan_click(args)
         test_loc = self.get_test_loc('javaclass/expected.json')
         check_json_scan(test_loc, result_file, regen=False)
+
+    def test_javaclass_scan_archives(self):
+        test_dir = self.get_test_loc('javaclass-archives')
+        result_file = self.get_temp_file('json')
+        args = ['--javaclass', '--javaclass-archives', test_dir, '--json', result_file]
+        run_scan_click(args)
+        test_loc = self.get_test_loc('javaclass-archives/expected.json')
+        check_json_scan(test_loc, result_file, regen=False)
+
+    def test_javaclass_scan_compact(self):
+        test_file = self.get_test_loc('javaclass/ControlPanel.class')
+        result_file = self.get_temp_file('json')
+        args = ['--javaclass', '--javaclass-compact', test_file, '--json', result_file]
+        run_scan_click(args)
+        test_loc = self.get_test_loc('javaclass-compact/expected.json')
+        check_json_scan(test_loc, result_file, regen=False)
+
+
+class TestJavaClassIndex(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def get_index(self):
+        idx = index.JavaClassIndex()
+        idx.add('a.jar!/org/x/Foo.class', 'org/x/Foo', 'java/lang/Object', ['java/lang/Runnable'])
+        idx.add('b.jar!/org/x/Foo.class', 'org/x/Foo', 'java/lang/Object', ['java/lang/Runnable'])
+        idx.add('b.jar!/org/x/Bar.class', 'org/x/Bar', 'org/x/Foo')
+        return idx
+
+    def test_index_providers_and_duplicates(self):
+        idx = self.get_index()
+        expected = ['a.jar!/org/x/Foo.class', 'b.jar!/org/x/Foo.class']
+        assert idx.get_providers('org.x.Foo') == expected
+        assert idx.get_providers('org.x.Baz') == []
+        assert idx.get_duplicates() == {'org.x.Foo': expected}
+
+    def test_index_packages_and_edges(self):
+        idx = self.get_index()
+        assert idx.to_dict()['packages'] == {'org.x': ['org.x.Bar', 'org.x.Foo']}
+        assert idx.get_subclasses('org.x.Foo') == ['org.x.Bar']
+        assert idx.get_subclasses('java.lang.Runnable') == ['org.x.Foo']
+
+    def test_index_dump_and_load(self):
+        idx = self.get_index()
+        stream = StringIO()
+        idx.dump(stream)
+        stream.seek(0)
+        loaded = index.JavaClassIndex.load(stream)
+        assert loaded.to_dict() == idx.to_dict()
+
+    def test_index_add_javaclass_uses_and_removes_the_interface_names(self):
+        idx = index.JavaClassIndex()
+        javaclass = {
+            'Classes': [{
+                'Path': 'org/x/Foo.class',
+                'Class': 'org/x/Foo',
+                'Super Class': 'java/lang/Object',
+                'Interfaces': ['Runnable'],
+                index.INTERFACE_NAMES_KEY: ['java/lang/Runnable'],
+            }],
+        }
+        assert idx.add_javaclass('a.jar', javaclass)
+        assert idx.interfaces == {'org.x.Foo': ['java.lang.Runnable']}
+        assert index.INTERFACE_NAMES_KEY not in javaclass['Classes'][0]
+        assert not idx.add_javaclass('a.jar', javaclass)
+
+    def test_javaclass_index_scan(self):
+        test_dir = self.get_test_loc('javaclass-archives')
+        result_file = self.get_temp_file('json')
+        index_file = self.get_temp_file('json')
+        args = [
+            '--javaclass', '--javaclass-archives', '--javaclass-index', index_file,
+            test_dir, '--json', result_file,
+        ]
+        run_scan_click(args)
+        with open(index_file) as inp:
+            idx = index.JavaClassIndex.load(inp)
+        expected = [
+            'javaclass-archives/chainsaw.jar!/org/apache/log4j/chainsaw/ControlPanel.class',
+            'javaclass-archives/chainsaw.war!/WEB-INF/classes/org/apache/log4j/chainsaw/ControlPanel.class',
+            'javaclass-archives/chainsaw.war!/WEB-INF/lib/chainsaw.jar!/org/apache/log4j/chainsaw/ControlPanel.class',
+        ]
+        assert idx.get_providers('org.apache.log4j.chainsaw.ControlPanel') == expected
+        assert idx.superclasses == {'org.apache.log4j.chainsaw.ControlPanel': 'javax.swing.JPanel'}
+
+        # the interface names collected for the index are not reported
+        with open(result_file) as inp:
+            scanned = json.load(inp)
+        for resource in scanned['files']:
+            for class_data in resource['javaclass'].get('Classes', []):
+                assert index.INTERFACE_NAMES_KEY not in class_data
+
+
+class TestJavaClassDescriptors(FileBasedTesting):
+
+    def test_parseMethodDescriptor(self):
+        result = javaclass.parseMethodDescriptor('(I[[Ljava/lang/String;[JLfoo/Bar;)V')
+        expected = (('I', '[[Ljava/lang/String;', '[J', 'Lfoo/Bar;'), 'V')
+        assert result == expected
+
+    def test_parseArgs_consumes_list(self):
+        desc = list('(IJ)Ljava/lang/String;')
+        assert javaclass._parseArgs(desc) == ['I', 'J']
+        assert ''.join(desc) == 'Ljava/lang/String;'
+
+    def test_parseArgs_with_count(self):
+        assert javaclass._parseArgs('[[IJ', 1) == ['[[I']
+
+    def test_fmtType(self):
+        assert javaclass._fmtType('[[Ljava/lang/String;') == 'String[][]'
+        assert javaclass._fmtType('[I') == 'int[]'
+        assert javaclass._fmtType('Lorg/x/Y;', 'org.x') == 'Y'
+        assert javaclass._fmtType('Lorg/x/Y;') == 'org.x.Y'
+
+    def test_MethodDesc_is_memoized(self):
+        javaclass.parseMethodDescriptor.cache_clear()
+        javaclass.MethodDesc('(Ljava/lang/String;)V')
+        desc = javaclass.MethodDesc('(Ljava/lang/String;)V')
+        assert desc.args == ['Ljava/lang/String;']
+        assert desc.returnType == 'V'
+        assert javaclass.parseMethodDescriptor.cache_info().hits == 1
@@ -8,13 +8,19 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+import json
 import os
+from types import SimpleNamespace
+from unittest import mock
 
 from scancode.cli_test_utils import check_json_scan
 from scancode.cli_test_utils import run_scan_click
 
 from commoncode.testcase import FileBasedTesting
 
+from compiledcode.lkmclue import modules
+from compiledcode.sourcecode import kernel
+
 
 class TestScanPluginKLMClueScan(FileBasedTesting):
 
@@ -27,3 +33,128 @@ class TestScanPluginKLMClueScan(FileBasedTesting):
         run_scan_click(args)
         test_loc = self.get_test_loc('lkmclue/expected.json')
         check_json_scan(test_loc, result_file, regen=False)
+
+
+class TestFindLkms(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_find_lkms_rejects_file_without_literals(self):
+        test_file = self.get_test_loc('lkmclue-prefilter/plain.c')
+        assert not kernel.has_lkm_literals(test_file)
+        assert [] == list(kernel.find_lkms(test_file))
+
+    def test_find_lkms_on_empty_file(self):
+        test_file = self.get_test_loc('lkmclue-prefilter/empty.c')
+        assert not kernel.has_lkm_literals(test_file)
+        assert [] == list(kernel.find_lkms(test_file))
+
+    def test_find_lkms_returns_unique_clues(self):
+        test_file = self.get_test_loc('lkmclue-prefilter/module.c')
+        assert kernel.has_lkm_literals(test_file)
+        expected = [
+            ('lkm-header-include', 'include <linux/module.h>'),
+            ('lkm-symbol', 'hello_value'),
+            ('lkm-symbol', 'hello_gpl_value'),
+            ('lkm-symbol-gpl', 'hello_gpl_value'),
+            ('lkm-license', 'GPL'),
+        ]
+        assert expected == list(kernel.find_lkms(test_file))
+
+
+class TestKernelModules(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_parse_kbuild(self):
+        lines = [
+            'obj-m += foo.o\n',
+            'foo-objs := foo_main.o \\\n',
+            '\tfoo_util.o\n',
+            'obj-$(CONFIG_BAR) += bar.o # a comment\n',
+            'obj-y += builtin.o\n',
+            'ccflags-y := -DDEBUG\n',
+        ]
+        expected = {
+            'foo': (['foo_main.o', 'foo_util.o'], None),
+            'bar': (['bar.o'], 'CONFIG_BAR'),
+        }
+        assert modules.parse_kbuild(lines) == expected
+
+    def test_find_lkms_with_unquoted_and_namespaced_exports(self):
+        test_file = self.get_test_loc('lkmclue-exports/module.c')
+        expected = [
+            ('lkm-header-include', 'include <linux/module.h>'),
+            ('lkm-symbol', 'hello_func'),
+            ('lkm-symbol', 'hello_gpl_func'),
+            ('lkm-symbol-gpl', 'hello_gpl_func'),
+            ('lkm-symbol', 'hello_ns_func'),
+            ('lkm-symbol-gpl', 'hello_ns_func'),
+            ('lkm-license', 'GPL'),
+        ]
+        assert expected == list(kernel.find_lkms(test_file))
+
+    def test_kernel_module_gpl_compatible(self):
+        module = modules.KernelModule(path='foo.ko', name='foo')
+        assert module.gpl_compatible is None
+        module.licenses = ['Dual BSD/GPL']
+        assert module.gpl_compatible
+        module.licenses = ['GPL', 'Proprietary']
+        assert not module.gpl_compatible
+
+    def test_scancode_with_lkm_modules(self):
+        test_dir = self.get_test_loc('lkmclue-modules/src')
+        result_file = self.get_temp_file('json')
+        modules_file = self.get_temp_file('json')
+        args = ['--lkmclue', test_dir, '--lkm-modules', modules_file, '--json', result_file]
+        run_scan_click(args)
+
+        with open(modules_file) as inp:
+            result = json.load(inp)
+        expected_loc = self.get_test_loc('lkmclue-modules/expected.json')
+        with open(expected_loc) as inp:
+            expected = json.load(inp)
+        assert result == expected
+
+        # the identifiers collected during the scan are not reported
+        with open(result_file) as inp:
+            scanned = json.load(inp)
+        for resource in scanned['files']:
+            assert modules.IDENTIFIERS_KEY not in resource.get('lkm_clue', {})
+
+    def test_get_identifiers_returns_only_called_functions(self):
+        test_file = self.get_temp_file('c')
+        with open(test_file, 'w') as out:
+            out.write(
+                '/* foo_gpl_func() in a comment */\n'
+                'static int bar_init(void)\n'
+                '{\n'
+                '\tif (sizeof(int)) // foo_gpl_other()\n'
+                '\t\tpr_info("foo_gpl_string()\\n");\n'
+                '\treturn foo_gpl_func () + foo_value;\n'
+                '}\n'
+            )
+        expected = ['bar_init', 'foo_gpl_func', 'pr_info']
+        assert modules.get_identifiers(test_file) == expected
+
+    def test_build_kernel_modules_uses_the_scanned_identifiers(self):
+        # sources without location: the identifiers come from the scan
+        resources = [
+            SimpleNamespace(is_file=True, path='foo/foo.c', location=None, lkm_clue={
+                'lkm-license': ['GPL'],
+                'lkm-symbol': ['foo_gpl'],
+                'lkm-symbol-gpl': ['foo_gpl'],
+                modules.IDENTIFIERS_KEY: ['foo_gpl', 'int'],
+            }),
+            SimpleNamespace(is_file=True, path='bar/bar.c', location=None, lkm_clue={
+                'lkm-license': ['Proprietary'],
+                modules.IDENTIFIERS_KEY: ['foo_gpl', 'void'],
+            }),
+        ]
+        codebase = mock.Mock(walk=mock.Mock(return_value=resources))
+        bar, foo = modules.build_kernel_modules(codebase)
+        assert (bar.name, foo.name) == ('bar', 'foo')
+        assert bar.gpl_symbols_used == {'foo_gpl': 'foo/foo.ko'}
+        assert foo.gpl_symbols_used == {}
+        assert resources[1].lkm_clue == {'lkm-license': ['Proprietary']}
+        assert codebase.save_resource.call_count == 2
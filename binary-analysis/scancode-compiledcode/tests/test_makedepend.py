@@ -15,6 +15,8 @@ from scancode.cli_test_utils import run_scan_click
 
 from commoncode.testcase import FileBasedTesting
 
+from compiledcode import makedepend
+
 
 class TestScanPluginMakedependScan(FileBasedTesting):
 
@@ -27,3 +29,62 @@ class TestScanPluginMakedependScan(FileBasedTesting):
         run_scan_click(args)
         test_loc = self.get_test_loc('makedepend/expected.json')
         check_json_scan(test_loc, result_file, regen=False)
+
+
+class TestMakedepend(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_makedepend_scan_with_multiple_rules_and_escapes(self):
+        test_loc = self.get_test_loc('makedepend-rules/main.d')
+        result = makedepend.makedepend_scan(test_loc)
+        expected = dict(makedepend={
+            'main.o': [
+                'main.c',
+                '/usr/include/stdc-predef.h',
+                'my inc/a b.h',
+                'h#1.h',
+                '/usr/include/stdio.h',
+                'price$list.h',
+            ],
+            'util.o': ['util.c', 'util.h', 'common.h'],
+        })
+        assert result == expected
+
+    def test_tokenize_with_windows_drive_letters(self):
+        line = r'C:\build\foo.o: C:\src\foo.c d:/inc/foo.h'
+        tokens, separator = makedepend.tokenize(line)
+        assert tokens == [r'C:\build\foo.o', r'C:\src\foo.c', 'd:/inc/foo.h']
+        assert separator == 1
+
+    def test_tokenize_skips_comments_and_assignments(self):
+        assert makedepend.tokenize('foo.o: foo.c # foo.h') == (['foo.o', 'foo.c'], 1)
+        assert makedepend.tokenize('CFLAGS := -O2') == ([], None)
+        assert makedepend.tokenize('# foo.o: foo.c') == ([], None)
+
+    def test_iter_logical_lines_joins_continuations(self):
+        lines = ['a.o: a.c \\\n', '  a.h\n', '\trecipe\n', 'b.o: b.c\n']
+        result = list(makedepend.iter_logical_lines(lines))
+        assert result == ['a.o: a.c    a.h', 'b.o: b.c']
+
+    def test_parse_make_rules_skips_recipe_continuation_lines(self):
+        lines = [
+            'a.o: a.c\n',
+            '\t$(CC) -c a.c \\\n',
+            '  -o a.o -DNAME=x:y\n',
+            'b.o: b.c\n',
+        ]
+        result = list(makedepend.parse_make_rules(lines))
+        assert result == [(['a.o'], ['a.c']), (['b.o'], ['b.c'])]
+
+    def test_parse_make_rules_skips_assignments(self):
+        lines = [
+            'VPATH = src:include\n',
+            'PATHS := a:b\n',
+            'DIRS ?= c:d\n',
+            'DIRS += e:f\n',
+            'a.o: CFLAGS = -O2\n',
+            'a.o: a.c\n',
+        ]
+        result = list(makedepend.parse_make_rules(lines))
+        assert result == [(['a.o'], ['a.c'])]
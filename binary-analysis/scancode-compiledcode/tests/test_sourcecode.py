@@ -8,12 +8,20 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+import io
 import os
+from unittest import mock
+from unittest.case import skipUnless
 
 from scancode.cli_test_utils import check_json_scan
 from scancode.cli_test_utils import run_scan_click
 
+import scancode_config
 from commoncode.testcase import FileBasedTesting
+from plugincode.location_provider import get_location
+
+from compiledcode.sourcecode import metrics
+from compiledcode.sourcecode import source
 
 
 class TestCodeCommentLinesScan(FileBasedTesting):
@@ -27,3 +35,283 @@ class TestCodeCommentLinesScan(FileBasedTesting):
         run_scan_click(args)
         test_loc = self.get_test_loc('sourcecode/expected.json')
         check_json_scan(test_loc, result_file, regen=False)
+
+
+class TestFileLinesCount(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_count_lines(self):
+        data = (
+            b'/* comment\n'
+            b' * more\n'
+            b'\n'
+            b'  \t\r\n'
+            b'#include <stdio.h>\n'
+            b'int a;\r\n'
+            b'@rem a batch comment\n'
+            b'@echo off\n'
+            b'; asm comment\n'
+        )
+        assert metrics.count_lines(data) == (2, 5)
+        assert metrics.count_lines(b'') == (0, 0)
+
+    def test_file_lines_count_across_chunks(self):
+        test_file = self.get_test_loc('sourcecode/input/if_ath.c')
+        expected = metrics.file_lines_count(test_file)
+        metrics.file_lines_count.cache_clear()
+        with mock.patch.object(metrics, 'CHUNK_SIZE', 64):
+            assert metrics.file_lines_count(test_file) == expected
+        metrics.file_lines_count.cache_clear()
+        assert expected == (7007, 2111)
+
+    def test_file_lines_count_without_comment_syntax_across_chunks(self):
+        test_file = self.get_test_loc('sourcecode/input/if_ath.c')
+        with mock.patch.object(metrics, 'get_comment_syntax', return_value=None):
+            metrics.file_lines_count.cache_clear()
+            expected = metrics.file_lines_count(test_file)
+            metrics.file_lines_count.cache_clear()
+            with mock.patch.object(metrics, 'CHUNK_SIZE', 64):
+                assert metrics.file_lines_count(test_file) == expected
+        metrics.file_lines_count.cache_clear()
+        assert expected == (6586, 2532)
+
+    def test_file_lines_count_with_c_lexer(self):
+        test_file = self.get_test_loc('sourcecode/input/if_ath.c')
+        metrics.file_lines_count.cache_clear()
+        assert metrics.file_lines_count(test_file) == (7007, 2111)
+
+    def test_source_lines_counter_carries_comments_and_strings_across_chunks(self):
+        chunks = [
+            b'int a; /* a comment\n',
+            b'\n',
+            b'   still comment\n',
+            b'*/ int b;\n',
+            b'char *s = "a \\\n',
+            b'/* not a comment */";\n',
+            b'/* the end\n',
+        ]
+        counter = metrics.SourceLinesCounter('c')
+        counts = [counter.count_lines(chunk) for chunk in chunks]
+        assert counts == [(1, 0), (0, 0), (0, 1), (1, 0), (1, 0), (1, 0), (0, 1)]
+        assert counter.pending == (metrics.BLOCK_COMMENT, b'*/', True, False)
+        assert metrics.count_source_lines(b''.join(chunks), 'c') == (4, 2)
+
+    def test_count_source_lines_c(self):
+        data = (
+            b'/*\n'
+            b' * a block comment\n'
+            b'\n'
+            b' */\n'
+            b'#include <stdio.h>\n'
+            b'int a = 4 / 2; /* code and comment */\n'
+            b'char *s = "/* not a comment";\n'
+            b'int *p; // trailing comment\n'
+            b'/* one */ /* two */\n'
+            b'/* start */ int b; /* end\n'
+            b'   still comment */ int c;\n'
+            b'// a line comment\n'
+        )
+        assert metrics.count_source_lines(data, 'c') == (6, 5)
+
+    def test_count_source_lines_multi_line_and_raw_strings(self):
+        data = (
+            b'const char *s = R"sql(\n'
+            b'/* not a comment */\n'
+            b'// not a comment either\n'
+            b')sql"; // a comment\n'
+            b"char c = '\"'; /* a comment */\n"
+            b'char *u = "\\"/* a comment */;\n'
+            b'// a comment\n'
+        )
+        assert metrics.count_source_lines(data, 'cpp') == (6, 1)
+        data = (
+            b'const t = `\n'
+            b'// a template literal\n'
+            b'`;\n'
+            b'// a comment\n'
+        )
+        assert metrics.count_source_lines(data, 'javascript') == (3, 1)
+        data = (
+            b'String t = """\n'
+            b'    /* a text block */\n'
+            b'    """;\n'
+            b'/* a comment */\n'
+        )
+        assert metrics.count_source_lines(data, 'java') == (3, 1)
+        data = b'let s = "a\n// not a comment\n";\nfn f<\'a>() {} /* a\ncomment */\n'
+        assert metrics.count_source_lines(data, 'rust') == (4, 1)
+        data = b"echo 'a\n# not a comment\n'\n# a comment\n"
+        assert metrics.count_source_lines(data, 'shell') == (3, 1)
+
+    def test_count_source_lines_python(self):
+        data = (
+            b'"""\n'
+            b'A module docstring.\n'
+            b'"""\n'
+            b'# a comment\n'
+            b'x = """\n'
+            b'# not a comment\n'
+            b'"""\n'
+            b"y = '#'  # a comment\n"
+            b"    \'\'\'docstring\'\'\'\n"
+        )
+        assert metrics.count_source_lines(data, 'python') == (4, 5)
+
+    def test_count_source_lines_markup_and_lua(self):
+        data = b'<!-- a\ncomment -->\n<p>text</p> <!-- c -->\n'
+        assert metrics.count_source_lines(data, 'markup') == (1, 2)
+        data = b'--[[ a\nblock ]]\n-- line\nlocal a = 1 -- c\n'
+        assert metrics.count_source_lines(data, 'lua') == (1, 3)
+
+    def test_get_comment_syntax(self):
+        assert metrics.get_comment_syntax('foo/bar.C') == 'c'
+        assert metrics.get_comment_syntax('foo/bar.py') == 'python'
+        assert metrics.get_comment_syntax('foo/bar.cpp') == 'cpp'
+        assert metrics.get_comment_syntax('foo/bar.java') == 'java'
+        assert metrics.get_comment_syntax('foo/bar.unknown') is None
+
+
+class TestCodeCommentLinesTotals(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_codecommentlines_totals(self):
+        test_dir = self.get_test_loc('sourcecode-totals/src')
+        result_file = self.get_temp_file('json')
+        args = ['--codecommentlines', '--codecommentlines-totals', test_dir, '--json', result_file]
+        run_scan_click(args)
+        test_loc = self.get_test_loc('sourcecode-totals/expected.json')
+        check_json_scan(test_loc, result_file, regen=False)
+
+
+class TestCtagsTags(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def get_tag_lines(self):
+        with open(self.get_test_loc('sourcecode-ctags/ctags.out')) as lines:
+            return lines.readlines()
+
+    def test_parse_tags(self):
+        result = list(source.parse_tags(self.get_tag_lines()))
+        expected = [
+            ('foo.c', 'helper', True),
+            ('foo.c', 'helper', True),
+            ('foo.c', 'foo', False),
+            ('bar.c', 'foo', True),
+            ('bar.c', 'bar', False),
+        ]
+        assert result == expected
+
+    def test_parse_tags_skips_pseudo_tags_and_other_kinds(self):
+        lines = [
+            '!_TAG_FILE_FORMAT\t2\t/extended format/\n',
+            'MAX\tfoo.c\t1;"\tmacro\tfile:\n',
+            'foo\tfoo.c\t3;"\tfunction\n',
+        ]
+        assert list(source.parse_tags(lines)) == [('foo.c', 'foo', False)]
+
+    def test_iter_functions_demultiplexes_batches(self):
+        tag_lines = self.get_tag_lines()
+        batches = []
+
+        def run_ctags(sourcefiles, cmd_loc, lib_loc=None):
+            batches.append(sourcefiles)
+            return [l for l in tag_lines if l.split('\t')[1] in sourcefiles]
+
+        with mock.patch.object(source, 'run_ctags', run_ctags):
+            sourcefiles = ['foo.c', 'empty.c', 'bar.c']
+            result = list(source.iter_functions(sourcefiles, 'ctags', batch_size=2))
+
+        assert batches == [['foo.c', 'empty.c'], ['bar.c']]
+        expected = [
+            ('foo.c', ['helper', 'helper'], ['foo']),
+            ('empty.c', [], []),
+            ('bar.c', ['foo'], ['bar']),
+        ]
+        assert result == expected
+
+    def get_ctags_filter(self, output):
+        proc = mock.Mock(stdin=io.StringIO(), stdout=io.StringIO(output))
+        with mock.patch.object(source.subprocess, 'Popen', return_value=proc):
+            return source.CtagsFilter('ctags')
+
+    def test_ctags_filter_get_tag_lines(self):
+        foo_lines = [l for l in self.get_tag_lines() if '\tfoo.c\t' in l]
+        output = ''.join(foo_lines) + source.FILTER_TERMINATOR + source.FILTER_TERMINATOR
+        ctags_filter = self.get_ctags_filter(output)
+        stdin = ctags_filter.proc.stdin
+        assert ctags_filter.get_tag_lines('foo.c') == foo_lines
+        assert ctags_filter.get_tag_lines('empty.c') == []
+        assert stdin.getvalue() == 'foo.c\nempty.c\n'
+        ctags_filter.close()
+
+    def test_ctags_filter_get_functions(self):
+        output = ''.join(self.get_tag_lines()[:3]) + source.FILTER_TERMINATOR
+        ctags_filter = self.get_ctags_filter(output)
+        assert ctags_filter.get_functions('foo.c') == (['helper', 'helper'], ['foo'])
+        ctags_filter.close()
+
+    def test_ctags_filter_uses_a_temp_dir_of_the_scan_run(self):
+        proc = mock.Mock(stdin=io.StringIO(), stdout=io.StringIO(''))
+        proc.poll.return_value = None
+        with mock.patch.object(source.subprocess, 'Popen', return_value=proc) as popen:
+            ctags_filter = source.CtagsFilter('ctags')
+        temp_dir = popen.call_args[1]['env']['TMPDIR']
+        assert temp_dir == ctags_filter.temp_dir
+        assert os.path.dirname(temp_dir) == scancode_config.scancode_temp_dir
+        assert ctags_filter.is_alive()
+        # the scan run temp dir is deleted at the end of a run
+        os.rmdir(temp_dir)
+        assert not ctags_filter.is_alive()
+        ctags_filter.close()
+
+    def test_ctags_filter_get_tag_lines_raises_on_early_exit(self):
+        ctags_filter = self.get_ctags_filter('foo\tfoo.c\t3;"\tfunction\n')
+        ctags_filter.err.write(b'ctags: crashed')
+        with self.assertRaises(Exception) as context:
+            ctags_filter.get_tag_lines('foo.c')
+        assert str(context.exception) == 'ctags: crashed'
+        assert ctags_filter.proc.stdout.closed
+
+    def test_ctags_filter_get_tag_lines_runs_ctags_for_paths_with_newlines(self):
+        ctags_filter = self.get_ctags_filter('')
+        with mock.patch.object(source, 'run_ctags', return_value=iter(['tag\n'])) as run_ctags:
+            assert ctags_filter.get_tag_lines('foo\n.c') == ['tag\n']
+        run_ctags.assert_called_once_with(['foo\n.c'], 'ctags', None)
+        assert ctags_filter.proc.stdin.getvalue() == ''
+        ctags_filter.close()
+
+
+has_ctags = bool(get_location(source.SCANCODE_CTAGS_EXE))
+
+
+@skipUnless(has_ctags, 'scancode-ctags is not installed')
+class TestSourceSymbolsScan(FileBasedTesting):
+
+    test_data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+    def test_source_symbols(self):
+        test_dir = self.get_test_loc('sourcecode-symbols/src')
+        result_file = self.get_temp_file('json')
+        args = ['--source-symbols', test_dir, '--json', result_file]
+        run_scan_click(args)
+        test_loc = self.get_test_loc('sourcecode-symbols/expected.json')
+        check_json_scan(test_loc, result_file, regen=False)
+
+    def test_ctags_filter_returns_the_functions_of_a_process_per_file(self):
+        test_dir = self.get_test_loc('sourcecode-symbols/src')
+        sourcefiles = [
+            os.path.join(test_dir, name) for name in sorted(os.listdir(test_dir))
+        ]
+        cmd_loc = get_location(source.SCANCODE_CTAGS_EXE)
+        lib_loc = get_location(source.SCANCODE_CTAGS_LIB)
+        per_file = [
+            functions[1:]
+            for sourcefile in sourcefiles
+            for functions in source.iter_functions([sourcefile], cmd_loc, lib_loc)
+        ]
+        ctags_filter = source.get_ctags_filter()
+        filtered = [ctags_filter.get_functions(sourcefile) for sourcefile in sourcefiles]
+        assert filtered == per_file
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-plugins for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+from unittest import TestCase
+
+from compiledcode.utils import PathSuffixIndex
+
+
+class TestPathSuffixIndex(TestCase):
+
+    def test_get(self):
+        index = PathSuffixIndex()
+        index.add('/app/src/com/foo/Bar.java', 'app')
+        index.add('lib/src/org/foo/Bar.java', 'lib')
+        index.add('other/Bar.java', 'other')
+        assert index.get('foo/Bar.java') == ['app', 'lib']
+        assert index.get('/src/com/foo/Bar.java') == ['app']
+        assert index.get('Bar.java') == ['app', 'lib', 'other']
+        assert index.get('Baz.java') == []
+        assert index.get('') == []
+
+    def test_find_longest(self):
+        index = PathSuffixIndex()
+        index.add('app/src/main.c', 1)
+        index.add('lib/src/main.c', 2)
+        index.add('main.c', 3)
+        assert index.find_longest('/build/app/src/main.c') == [1]
+        assert index.find_longest('/build/src/main.c') == [1, 2]
+        assert index.find_longest('/build/other/main.c') == []
+        assert index.find_longest('main.c') == []
+        assert index.find_longest('main.c', minimum=1) == [1, 2, 3]
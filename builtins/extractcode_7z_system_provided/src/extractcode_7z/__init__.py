@@ -13,6 +13,15 @@ from os import environ
 from os import path
 
 from plugincode.location_provider import LocationProviderPlugin
+from extractcode_7z.locations_cache import get_cache_key
+from extractcode_7z.locations_cache import get_cached_locations
+
+# Name of the file caching the resolved locations
+LOCATIONS_CACHE_FILE_NAME = 'extractcode-7z-locations.json'
+
+# Version of the locations resolution: bump it when find_locations() changes
+# to not use the locations cached by a previous version
+LOCATIONS_VERSION = 1
 
 
 class SevenzipPaths(LocationProviderPlugin):
@@ -27,6 +36,21 @@ class SevenzipPaths(LocationProviderPlugin):
 
 
     def get_locations(self):
+        """
+        Return a mapping of {location key: location} providing the installation
+        locations of the 7zip exe and shared libraries.
+
+        The resolved locations are cached in a file keyed by the os-release
+        contents, the environment overrides and the LOCATIONS_VERSION such
+        that each scan process does not probe the system again.
+        """
+        return get_cached_locations(
+            LOCATIONS_CACHE_FILE_NAME,
+            key=get_cache_key(LOCATIONS_VERSION, environ.get('EXTRACTCODE_7Z_PATH')),
+            find_locations=self.find_locations,
+        )
+
+    def find_locations(self):
         """
         Return a mapping of {location key: location} providing the installation
         locations of the 7zip exe and shared libraries as installed on various
@@ -0,0 +1,126 @@
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-toolkit for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+# This module is copied in the extractcode_7z, extractcode_libarchive and
+# typecode_libmagic system-provided plugins as each plugin is installed on its
+# own: keep all the copies byte-identical.
+
+import json
+import os
+import platform
+import struct
+from os import environ
+from os import path
+
+# Version of the locations cache file format and key
+CACHE_FORMAT_VERSION = 1
+
+# os-release files in their order of precedence as used by
+# platform.freedesktop_os_release()
+OS_RELEASE_LOCATIONS = ('/etc/os-release', '/usr/lib/os-release')
+
+
+def get_os_release_text():
+    """
+    Return the text of the os-release file of this system or an empty string.
+    """
+    for os_release in OS_RELEASE_LOCATIONS:
+        try:
+            with open(os_release, encoding='utf-8', errors='replace') as inp:
+                return inp.read()
+        except OSError:
+            continue
+    return ''
+
+
+def get_cache_location(cache_file_name):
+    """
+    Return the location of a ``cache_file_name`` resolved locations cache
+    file.
+    """
+    cache_dir = environ.get('SCANCODE_CACHE') or path.join(
+        environ.get('XDG_CACHE_HOME') or path.join(path.expanduser('~'), '.cache'),
+        'scancode',
+    )
+    return path.join(cache_dir, cache_file_name)
+
+
+def get_cache_key(version, *overrides):
+    """
+    Return a cache key for resolved locations made of the cache format
+    version, the ``version`` of the plugin resolution code, the system,
+    machine, Python pointer size, os-release contents and the ``overrides``
+    environment variables values.
+    """
+    return [
+        CACHE_FORMAT_VERSION,
+        version,
+        platform.system(),
+        platform.machine(),
+        '{}bit'.format(struct.calcsize('P') * 8),
+        get_os_release_text(),
+    ] + list(overrides)
+
+
+def load_cached_locations(cache_location, key):
+    """
+    Return a mapping of {location key: location} loaded from the
+    ``cache_location`` cache file or None if the cache file does not exist,
+    is not valid, has a different ``key`` or lists a location that does not
+    exist anymore.
+    """
+    try:
+        with open(cache_location) as inp:
+            cached = json.load(inp)
+    except (OSError, ValueError):
+        return
+
+    if not isinstance(cached, dict) or cached.get('key') != key:
+        return
+
+    locations = cached.get('locations')
+    if not isinstance(locations, dict):
+        return
+
+    if all(path.exists(location) for location in locations.values() if location):
+        return locations
+
+
+def save_cached_locations(cache_location, key, locations):
+    """
+    Save the ``locations`` mapping for a cache ``key`` in the
+    ``cache_location`` cache file. Errors are ignored as the cache is only an
+    optimization.
+    """
+    temp_location = '{}.{}.tmp'.format(cache_location, os.getpid())
+    try:
+        os.makedirs(path.dirname(cache_location), exist_ok=True)
+        with open(temp_location, 'w') as out:
+            json.dump(dict(key=key, locations=locations), out)
+        os.replace(temp_location, cache_location)
+    except OSError:
+        try:
+            os.remove(temp_location)
+        except OSError:
+            pass
+
+
+def get_cached_locations(cache_file_name, key, find_locations):
+    """
+    Return a mapping of {location key: location} cached in the
+    ``cache_file_name`` cache file for a cache ``key``. If not cached, call
+    ``find_locations`` to resolve the locations and cache them such that each
+    scan process does not probe the system again.
+    """
+    cache_location = get_cache_location(cache_file_name)
+    locations = load_cached_locations(cache_location, key)
+    if locations is None:
+        locations = find_locations()
+        save_cached_locations(cache_location, key, locations)
+    return locations
@@ -12,51 +12,47 @@ from os import environ
 from os import path
 
 from plugincode.location_provider import LocationProviderPlugin
+from extractcode_libarchive.libraries import find_library
+from extractcode_libarchive.locations_cache import get_cache_key
+from extractcode_libarchive.locations_cache import get_cached_locations
 
+# Name of the file caching the resolved locations
+LOCATIONS_CACHE_FILE_NAME = 'extractcode-libarchive-locations.json'
+
+# Version of the locations resolution: bump it when find_locations() changes
+# to not use the locations cached by a previous version
+LOCATIONS_VERSION = 2
 
-class LibarchivePaths(LocationProviderPlugin):
 
-    def get_like_distro(self):
-        info = platform.freedesktop_os_release()
-        ids = [info["ID"]]
-        if "ID_LIKE" in info:
-            # ids are space separated and ordered by precedence
-            ids.extend(info["ID_LIKE"].split())
-        return ids
+class LibarchivePaths(LocationProviderPlugin):
 
     def get_locations(self):
         """
         Return a mapping of {location key: location} providing the installation
-        locations of the libarchive shared library as installed on various Linux
-        distros or on FreeBSD.
+        locations of the libarchive shared library.
+
+        The resolved locations are cached in a file keyed by the os-release
+        contents, the environment overrides and the LOCATIONS_VERSION such
+        that each scan process does not probe the system again.
+        """
+        return get_cached_locations(
+            LOCATIONS_CACHE_FILE_NAME,
+            key=get_cache_key(LOCATIONS_VERSION, environ.get('EXTRACTCODE_LIBARCHIVE_PATH')),
+            find_locations=self.find_locations,
+        )
+
+    def find_locations(self):
+        """
+        Return a mapping of {location key: location} providing the installation
+        locations of the libarchive shared library as installed on Linux using
+        the ld.so cache, on FreeBSD or on macOS.
         """
         lib_archive = environ.get('EXTRACTCODE_LIBARCHIVE_PATH')
         if not lib_archive:
-            system_arch = platform.machine()
             mainstream_system = platform.system().lower()
 
             if mainstream_system == 'linux':
-                distribution = self.get_like_distro()
-                debian_based_distro = ['ubuntu', 'mint', 'debian']
-                rpm_based_distro = ['fedora', 'rhel']
-
-                if any(dist in debian_based_distro for dist in distribution):
-                    lib_dir = (
-                        '/usr/lib' if platform.architecture()[0] == '32bit'
-                        else f'/usr/lib/{system_arch}-linux-gnu'
-                    )
-
-                elif any(dist in rpm_based_distro for dist in distribution):
-                    lib_dir = (
-                        '/usr/lib' if platform.architecture()[0] == '32bit'
-                        else '/usr/lib64'
-                    )
-
-                else:
-                    raise Exception(
-                        'Unsupported system: {}'.format(distribution))
-
-                lib_archive = path.join(lib_dir, 'libarchive.so.13')
+                lib_archive = find_library('libarchive.so.13') or ''
             elif mainstream_system == 'freebsd':
                 lib_archive = ''
                 for lib_dir in ('/usr/local/lib', '/usr/lib'):
@@ -0,0 +1,180 @@
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-toolkit for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+# This module is copied in the extractcode_libarchive and typecode_libmagic
+# system-provided plugins as each plugin is installed on its own: keep both
+# copies byte-identical.
+
+import platform
+import struct
+import sys
+from functools import lru_cache
+from os import path
+
+# The glibc dynamic linker cache of the shared libraries found by ldconfig
+LD_SO_CACHE_LOCATION = '/etc/ld.so.cache'
+
+# The legacy cache format that may be followed by the current format
+OLD_CACHE_MAGIC = b'ld.so-1.7.0'
+NEW_CACHE_MAGIC = b'glibc-ld.so.cache1.1'
+
+# magic, number of entries
+OLD_CACHE_HEADER = struct.Struct('=11sxI')
+# flags, name offset, path offset
+OLD_CACHE_ENTRY = struct.Struct('=iII')
+# magic and version, number of entries, strings length, flags, extensions
+# offset
+NEW_CACHE_HEADER = struct.Struct('=20sIIB3xI12x')
+# flags, name offset, path offset, OS version, hardware capabilities
+NEW_CACHE_ENTRY = struct.Struct('=iIIIQ')
+
+# Standard library directories searched in sequence when a library is not
+# in the ld.so cache, such as on musl-based distros without ld.so cache
+LIBRARY_DIRS = (
+    '/usr/lib/{machine}-linux-gnu',
+    '/lib/{machine}-linux-gnu',
+    '/usr/lib64',
+    '/lib64',
+    '/usr/lib',
+    '/lib',
+    '/usr/local/lib64',
+    '/usr/local/lib',
+    # NixOS system profile
+    '/run/current-system/sw/lib',
+)
+
+
+def get_cstring(data, offset):
+    """
+    Return a string decoded from the null-terminated bytes of ``data`` that
+    start at ``offset``.
+    """
+    end = data.find(b'\0', offset)
+    if end == -1:
+        end = len(data)
+    return data[offset:end].decode('utf-8', errors='surrogateescape')
+
+
+def iter_ld_so_cache_entries(data):
+    """
+    Yield tuples of (library name, library path) of the glibc ld.so cache
+    ``data`` bytes in the order of the cache, with the preferred libraries
+    first. Support both the current and the legacy cache formats.
+    """
+    offset = 0
+    if data[:len(OLD_CACHE_MAGIC)] == OLD_CACHE_MAGIC:
+        _magic, nlibs = OLD_CACHE_HEADER.unpack_from(data, 0)
+        strings_offset = OLD_CACHE_HEADER.size + nlibs * OLD_CACHE_ENTRY.size
+        # the current format follows the legacy one aligned on 8 bytes
+        offset = (strings_offset + 7) & ~7
+        if data[offset:offset + len(NEW_CACHE_MAGIC)] != NEW_CACHE_MAGIC:
+            # legacy format only: string offsets are relative to the strings
+            for i in range(nlibs):
+                _flags, key, value = OLD_CACHE_ENTRY.unpack_from(
+                    data, OLD_CACHE_HEADER.size + i * OLD_CACHE_ENTRY.size)
+                yield (
+                    get_cstring(data, strings_offset + key),
+                    get_cstring(data, strings_offset + value),
+                )
+            return
+
+    if data[offset:offset + len(NEW_CACHE_MAGIC)] != NEW_CACHE_MAGIC:
+        return
+
+    # string offsets are relative to the start of the current format header
+    _magic, nlibs, _len_strings, _flags, _extension_offset = (
+        NEW_CACHE_HEADER.unpack_from(data, offset))
+    entries_offset = offset + NEW_CACHE_HEADER.size
+    for i in range(nlibs):
+        _flags, key, value, _osversion, _hwcap = NEW_CACHE_ENTRY.unpack_from(
+            data, entries_offset + i * NEW_CACHE_ENTRY.size)
+        yield get_cstring(data, offset + key), get_cstring(data, offset + value)
+
+
+# ELF header fields: magic, class, data encoding, then the machine after
+# the rest of the identification and the type
+ELF_MAGIC = b'\x7fELF'
+ELF_HEADER_SIZE = 20
+ELF_MACHINE_OFFSET = 18
+ELF_LITTLE_ENDIAN = 1
+
+
+def get_elf_header(location):
+    """
+    Return a tuple of (class, data encoding, machine) of the ELF header of the
+    file at ``location`` or None if this is not an ELF file.
+    """
+    try:
+        with open(location, 'rb') as inp:
+            header = inp.read(ELF_HEADER_SIZE)
+    except OSError:
+        return
+
+    if len(header) < ELF_HEADER_SIZE or header[:4] != ELF_MAGIC:
+        return
+
+    elf_class = header[4]
+    encoding = header[5]
+    byte_order = '<' if encoding == ELF_LITTLE_ENDIAN else '>'
+    machine, = struct.unpack_from(byte_order + 'H', header, ELF_MACHINE_OFFSET)
+    return elf_class, encoding, machine
+
+
+@lru_cache(maxsize=1)
+def get_python_elf_header():
+    """
+    Return the ELF header tuple of this Python interpreter or None if it
+    cannot be read.
+    """
+    return get_elf_header(sys.executable)
+
+
+def is_compatible_library(location):
+    """
+    Return True if the file at ``location`` is an ELF for the same machine,
+    32 or 64 bits class and byte order as this Python interpreter. Only check
+    the class if the interpreter executable is not a readable ELF.
+    """
+    header = get_elf_header(location)
+    if not header:
+        return False
+
+    python_header = get_python_elf_header()
+    if python_header:
+        return header == python_header
+
+    elf_class, _encoding, _machine = header
+    return elf_class == (2 if struct.calcsize('P') == 8 else 1)
+
+
+def find_library(name, ld_so_cache_location=LD_SO_CACHE_LOCATION):
+    """
+    Return the path to the shared library file ``name`` such as
+    "libmagic.so.1" or None. Look up the ld.so cache first with a single file
+    read, then check the standard library directories.
+    """
+    try:
+        with open(ld_so_cache_location, 'rb') as inp:
+            data = inp.read()
+    except OSError:
+        data = b''
+
+    try:
+        for lib_name, location in iter_ld_so_cache_entries(data):
+            if lib_name == name and is_compatible_library(location):
+                return location
+    except struct.error:
+        # a truncated or corrupted cache
+        pass
+
+    machine = platform.machine()
+    for lib_dir in LIBRARY_DIRS:
+        location = path.join(lib_dir.format(machine=machine), name)
+        if is_compatible_library(location):
+            return location
@@ -26,49 +26,95 @@ import platform
 from os import path
 
 from plugincode.location_provider import LocationProviderPlugin
+from typecode_libmagic.libraries import find_library
+from typecode_libmagic.locations_cache import get_cache_key
+from typecode_libmagic.locations_cache import get_cached_locations
 
+# Name of the file caching the resolved locations
+LOCATIONS_CACHE_FILE_NAME = 'typecode-libmagic-locations.json'
 
-class LibmagicPaths(LocationProviderPlugin):
+# Version of the locations resolution: bump it when find_locations() changes
+# to not use the locations cached by a previous version
+LOCATIONS_VERSION = 2
+
+
+# Directories of the magic database of the file package across distros
+MAGIC_DB_DIRS = (
+    '/usr/lib/file',
+    '/usr/share/misc',
+    '/usr/share/file/misc',
+    '/usr/share/file',
+    '/usr/local/share/misc',
+)
+
+
+# Names of the library directories of an installation prefix
+LIB_DIR_NAMES = ('lib', 'lib64', 'lib32', 'libx32')
+
+
+def get_install_prefix(lib_dir):
+    """
+    Return the installation prefix of a ``lib_dir`` library directory or None.
+    For instance, this is /usr for /usr/lib/x86_64-linux-gnu or /usr/lib64.
+    The root of a /lib directory is the /usr prefix.
+    """
+    directory = lib_dir
+    while directory and directory != path.dirname(directory):
+        if path.basename(directory) in LIB_DIR_NAMES:
+            prefix = path.dirname(directory)
+            if prefix == path.dirname(prefix):
+                return '/usr'
+            return prefix
+        directory = path.dirname(directory)
+
+
+def find_magic_db_dir(lib_dir):
+    """
+    Return the directory of the magic.mgc database installed with a libmagic
+    library in ``lib_dir``. Check the share/misc directory of the library
+    installation prefix first, then the directories used by distros.
+    """
+    candidates = list(MAGIC_DB_DIRS)
+    prefix = get_install_prefix(lib_dir)
+    if prefix:
+        candidates.insert(0, path.join(prefix, 'share', 'misc'))
 
-    def get_like_distro(self):
-        info = platform.freedesktop_os_release()
-        ids = [info['ID']]
-        if 'ID_LIKE' in info:
-            # ids are space separated and ordered by precedence
-            ids.extend(info['ID_LIKE'].split())
-        return ids
+    for db_dir in candidates:
+        if path.exists(path.join(db_dir, 'magic.mgc')):
+            return db_dir
+    return MAGIC_DB_DIRS[0]
+
+
+class LibmagicPaths(LocationProviderPlugin):
 
     def get_locations(self):
         """
         Return a mapping of {location key: location} providing the installation
-        locations of the libmagic shared library as installed on various Linux
-        distros or on FreeBSD.
+        locations of the libmagic shared library.
+
+        The resolved locations are cached in a file keyed by the os-release
+        contents and the LOCATIONS_VERSION such that each scan process does
+        not probe the system again.
+        """
+        # unlike the 7z and libarchive plugins, libmagic has no environment
+        # variable to override its locations: the key has no overrides
+        return get_cached_locations(
+            LOCATIONS_CACHE_FILE_NAME,
+            key=get_cache_key(LOCATIONS_VERSION),
+            find_locations=self.find_locations,
+        )
+
+    def find_locations(self):
+        """
+        Return a mapping of {location key: location} providing the installation
+        locations of the libmagic shared library as installed on Linux using
+        the ld.so cache, on FreeBSD or on macOS.
         """
         mainstream_system = platform.system().lower()
         if mainstream_system == 'linux':
-            distribution = self.get_like_distro()
-            debian_based_distro = ['ubuntu', 'mint', 'debian']
-            rpm_based_distro = ['fedora', 'rhel']
-            system_arch = platform.machine()
-
-            if any(dist in debian_based_distro for dist in distribution):
-                db_dir = '/usr/lib/file'
-                lib_dir = (
-                    '/usr/lib' if platform.architecture()[0] == '32bit'
-                    else f'/usr/lib/{system_arch}-linux-gnu'
-                )
-
-            elif any(dist in rpm_based_distro for dist in distribution):
-                db_dir = '/usr/share/misc'
-                lib_dir = (
-                    '/usr/lib' if platform.architecture()[0] == '32bit'
-                    else '/usr/lib64'
-                )
-
-            else:
-                raise Exception('Unsupported system: {}'.format(distribution))
-
-            dll_loc = path.join(lib_dir, 'libmagic.so.1')
+            dll_loc = find_library('libmagic.so.1') or ''
+            lib_dir = path.dirname(dll_loc)
+            db_dir = find_magic_db_dir(lib_dir)
         elif mainstream_system == 'freebsd':
             dll_loc = ''
             db_dir = ''
@@ -0,0 +1,165 @@
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-toolkit for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+import struct
+import sys
+import tempfile
+from os import path
+from unittest import TestCase
+from unittest import mock
+
+from typecode_libmagic import libraries
+
+
+def build_strings(entries):
+    """
+    Return a tuple of (strings table bytes, [(name offset, path offset)])
+    for a list of (name, path) ``entries``.
+    """
+    strings = b''
+    offsets = []
+    for name, location in entries:
+        name_offset = len(strings)
+        strings += name.encode('utf-8') + b'\0'
+        location_offset = len(strings)
+        strings += location.encode('utf-8') + b'\0'
+        offsets.append((name_offset, location_offset))
+    return strings, offsets
+
+
+def build_old_cache(entries):
+    """
+    Return the bytes of a legacy format ld.so cache of (name, path) ``entries``.
+    """
+    strings, offsets = build_strings(entries)
+    data = libraries.OLD_CACHE_HEADER.pack(libraries.OLD_CACHE_MAGIC, len(entries))
+    for key, value in offsets:
+        data += libraries.OLD_CACHE_ENTRY.pack(1, key, value)
+    return data + strings
+
+
+def build_new_cache(entries):
+    """
+    Return the bytes of a current format ld.so cache of (name, path) ``entries``.
+    """
+    strings, offsets = build_strings(entries)
+    strings_offset = (
+        libraries.NEW_CACHE_HEADER.size + len(entries) * libraries.NEW_CACHE_ENTRY.size)
+    data = libraries.NEW_CACHE_HEADER.pack(
+        libraries.NEW_CACHE_MAGIC, len(entries), len(strings), 0, 0)
+    for key, value in offsets:
+        data += libraries.NEW_CACHE_ENTRY.pack(
+            0x0303, strings_offset + key, strings_offset + value, 0, 0)
+    return data + strings
+
+
+def build_combined_cache(old_entries, new_entries):
+    """
+    Return the bytes of a legacy format ld.so cache of ``old_entries``
+    followed by a current format cache of ``new_entries`` aligned on 8 bytes.
+    """
+    old = libraries.OLD_CACHE_HEADER.pack(libraries.OLD_CACHE_MAGIC, len(old_entries))
+    for _entry in old_entries:
+        old += libraries.OLD_CACHE_ENTRY.pack(1, 0, 0)
+    padding = b'\0' * (-len(old) % 8)
+    return old + padding + build_new_cache(new_entries)
+
+
+ENTRIES = [
+    ('libmagic.so.1', '/usr/lib/x86_64-linux-gnu/libmagic.so.1'),
+    ('libarchive.so.13', '/usr/lib/x86_64-linux-gnu/libarchive.so.13'),
+]
+
+
+class TestLdSoCache(TestCase):
+
+    def test_iter_ld_so_cache_entries_new_format(self):
+        data = build_new_cache(ENTRIES)
+        assert list(libraries.iter_ld_so_cache_entries(data)) == ENTRIES
+
+    def test_iter_ld_so_cache_entries_legacy_format(self):
+        data = build_old_cache(ENTRIES)
+        assert list(libraries.iter_ld_so_cache_entries(data)) == ENTRIES
+
+    def test_iter_ld_so_cache_entries_combined_format(self):
+        data = build_combined_cache([('libold.so', '/lib/libold.so')] * 3, ENTRIES)
+        assert list(libraries.iter_ld_so_cache_entries(data)) == ENTRIES
+
+    def test_iter_ld_so_cache_entries_truncated(self):
+        data = build_new_cache(ENTRIES)
+        truncated = data[:libraries.NEW_CACHE_HEADER.size + libraries.NEW_CACHE_ENTRY.size + 4]
+        entries = libraries.iter_ld_so_cache_entries(truncated)
+        with self.assertRaises(struct.error):
+            list(entries)
+
+    def test_iter_ld_so_cache_entries_unknown_format(self):
+        assert list(libraries.iter_ld_so_cache_entries(b'')) == []
+        assert list(libraries.iter_ld_so_cache_entries(b'not a cache')) == []
+
+
+class TestFindLibrary(TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        with open(sys.executable, 'rb') as inp:
+            self.python_header = inp.read(libraries.ELF_HEADER_SIZE)
+        if self.python_header[:4] != libraries.ELF_MAGIC:
+            self.skipTest('Python is not an ELF executable')
+
+    def create_library(self, name, machine=None):
+        """
+        Return the path of a new fake shared library file ``name`` with the
+        ELF header of this Python interpreter and another ``machine`` if
+        provided.
+        """
+        header = bytearray(self.python_header)
+        if machine is not None:
+            byte_order = '<' if header[5] == libraries.ELF_LITTLE_ENDIAN else '>'
+            struct.pack_into(byte_order + 'H', header, libraries.ELF_MACHINE_OFFSET, machine)
+        location = path.join(self.temp_dir, name)
+        with open(location, 'wb') as out:
+            out.write(bytes(header) + b'\0' * 64)
+        return location
+
+    def create_cache(self, data):
+        location = path.join(self.temp_dir, 'ld.so.cache')
+        with open(location, 'wb') as out:
+            out.write(data)
+        return location
+
+    def test_is_compatible_library_checks_the_machine(self):
+        _class, _encoding, machine = libraries.get_python_elf_header()
+        assert libraries.is_compatible_library(self.create_library('libsame.so'))
+        other = self.create_library('libother.so', machine=machine + 1)
+        assert not libraries.is_compatible_library(other)
+        assert not libraries.is_compatible_library(self.create_cache(b'not an ELF'))
+        assert not libraries.is_compatible_library(path.join(self.temp_dir, 'missing.so'))
+
+    def test_find_library_skips_incompatible_cached_libraries(self):
+        _class, _encoding, machine = libraries.get_python_elf_header()
+        other_dir = path.join(self.temp_dir, 'other')
+        other = self.create_library('libfoo.so.1', machine=machine + 1)
+        compatible = self.create_library('libfoo-compatible.so.1')
+        cache = self.create_cache(build_new_cache([
+            ('libbar.so.1', compatible),
+            ('libfoo.so.1', other),
+            ('libfoo.so.1', compatible),
+        ]))
+        with mock.patch.object(libraries, 'LIBRARY_DIRS', (other_dir,)):
+            assert libraries.find_library('libfoo.so.1', cache) == compatible
+            assert libraries.find_library('libbaz.so.1', cache) is None
+
+    def test_find_library_with_a_truncated_cache_uses_library_dirs(self):
+        location = self.create_library('libfoo.so.1')
+        data = build_new_cache([('libfoo.so.1', '/missing/libfoo.so.1')])
+        cache = self.create_cache(data[:libraries.NEW_CACHE_HEADER.size + 8])
+        with mock.patch.object(libraries, 'LIBRARY_DIRS', (self.temp_dir,)):
+            assert libraries.find_library('libfoo.so.1', cache) == location
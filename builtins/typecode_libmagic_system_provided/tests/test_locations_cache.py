@@ -0,0 +1,127 @@
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-toolkit for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+import json
+import os
+import tempfile
+from os import path
+from unittest import TestCase
+from unittest import mock
+
+from typecode_libmagic import locations_cache
+
+
+class TestLocationsCache(TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        self.cache_location = path.join(self.temp_dir, 'cache', 'locations.json')
+        self.lib = path.join(self.temp_dir, 'libfoo.so')
+        with open(self.lib, 'w') as out:
+            out.write('lib')
+        self.locations = {'foo.dll': self.lib, 'foo.libdir': None}
+
+    def test_save_and_load_cached_locations(self):
+        locations_cache.save_cached_locations(self.cache_location, ['key'], self.locations)
+        cached = locations_cache.load_cached_locations(self.cache_location, ['key'])
+        assert cached == self.locations
+        assert os.listdir(path.dirname(self.cache_location)) == ['locations.json']
+
+    def test_load_cached_locations_with_a_different_key(self):
+        locations_cache.save_cached_locations(self.cache_location, ['key'], self.locations)
+        assert locations_cache.load_cached_locations(self.cache_location, ['other']) is None
+
+    def test_load_cached_locations_with_a_missing_location(self):
+        locations_cache.save_cached_locations(self.cache_location, ['key'], self.locations)
+        os.remove(self.lib)
+        assert locations_cache.load_cached_locations(self.cache_location, ['key']) is None
+
+    def test_load_cached_locations_with_a_corrupt_cache_file(self):
+        os.makedirs(path.dirname(self.cache_location))
+        with open(self.cache_location, 'w') as out:
+            out.write('{"key": ["key"], "locations": {')
+        assert locations_cache.load_cached_locations(self.cache_location, ['key']) is None
+
+        with open(self.cache_location, 'w') as out:
+            json.dump(dict(key=['key'], locations=['not', 'a', 'mapping']), out)
+        assert locations_cache.load_cached_locations(self.cache_location, ['key']) is None
+
+    def test_load_cached_locations_without_cache_file(self):
+        assert locations_cache.load_cached_locations(self.cache_location, ['key']) is None
+
+    def test_save_cached_locations_ignores_a_read_only_cache_dir(self):
+        cache_dir = path.dirname(self.cache_location)
+        os.makedirs(cache_dir)
+        os.chmod(cache_dir, 0o555)
+        self.addCleanup(os.chmod, cache_dir, 0o755)
+        # also fail on open as root can write in a read-only directory
+        denied = PermissionError(13, 'Permission denied')
+        with mock.patch.object(locations_cache, 'open', side_effect=denied, create=True):
+            locations_cache.save_cached_locations(self.cache_location, ['key'], self.locations)
+        assert os.listdir(cache_dir) == []
+
+    def test_get_cached_locations_finds_locations_once(self):
+        find_locations = mock.Mock(return_value=self.locations)
+        with mock.patch.dict(os.environ, {'SCANCODE_CACHE': self.temp_dir}):
+            for _ in range(2):
+                result = locations_cache.get_cached_locations(
+                    'foo.json', ['key'], find_locations)
+                assert result == self.locations
+        assert find_locations.call_count == 1
+
+    def test_get_cache_key_has_the_cache_format_and_plugin_versions(self):
+        cache_format_version = locations_cache.CACHE_FORMAT_VERSION
+        assert locations_cache.get_cache_key(1)[:2] == [cache_format_version, 1]
+        assert locations_cache.get_cache_key(1) != locations_cache.get_cache_key(2)
+        assert locations_cache.get_cache_key(1, 'override')[-1] == 'override'
+
+    def test_get_cache_location(self):
+        environ = {'SCANCODE_CACHE': '/cache', 'XDG_CACHE_HOME': '/xdg'}
+        with mock.patch.dict(os.environ, environ):
+            assert locations_cache.get_cache_location('foo.json') == '/cache/foo.json'
+            del os.environ['SCANCODE_CACHE']
+            assert locations_cache.get_cache_location('foo.json') == '/xdg/scancode/foo.json'
+
+
+# The root of the builtins plugins directories
+BUILTINS_DIR = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+
+# The modules copied in each system-provided plugin that must be identical:
+# the plugin src/ subdirectories that contain a copy of each module
+COPIED_MODULES = {
+    'locations_cache.py': (
+        'extractcode_7z_system_provided/src/extractcode_7z',
+        'extractcode_libarchive_system_provided/src/extractcode_libarchive',
+        'typecode_libmagic_system_provided/src/typecode_libmagic',
+    ),
+    'libraries.py': (
+        'extractcode_libarchive_system_provided/src/extractcode_libarchive',
+        'typecode_libmagic_system_provided/src/typecode_libmagic',
+    ),
+}
+
+
+def read_bytes(location):
+    with open(location, 'rb') as inp:
+        return inp.read()
+
+
+class TestCopiedModules(TestCase):
+
+    def test_copied_modules_are_identical(self):
+        for module_name, module_dirs in COPIED_MODULES.items():
+            locations = [path.join(BUILTINS_DIR, d, module_name) for d in module_dirs]
+            locations = [location for location in locations if path.exists(location)]
+            if len(locations) < 2:
+                self.skipTest('The other system-provided plugins are not available')
+            expected = read_bytes(locations[0])
+            for location in locations[1:]:
+                assert read_bytes(location) == expected, location
@@ -0,0 +1,34 @@
+#
+# Copyright (c) nexB Inc. and others. All rights reserved.
+# ScanCode is a trademark of nexB Inc.
+# SPDX-License-Identifier: Apache-2.0
+# See http://www.apache.org/licenses/LICENSE-2.0 for the license text.
+# See https://github.com/aboutcode-org/scancode-toolkit for support or download.
+# See https://aboutcode.org for more information about nexB OSS projects.
+#
+
+from unittest import TestCase
+from unittest import mock
+
+import typecode_libmagic
+
+
+class TestMagicDbDir(TestCase):
+
+    def test_get_install_prefix(self):
+        get_install_prefix = typecode_libmagic.get_install_prefix
+        assert get_install_prefix('/usr/lib/x86_64-linux-gnu') == '/usr'
+        assert get_install_prefix('/usr/lib64') == '/usr'
+        assert get_install_prefix('/usr/local/lib') == '/usr/local'
+        assert get_install_prefix('/lib/x86_64-linux-gnu') == '/usr'
+        assert get_install_prefix('/opt/file/lib') == '/opt/file'
+        assert get_install_prefix('/opt/file') is None
+        assert get_install_prefix('') is None
+
+    def test_find_magic_db_dir_checks_the_install_prefix_first(self):
+        existing = set(['/usr/share/misc/magic.mgc', '/usr/lib/file/magic.mgc'])
+        with mock.patch('os.path.exists', existing.__contains__):
+            find_magic_db_dir = typecode_libmagic.find_magic_db_dir
+            assert find_magic_db_dir('/usr/lib/x86_64-linux-gnu') == '/usr/share/misc'
+            assert find_magic_db_dir('/opt/file/lib') == '/usr/lib/file'
+            assert find_magic_db_dir('') == '/usr/lib/file'